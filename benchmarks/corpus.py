@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to generate synthetic corpora of any size for the
+# benchmarks. Summaries are built from the words of the input json file
+# with the same word frequencies and summary lengths, and the search
+# engine is pointed to the generated input json file.
+#
+# Sample Usage
+# summaries = generate_summaries(10000)
+# data_dir = write_corpus(summaries, "C:/Dev/bench")
+# use_corpus(data_dir)
+
+import json
+import random
+from os import makedirs, path
+
+from search.config import Config
+from search.search_summary import Search
+from utilities.json_parser import load_json
+
+INPUT_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                       Config.DATA_DIR, Config.INPUT_FILE)
+
+
+def load_input_summaries() -> list:
+    """
+    Function to load the summaries of the input json file
+    """
+    input_data, err, trace = load_json(INPUT_FILE)
+    if err:
+        raise Exception("Unable to load the json file: %s, Error: %s, Trace:%s"
+                        % (INPUT_FILE, err, trace))
+    return input_data["summaries"]
+
+
+def generate_summaries(num: int, seed: int=0) -> list:
+    """
+    Function to generate the synthetic summaries
+    Args:
+        num: no of summaries
+        seed: random seed, same seed gives the same summaries
+    Returns:
+        [{"id": 0, "summary": "..."}, ...]
+    """
+    rand = random.Random(seed)
+    samples = [summary["summary"].split(" ") for summary in load_input_summaries()]
+    words = [word for sample in samples for word in sample if word]
+    lengths = [len(sample) for sample in samples]
+    return [{"id": index, "summary": " ".join(rand.choices(words, k=rand.choice(lengths)))}
+            for index in range(num)]
+
+
+def generate_queries(num: int, repeat_rate: float=0.0, seed: int=0,
+                     max_words: int=4) -> list:
+    """
+    Function to generate the queries of a workload, words are sampled with
+    their corpus frequencies so that common words are common in queries
+    Args:
+        num: no of queries
+        repeat_rate: fraction of the queries repeating an earlier query
+        seed: random seed
+        max_words: max no of words in a query
+    Returns:
+        ["is your problems", ...]
+    """
+    rand = random.Random(seed)
+    words = [word.lower() for summary in load_input_summaries()
+             for word in summary["summary"].split(" ") if word]
+    queries = []
+    for _ in range(num):
+        if queries and rand.random() < repeat_rate:
+            queries.append(rand.choice(queries))
+        else:
+            queries.append(" ".join(rand.choices(words, k=rand.randint(1, max_words))))
+    return queries
+
+
+def write_corpus(summaries: list, directory: str) -> str:
+    """
+    Function to write the summaries as the input json file in the directory
+    Returns:
+        directory
+    """
+    makedirs(directory, exist_ok=True)
+    with open(path.join(directory, Config.INPUT_FILE), "w", encoding="utf-8") as fp:
+        json.dump({Search.SUMMARIES_KEY: summaries}, fp)
+    return directory
+
+
+def use_corpus(data_dir: str, cache_size: int=0):
+    """
+    Function to point the search engine to the input json file of the
+    directory and drop the data loaded in this process
+    Args:
+        data_dir: directory having the input json file
+        cache_size: size of the result cache, 0 disables caching
+    """
+    Config.DATA_DIR = data_dir
+    Config.CACHE_FILE = None
+    Config.CACHE_SIZE = cache_size
+    Config.UPDATES_FILE = None
+    Search.INPUT_DATA.clear()
+    Search.INDEX = None
+    Search.SCORER = None
+    Search.RESULT_CACHE = None
+    Search.CORPUS_VERSION = 0
+    Search._ID_INDEXES = None
+    Search._UPDATES_OFFSET = 0
@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This benchmark measures the time taken by the query executor to search
+# batches of unique queries in the calling process and on pools of worker
+# processes, to find the batch size from which the parallelism pays off
+# for SEARCH_PARALLEL_MIN_BATCH.
+# To run the benchmark
+# python benchmarks/executor_benchmark.py --corpus-size 20000 --processes 0 2 4
+
+import argparse
+import logging
+import tempfile
+import time
+
+from benchmarks.corpus import (generate_queries, generate_summaries, use_corpus,
+                               write_corpus)
+from search.executor import QueryExecutor
+from search.search_summary import Search
+
+
+def _time_batches(executor: QueryExecutor, batch_sizes: list, summary_num: int,
+                  rounds: int) -> dict:
+    """
+    Function to get the best time in ms of searching each batch size
+    """
+    timings = {}
+    for batch_size in batch_sizes:
+        best = None
+        for round_num in range(rounds):
+            # Fresh queries for every round, so nothing is served from a cache
+            queries = generate_queries(batch_size, seed=batch_size * 1000 + round_num)
+            start = time.perf_counter()
+            executor.search_many(queries, summary_num)
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[batch_size] = best
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser("Benchmark the query executor.")
+    arg_parser.add_argument("--corpus-size", type=int, default=20000)
+    arg_parser.add_argument("--batch-sizes", type=int, nargs="+",
+                            default=[1, 8, 32, 128, 512])
+    arg_parser.add_argument("--processes", type=int, nargs="+", default=[0, 2, 4])
+    arg_parser.add_argument("--summary-num", type=int, default=5)
+    arg_parser.add_argument("--rounds", type=int, default=3)
+    args = arg_parser.parse_args()
+    logger = logging.getLogger("benchmark")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        use_corpus(write_corpus(generate_summaries(args.corpus_size), tmp_dir))
+        # Workers are forked after the data is loaded
+        Search.load(logger)
+        print("corpus size: %d" % args.corpus_size)
+        print("%-10s" % "processes" + "".join("%12s" % ("batch %d" % size)
+                                              for size in args.batch_sizes))
+        for processes in args.processes:
+            # Every batch goes to the workers when they exist
+            executor = QueryExecutor(processes, 1, logger)
+            executor.start()
+            timings = _time_batches(executor, args.batch_sizes, args.summary_num,
+                                    args.rounds)
+            executor.shutdown()
+            print("%-10d" % processes + "".join("%10.1fms" % timings[size]
+                                                for size in args.batch_sizes))
+
+
+if __name__ == "__main__":
+    main()
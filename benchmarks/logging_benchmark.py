@@ -0,0 +1,91 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This benchmark measures the per request time spent in logging by the
+# search, with the queued logger and deferred formatting against the
+# earlier logging which formatted the messages and the whole result
+# payload eagerly at info level and wrote them to the file in the request
+# thread.
+# To run the benchmark
+# python benchmarks/logging_benchmark.py --corpus-size 10000 --summary-num 10
+
+import argparse
+import logging
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+from os import path
+
+from benchmarks.corpus import (generate_queries, generate_summaries, use_corpus,
+                               write_corpus)
+from search.search_summary import Search
+from utilities.logger import create_logger
+
+
+def _create_eager_logger(log_dir: str):
+    """
+    Function to create the logger as it was created before the queued
+    logger, writing to the file in the calling thread
+    """
+    handler = RotatingFileHandler(filename=path.join(log_dir, "eager.log"),
+                                  mode='a', maxBytes=5000000, backupCount=10)
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(filename)s, %(lineno)d [%(name)s]: %(message)s',
+        '%d-%b-%y %H:%M:%S'))
+    logger = logging.getLogger("benchmark.eager")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+
+def _time_searches(queries: list, summary_num: int, logger, eager: bool) -> float:
+    """
+    Function to get the mean time in ms of a search of the queries, the
+    earlier logging of the search is repeated for eager
+    """
+    start = time.perf_counter()
+    for query in queries:
+        if eager:
+            logger.info("Query: '%s', No of summaries to return: %d"
+                        % (query, summary_num))
+        results = Search(query, summary_num, logger).get_query_search_results()
+        if eager:
+            logger.info("Matching output summary: %s" % results)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser("Benchmark the logging of the search.")
+    arg_parser.add_argument("--corpus-size", type=int, default=10000)
+    arg_parser.add_argument("--queries", type=int, default=2000)
+    arg_parser.add_argument("--summary-num", type=int, default=10)
+    arg_parser.add_argument("--rounds", type=int, default=3)
+    args = arg_parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Searches are served from the cache, so the logging is a large
+        # part of the request time
+        use_corpus(write_corpus(generate_summaries(args.corpus_size), tmp_dir),
+                   cache_size=args.queries)
+        queries = generate_queries(args.queries)
+        loggers = {"eager": _create_eager_logger(tmp_dir),
+                   "queued": create_logger(tmp_dir, "queued.log", "info")}
+        Search.load(loggers["queued"])
+        Search.search_many(queries, args.summary_num, loggers["queued"])
+        print("corpus size: %d, queries: %d, summary num: %d"
+              % (args.corpus_size, args.queries, args.summary_num))
+        timings = {}
+        for name, logger in loggers.items():
+            timings[name] = min(_time_searches(queries, args.summary_num, logger,
+                                               name == "eager")
+                                for _ in range(args.rounds))
+            print("%-8s %8.3fms per search" % (name, timings[name]))
+        print("saved    %8.3fms per search (%.1fx)"
+              % (timings["eager"] - timings["queued"],
+                 timings["eager"] / timings["queued"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This script benchmarks the hot paths of the search engine and the server
+# on synthetic corpora of increasing size:
+#   load: time and memory taken to load the corpus and build the index
+#   search: latency of Search.get_query_search_results for cold queries
+#           (not cached) and warm queries (served from the result cache)
+#   api: throughput of the batch endpoint through the Flask test client
+# Results are saved as json, and can be compared with the results of an
+# earlier run to catch the regressions.
+# To run the benchmarks
+# python benchmarks/run_benchmarks.py --corpus-sizes 1000 10000 100000
+# To compare with an earlier run
+# python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+# To benchmark the bm25 ranking with the pruned top K retrieval
+# python benchmarks/run_benchmarks.py --ranking-mode bm25 --top-k-pruning
+
+import argparse
+import json
+import logging
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from os import cpu_count, makedirs, path
+
+from benchmarks.corpus import (generate_queries, generate_summaries, use_corpus,
+                               write_corpus)
+from search.config import Config
+from search.search_summary import Search
+
+RESULTS_DIR = path.join(path.dirname(__file__), "results")
+# Change of a timing beyond this fraction is reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+def _get_logger() -> logging.Logger:
+    """
+    Function to get the logger used by the benchmarks, records are built
+    like in the server but not written anywhere
+    """
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+def _percentiles(timings: list) -> dict:
+    """
+    Function to summarize the timings in ms
+    """
+    timings = sorted(timings)
+    if not timings:
+        return {}
+    return {
+        "count": len(timings),
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ms": timings[-1]
+    }
+
+
+def bench_load(data_dir: str, cache_size: int, logger) -> dict:
+    """
+    Function to measure the time and python memory taken by Search.load
+    """
+    start = time.perf_counter()
+    Search.load(logger)
+    elapsed = (time.perf_counter() - start) * 1000
+    # Loaded again to measure the memory as tracing slows down the loading
+    use_corpus(data_dir, cache_size)
+    tracemalloc.start()
+    Search.load(logger)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "time_ms": elapsed,
+        "memory_mb": current / 2 ** 20,
+        "peak_memory_mb": peak / 2 ** 20,
+        "words": len(Search.INDEX)
+    }
+
+
+def bench_search(queries: list, summary_num: int, logger) -> dict:
+    """
+    Function to measure the latency of the queries of the workload, the
+    first search of a query is cold and the repeated ones are warm
+    """
+    cold, warm = [], []
+    seen = set()
+    for query in queries:
+        start = time.perf_counter()
+        Search(query, summary_num, logger).get_query_search_results()
+        elapsed = (time.perf_counter() - start) * 1000
+        (warm if query in seen else cold).append(elapsed)
+        seen.add(query)
+    return {"cold": _percentiles(cold), "warm": _percentiles(warm),
+            "cache": Search.RESULT_CACHE.stats()}
+
+
+def bench_api(queries: list, summary_num: int, batch_size: int, logger) -> dict:
+    """
+    Function to measure the throughput of the batch endpoint, authors are
+    served from a prefilled author table so no http requests are made
+    """
+    # Imported here as the server module needs flask
+    import src.server as server
+    from src.authors import AuthorResolver, AuthorTable
+    book_ids = Search.get_summary_ids()
+    authors = dict((str(book_id), "Author %d" % book_id) for book_id in book_ids)
+    server.logger = logger
+    server.author_resolver = AuthorResolver("http://127.0.0.1:9", authors, logger)
+    server.author_table = AuthorTable(server.author_resolver, None, logger)
+    server.author_table.warm_up(book_ids)
+    server.request_pipeline.start()
+    client = server.app.test_client()
+    timings = []
+    start = time.perf_counter()
+    for batch_start in range(0, len(queries), batch_size):
+        data = json.dumps({"queries": queries[batch_start:batch_start + batch_size],
+                           "K": summary_num})
+        request_start = time.perf_counter()
+        resp = client.post("/api/v1/get-matching-summaries", data=data)
+        timings.append((time.perf_counter() - request_start) * 1000)
+        if resp.status_code != 200:
+            raise Exception("Batch request failed with status: %d" % resp.status_code)
+    elapsed = time.perf_counter() - start
+    server.request_pipeline.shutdown()
+    server.author_resolver.close()
+    return {"requests": _percentiles(timings),
+            "queries_per_sec": len(queries) / elapsed if elapsed else 0}
+
+
+def run(corpus_sizes: list, num_queries: int, repeat_rate: float, summary_num: int,
+        batch_size: int, cache_size: int) -> dict:
+    """
+    Function to run all the benchmarks for each of the corpus sizes
+    """
+    logger = _get_logger()
+    results = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "params": {"num_queries": num_queries, "repeat_rate": repeat_rate,
+                   "summary_num": summary_num, "batch_size": batch_size,
+                   "cache_size": cache_size, "ranking_mode": Config.RANKING_MODE,
+                   "top_k_pruning": Config.TOP_K_PRUNING},
+        "corpora": {}
+    }
+    queries = generate_queries(num_queries, repeat_rate)
+    for corpus_size in corpus_sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            use_corpus(write_corpus(generate_summaries(corpus_size), tmp_dir), cache_size)
+            corpus_results = {"load": bench_load(tmp_dir, cache_size, logger),
+                              "search": bench_search(queries, summary_num, logger)}
+            # The api is benchmarked with an empty result cache
+            use_corpus(tmp_dir, cache_size)
+            Search.load(logger)
+            corpus_results["api"] = bench_api(queries, summary_num, batch_size, logger)
+        results["corpora"][str(corpus_size)] = corpus_results
+        print("corpus size: %d, load: %.1fms, cold p50: %.3fms, warm p50: %.3fms, "
+              "api: %.0f queries/sec"
+              % (corpus_size, corpus_results["load"]["time_ms"],
+                 corpus_results["search"]["cold"].get("p50_ms", 0),
+                 corpus_results["search"]["warm"].get("p50_ms", 0),
+                 corpus_results["api"]["queries_per_sec"]))
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """
+    Function to compare the timings of the results with the baseline
+    Returns:
+        list of regression messages, empty if there are none
+    """
+    metrics = [
+        ("load time", lambda res: res["load"]["time_ms"]),
+        ("load memory", lambda res: res["load"]["memory_mb"]),
+        ("cold p50", lambda res: res["search"]["cold"].get("p50_ms")),
+        ("warm p50", lambda res: res["search"]["warm"].get("p50_ms")),
+        ("api request p50", lambda res: res["api"]["requests"].get("p50_ms"))
+    ]
+    regressions = []
+    for corpus_size, corpus_results in results["corpora"].items():
+        base_results = baseline.get("corpora", {}).get(corpus_size)
+        if not base_results:
+            continue
+        for name, metric in metrics:
+            value, base_value = metric(corpus_results), metric(base_results)
+            if value and base_value and value > base_value * (1 + REGRESSION_THRESHOLD):
+                regressions.append("corpus size: %s, %s: %.3f -> %.3f (+%.0f%%)"
+                                   % (corpus_size, name, base_value, value,
+                                      (value / base_value - 1) * 100))
+    return regressions
+
+
+def _get_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser("Benchmark the search engine and the server.")
+    arg_parser.add_argument("--corpus-sizes", type=int, nargs="+",
+                            default=[1000, 10000, 100000],
+                            help="no of summaries of the synthetic corpora, up to 1000000.")
+    arg_parser.add_argument("--queries", type=int, default=2000,
+                            help="no of queries in the workload.")
+    arg_parser.add_argument("--repeat-rate", type=float, default=0.3,
+                            help="fraction of the queries repeating an earlier query.")
+    arg_parser.add_argument("--summary-num", type=int, default=5)
+    arg_parser.add_argument("--batch-size", type=int, default=20,
+                            help="no of queries in an api request.")
+    arg_parser.add_argument("--cache-size", type=int, default=10000)
+    arg_parser.add_argument("--ranking-mode", default=Config.RANKING_MODE,
+                            choices=["count", "bm25", "tfidf"])
+    arg_parser.add_argument("--top-k-pruning", action="store_true",
+                            help="rank only the top summaries of the queries with MaxScore.")
+    arg_parser.add_argument("--output", help="json file to save the results, "
+                                             "saved in benchmarks/results by default.")
+    arg_parser.add_argument("--compare", help="json file of an earlier run.")
+    args = arg_parser.parse_args()
+    Config.RANKING_MODE = args.ranking_mode
+    Config.TOP_K_PRUNING = Config.TOP_K_PRUNING or args.top_k_pruning
+    results = run(args.corpus_sizes, args.queries, args.repeat_rate, args.summary_num,
+                  args.batch_size, args.cache_size)
+    output = args.output
+    if not output:
+        makedirs(RESULTS_DIR, exist_ok=True)
+        output = path.join(RESULTS_DIR, "benchmark-%s.json"
+                           % time.strftime("%Y%m%d-%H%M%S"))
+    with open(output, "w") as fp:
+        json.dump(results, fp, indent=4)
+    print("Results are saved in: %s" % output)
+    if args.compare:
+        with open(args.compare) as fp:
+            regressions = compare(results, json.load(fp))
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
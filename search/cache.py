@@ -0,0 +1,404 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to cache the search results of the queries in memory.
+# The cache is bounded in size, least recently used queries are evicted
+# first and entries can expire after a ttl. Optionally the cache is backed by
+# a json lines file to which every new entry is appended, so the cache can be
+# restored on restart without rewriting the whole file on every update.
+# Values which are not json serializable are converted with the encode and
+# decode functions while writing and reading the store.
+# Entries are tagged with the version of the data they are computed from,
+# entries of the store having another version are not loaded, and changes
+# to the data invalidate only the entries they affect.
+# The store can be shared by many processes. New entries are batched for
+# flush_interval seconds before they are appended, and the appends and
+# the compactions are done under the lock of the store file. Values are
+# encoded when they are flushed, without holding the lock of the cache, so
+# the lookups do not wait for the encoding or the writes. A compaction
+# merges the entries appended by the other processes and replaces the store
+# atomically, so no entry is lost or partially written.
+#
+# Sample Usage
+# cache = ResultCache(max_size=1000, ttl=3600, store_file="C:/Dev/cache.jsonl",
+#                     flush_interval=1)
+# cache.put("is your problems", [48, 12, 25])
+# cache.get("is your problems")
+# [48, 12, 25]
+# cache.stats()
+# {"size": 1, "hits": 1, "misses": 0, "evictions": 0}
+# cache.invalidate(lambda key: "problems" in key.split(" "), version=1)
+# 1
+# cache.flush()
+#
+# Score vectors of the query words are cached separately, bounded by their
+# approximate size in bytes, as the score of a query is the sum of the
+# score vectors of its words.
+# term_cache = TermVectorCache(max_bytes=64 * 1024 * 1024)
+# term_cache.put("problems", [(0, 2), (48, 1)], 200)
+# term_cache.get("problems")
+# [(0, 2), (48, 1)]
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from os import path
+
+from utilities.file_store import atomic_write, file_lock
+
+
+class ResultCache:
+    """
+    Class which is used to cache the results of the queries with LRU
+    eviction and optional ttl and persistence
+    """
+    # Store is compacted once it has these many times more lines than entries
+    COMPACTION_FACTOR = 2
+
+    def __init__(self, max_size: int, ttl: float=None, store_file: str=None,
+                 logger=None, encode=None, decode=None, version=0,
+                 flush_interval: float=0, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store_file = store_file
+        self.logger = logger
+        self.encode = encode
+        self.decode = decode
+        # Version of the data the cached values are computed from, any json
+        # value compared for equality
+        self.version = version
+        # Function returning the current time in seconds of the entries
+        self.clock = clock
+        # Map of key and (time of insertion, value) in the LRU order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._store_lines = 0
+        # Seconds the new entries wait before they are appended to the
+        # store, 0 appends every entry at once
+        self.flush_interval = flush_interval
+        # New entries not appended yet, (key, time of insertion, value,
+        # version)
+        self._pending = []
+        self._flush_timer = None
+        # Flushes and compactions of the store are done one at a time
+        self._flush_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if store_file:
+            self._load_store()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Function to get the cached value of the key
+        Args:
+            key: cache key
+        Returns:
+            cached value, None if the key is not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value, version=None):
+        """
+        Function to cache the value of the key, least recently used keys
+        are evicted if the cache is full
+        Args:
+            key: cache key
+            value: value to be cached, json serializable after encode
+            version: version of the data the value is computed from, the
+            value is not cached if the data has changed since
+        """
+        inserted_at = self.clock()
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._insert(key, inserted_at, value)
+            if not self.store_file:
+                return
+            self._pending.append((key, inserted_at, value, self.version))
+            flush_now = self._schedule_flush()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """
+        Function to encode the pending entries and append them to the store,
+        the store is rewritten with only the live entries once it grows too
+        large
+        """
+        if not self.store_file:
+            return
+        with self._flush_lock:
+            with self._lock:
+                self._flush_timer = None
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            lines = self._store_lines + len(pending)
+            if lines >= self.COMPACTION_FACTOR * max(self.max_size, 1):
+                self._compact_store()
+            else:
+                self._append_to_store(pending)
+
+    def invalidate(self, is_stale, version) -> int:
+        """
+        Function to drop the cached keys affected by a change of the data
+        and move the cache to the new version of the data
+        Args:
+            is_stale: function returning True for the keys to be dropped
+            version: version of the changed data
+        Returns:
+            no of keys dropped
+        """
+        with self._lock:
+            stale_keys = [key for key in self._entries if is_stale(key)]
+            for key in stale_keys:
+                del self._entries[key]
+            self.version = version
+        # Store is rewritten so that the remaining entries are tagged with
+        # the new version
+        if self.store_file:
+            with self._flush_lock:
+                self._compact_store()
+        return len(stale_keys)
+
+    def stats(self) -> dict:
+        """
+        Function to get the cache counters
+        Returns:
+            {"size": 10, "hits": 20, "misses": 10, "evictions": 0}
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _is_expired(self, inserted_at: float) -> bool:
+        return self.ttl is not None and self.clock() - inserted_at > self.ttl
+
+    def _insert(self, key: str, inserted_at: float, value):
+        self._entries[key] = (inserted_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load_store(self):
+        """
+        Function to restore the cache from the store file, later lines
+        of the same key override the earlier ones
+        """
+        with file_lock(self.store_file):
+            stored = self._read_store()
+        for key, (inserted_at, value, _) in stored.items():
+            if self.decode:
+                value = self.decode(value)
+            self._insert(key, inserted_at, value)
+        # Loading should not be counted as evictions
+        self.evictions = 0
+
+    def _read_store(self) -> OrderedDict:
+        """
+        Function to read the live entries of the store file, it is called
+        with the file lock held
+        Returns:
+            map of key and (time of insertion, value, store line) in the
+            order of the last line of the keys
+        """
+        stored = OrderedDict()
+        self._store_lines = 0
+        if not path.exists(self.store_file):
+            return stored
+        try:
+            with open(self.store_file, "r", encoding="utf-8") as fp:
+                for line in fp:
+                    if not line.strip():
+                        continue
+                    self._store_lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written line only loses that entry
+                        continue
+                    # Lines written without the version are not loaded
+                    if not isinstance(entry, list) or len(entry) != 4:
+                        continue
+                    key, inserted_at, value, version = entry
+                    if version == self.version and not self._is_expired(inserted_at):
+                        stored[key] = (inserted_at, value, line if line.endswith("\n")
+                                       else line + "\n")
+                        stored.move_to_end(key)
+        except OSError as err:
+            self._log_error("Error while loading the cache store: %s, Error: %s"
+                            % (self.store_file, err))
+        return stored
+
+    def _schedule_flush(self) -> bool:
+        """
+        Function to schedule the flush of the pending entries once the flush
+        interval has passed, it is called with the cache lock held
+        Returns:
+            True if the entries are to be flushed now by the caller
+        """
+        if self.flush_interval <= 0:
+            return True
+        # Timers of the parent process are not alive after a fork
+        if self._flush_timer is None or not self._flush_timer.is_alive():
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+        return False
+
+    def _append_to_store(self, pending: list):
+        """
+        Function to append the entries to the store file in one write, it is
+        called with the flush lock held
+        Args:
+            pending: list of (key, time of insertion, value, version)
+        """
+        lines = [self._dump_entry(*entry) for entry in pending]
+        try:
+            with file_lock(self.store_file):
+                with open(self.store_file, "a", encoding="utf-8") as fp:
+                    fp.write("".join(lines))
+            self._store_lines += len(lines)
+        except OSError as err:
+            self._log_error("Error while appending to the cache store: %s, Error: %s"
+                            % (self.store_file, err))
+
+    def _compact_store(self):
+        """
+        Function to replace the store with the live entries of this cache
+        and the entries of the store appended by the other processes,
+        newer entries of a key win and only the max_size newest are kept.
+        It is called with the flush lock held, the entries are encoded
+        without holding the cache lock.
+        """
+        with self._lock:
+            # Pending entries are in the entries written by the compaction
+            self._pending = []
+            version = self.version
+            entries = list(self._entries.items())
+        try:
+            with file_lock(self.store_file):
+                stored = self._read_store()
+                for key, (inserted_at, value) in entries:
+                    if key not in stored or stored[key][0] <= inserted_at:
+                        stored[key] = (inserted_at, None,
+                                       self._dump_entry(key, inserted_at, value, version))
+                lines = [line for _, _, line in sorted(stored.values(),
+                                                       key=lambda item: item[0])]
+                lines = lines[max(len(lines) - self.max_size, 0):]
+                atomic_write(self.store_file, lambda fp: fp.writelines(lines))
+            self._store_lines = len(lines)
+        except OSError as err:
+            self._log_error("Error while compacting the cache store: %s, Error: %s"
+                            % (self.store_file, err))
+
+    def _dump_entry(self, key: str, inserted_at: float, value, version) -> str:
+        if self.encode:
+            value = self.encode(value)
+        return json.dumps([key, inserted_at, value, version], separators=(",", ":")) + "\n"
+
+    def _log_error(self, message: str):
+        if self.logger:
+            self.logger.error(message)
+
+
+class TermVectorCache:
+    """
+    Class which is used to cache the score vectors of the query words with
+    LRU eviction, bounded by the total size of the vectors
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Map of word and (vector, size in bytes) in the LRU order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str):
+        """
+        Function to get the cached vector of the word
+        Args:
+            key: word
+        Returns:
+            cached vector, None if the word is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value, size: int):
+        """
+        Function to cache the vector of the word, least recently used words
+        are evicted until the vectors fit in the budget. Vectors larger than
+        the whole budget are not cached.
+        Args:
+            key: word
+            value: vector of the word
+            size: approximate size of the vector in bytes
+        """
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Function to drop all the cached vectors
+        """
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Function to get the cache counters
+        Returns:
+            {"size": 10, "bytes": 4096, "hits": 20, "misses": 10, "evictions": 0}
+        """
+        return {
+            "size": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
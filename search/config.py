@@ -1,12 +1,71 @@
 from os import path
 
 class Config:
-    # Cache file name
-    CACHE_FILE = "cache.json"
+    # Cache file name, cached results are appended to it as json lines
+    # None to keep the result cache only in memory
+    CACHE_FILE = "cache.jsonl"
+    # Max no of queries kept in the result cache
+    CACHE_SIZE = 10000
+    # Seconds after which a cached result expires, None to never expire
+    CACHE_TTL = None
+    # Seconds the new cached results are batched before they are appended
+    # to the cache file, 0 appends every result at once
+    CACHE_FLUSH_INTERVAL = 1.0
+    # No of top summaries of a query ranking written to the cache file,
+    # the pages past them are searched again after a restart
+    CACHE_STORED_RESULTS = 1000
+    # Binary corpus file compiled from the input json file, it is used
+    # instead of the input json file if it exists and is up to date
+    # Build it with: python search/corpus.py
+    CORPUS_FILE = "corpus.bin"
+    # Updates file name, changes made to the summaries at runtime are
+    # appended to it as json lines and applied by all the processes
+    # None to apply the changes only in the process making them
+    UPDATES_FILE = "updates.jsonl"
     # Data directory for cache and input json files
     DATA_DIR = "data"
+    # Backend used to score the summaries, "python" or "numpy"
+    # numpy falls back to python if it is not installed
+    SCORING_BACKEND = "python"
+    # Ranking of the summaries, "count" ranks by the no of occurences of
+    # the query words, "bm25" and "tfidf" weigh them by the rarity of the
+    # words and the length of the summaries
+    RANKING_MODE = "count"
+    # bm25 parameters, saturation of the occurences and length normalization
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    # Rank only the top summaries of the queries with MaxScore, summaries
+    # which cannot enter them are not fully scored
+    TOP_K_PRUNING = False
+    # No of summaries ranked by the pruned retrieval of a query, pages
+    # beyond them are ranked exhaustively
+    PRUNED_TOP_K = 100
+    # Memory budget in MB of the weighted postings of the query words
+    # cached by the python backend, new queries add up the cached words
+    # and only the other words are read from the index, 0 turns it off.
+    # The count mode caches only the postings of the corpus file
+    TERM_CACHE_SIZE_MB = 64
     # Input json file
     INPUT_FILE = "input.json"
+    # Time the stages of the searches and the server requests for the
+    # metrics, False turns off the timers
+    METRICS_ENABLED = True
+    # Normalization of the summary and query words, the binary corpus file
+    # is rebuilt and the cached results are dropped when they change
+    # Case fold the words
+    CASE_FOLD = True
+    # Split the words on punctuation, False splits them only on whitespace:
+    # spaces, tabs and newlines
+    STRIP_PUNCTUATION = True
+    # Lower case the words and split them only on the space character like
+    # the first versions of the engine, for the same rankings as them.
+    # CASE_FOLD and STRIP_PUNCTUATION are not used when it is True
+    LEGACY_SPLIT = False
+    # Stemmer of the words, "light" or None
+    STEMMER = None
+    # Words which are not indexed or matched, "english", a list of words
+    # or None
+    STOPWORDS = None
     # Log directory
     LOG_DIR = path.join(path.dirname(path.dirname(__file__)), "logs")
     # Log file name
@@ -0,0 +1,367 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module compiles the summaries of the input json file into a binary
+# corpus file and loads it with mmap. Loading only maps the file, the
+# pages are read on demand and shared by all the processes mapping it,
+# and a summary is decoded only when it is returned in the results.
+# The file also has the postings lists of the inverted index, so the index
+# is not built at startup.
+#
+# File layout, all the integers are little endian:
+#   header: magic, format version, no of summaries, no of words, tokenizer
+#   section table: start of each section and the end of the file
+#   ids: int64 id of each summary
+#   text offsets, text blob: utf-8 summary texts
+#   token offsets, token ids: word ids of each summary in their order
+#   word offsets, word blob: utf-8 words in sorted order, word id is the
+#                            position of the word
+#   postings offsets, postings summaries, postings frequencies: postings
+#                            lists of the words in the word id order
+#
+# Sample Usage
+# build_corpus("C:/Dev/input.json", "C:/Dev/corpus.bin")
+# corpus = MappedCorpus("C:/Dev/corpus.bin")
+# corpus[48]
+# {"id": 48, "summary": "....."}
+# corpus.index.postings("problems")
+# [(0, 2), (48, 1), ...]
+# To build the corpus file of the search data directory
+# python search/corpus.py
+
+import argparse
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from os import path
+
+from search.index import NORMALIZER, InvertedIndex, tokenize
+from utilities.file_store import atomic_write
+from utilities.json_parser import load_json
+
+MAGIC = b"SRCHCORP"
+FORMAT_VERSION = 1
+# magic, format version, no of summaries, no of words, tokenizer name
+HEADER = struct.Struct("<8sIII32s")
+IDS, TEXT_OFFSETS, TEXT, TOKEN_OFFSETS, TOKEN_IDS, WORD_OFFSETS, WORDS, \
+    POSTINGS_OFFSETS, POSTINGS_DOCS, POSTINGS_FREQUENCIES = range(10)
+NUM_SECTIONS = 10
+SECTION_TABLE = struct.Struct("<%dQ" % (NUM_SECTIONS + 1))
+
+
+class CorpusFormatError(Exception):
+    """
+    Error raised when the corpus file can not be loaded by this version
+    """
+
+
+def build_corpus(input_file: str, output_file: str, summaries_key: str="summaries",
+                 summary_key: str="summary") -> int:
+    """
+    Function to compile the summaries of the input json file into the
+    binary corpus file
+    Args:
+        input_file: input json file path
+        output_file: corpus file path
+        summaries_key: key of the summaries in the input json
+        summary_key: key of the summary text in a summary
+    Returns:
+        no of summaries in the corpus
+    """
+    input_data, err, trace = load_json(input_file)
+    if err:
+        raise Exception("Unable to load the json file: %s, Error: %s, Trace:%s"
+                        % (input_file, err, trace))
+    summaries = input_data[summaries_key]
+    texts = [summary[summary_key].encode("utf-8") for summary in summaries]
+    token_streams = [tokenize(summary[summary_key]) for summary in summaries]
+    words = sorted(set(token for tokens in token_streams for token in tokens))
+    word_ids = dict((word, word_id) for word_id, word in enumerate(words))
+
+    token_offsets = array("Q", [0])
+    token_ids = array("I")
+    postings = [[] for _ in words]
+    for doc_index, tokens in enumerate(token_streams):
+        stream = [word_ids[token] for token in tokens]
+        token_ids.extend(stream)
+        token_offsets.append(len(token_ids))
+        for word_id, frequency in Counter(stream).items():
+            postings[word_id].append((doc_index, frequency))
+    postings_offsets = array("Q", [0])
+    postings_docs = array("I")
+    postings_frequencies = array("I")
+    for word_postings in postings:
+        for doc_index, frequency in word_postings:
+            postings_docs.append(doc_index)
+            postings_frequencies.append(frequency)
+        postings_offsets.append(len(postings_docs))
+
+    encoded_words = [word.encode("utf-8") for word in words]
+    sections = [
+        array("q", [summary["id"] for summary in summaries]).tobytes(),
+        _offsets(texts).tobytes(),
+        b"".join(texts),
+        token_offsets.tobytes(),
+        token_ids.tobytes(),
+        _offsets(encoded_words).tobytes(),
+        b"".join(encoded_words),
+        postings_offsets.tobytes(),
+        postings_docs.tobytes(),
+        postings_frequencies.tobytes()
+    ]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(summaries), len(words),
+                         NORMALIZER.name.encode("ascii"))
+    # Sections start at multiples of 8 bytes
+    starts = []
+    position = _align(HEADER.size + SECTION_TABLE.size)
+    for section in sections:
+        starts.append(position)
+        position = _align(position + len(section))
+
+    def write(fp):
+        fp.write(header)
+        fp.write(SECTION_TABLE.pack(*starts, position))
+        for start, section in zip(starts, sections):
+            fp.write(b"\0" * (start - fp.tell()))
+            fp.write(section)
+        fp.write(b"\0" * (position - fp.tell()))
+
+    # Processes mapping the old file keep reading it until they reload,
+    # it is replaced and not written in place
+    atomic_write(output_file, write, encoding=None)
+    return len(summaries)
+
+
+def _offsets(blobs: list) -> array:
+    offsets = array("Q", [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return offsets
+
+
+def _align(position: int) -> int:
+    return (position + 7) // 8 * 8
+
+
+class MappedCorpus:
+    """
+    Class which gives the summaries of the memory mapped corpus file as a
+    read only list of summary dicts
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with open(file_path, "rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, self.num_docs, self.num_words, tokenizer = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CorpusFormatError("Unsupported corpus file: %s" % file_path)
+        self.tokenizer = tokenizer.rstrip(b"\0").decode("ascii")
+        if self.tokenizer != NORMALIZER.name:
+            raise CorpusFormatError("Corpus file: %s is tokenized with: %s, expected: %s"
+                                    % (file_path, self.tokenizer, NORMALIZER.name))
+        bounds = SECTION_TABLE.unpack_from(buffer, HEADER.size)
+        formats = ["q", "Q", "B", "Q", "I", "Q", "B", "Q", "I", "I"]
+        self._sections = [buffer[bounds[section]:bounds[section + 1]].cast(formats[section])
+                          for section in range(NUM_SECTIONS)]
+        # Padding after the sections is dropped from the typed views
+        self._ids = self._sections[IDS][:self.num_docs]
+        self._text_offsets = self._sections[TEXT_OFFSETS][:self.num_docs + 1]
+        self._token_offsets = self._sections[TOKEN_OFFSETS][:self.num_docs + 1]
+        self._word_offsets = self._sections[WORD_OFFSETS][:self.num_words + 1]
+        self._postings_offsets = self._sections[POSTINGS_OFFSETS][:self.num_words + 1]
+        self._words = _WordList(self)
+        self.index = MappedIndex(self)
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def __getitem__(self, doc_index: int) -> dict:
+        """
+        Function to decode the summary
+        Returns:
+            {"id": 48, "summary": "....."}
+        """
+        if doc_index < 0:
+            doc_index += self.num_docs
+        if not 0 <= doc_index < self.num_docs:
+            raise IndexError("summary index out of range")
+        start, end = self._text_offsets[doc_index], self._text_offsets[doc_index + 1]
+        return {"id": self._ids[doc_index],
+                "summary": bytes(self._sections[TEXT][start:end]).decode("utf-8")}
+
+    def __iter__(self):
+        for doc_index in range(self.num_docs):
+            yield self[doc_index]
+
+    def ids(self) -> list:
+        """
+        Function to get the ids of all the summaries without decoding them
+        """
+        return self._ids.tolist()
+
+    def token_ids(self, doc_index: int):
+        """
+        Function to get the word ids of the summary in their order
+        Returns:
+            memoryview of the word ids
+        """
+        start, end = self._token_offsets[doc_index], self._token_offsets[doc_index + 1]
+        return self._sections[TOKEN_IDS][start:end]
+
+    def token_offsets(self):
+        """
+        Function to get the start of the word ids of each summary and
+        the end of the last one
+        Returns:
+            memoryview of the offsets
+        """
+        return self._token_offsets
+
+    def word(self, word_id: int) -> str:
+        start, end = self._word_offsets[word_id], self._word_offsets[word_id + 1]
+        return bytes(self._sections[WORDS][start:end]).decode("utf-8")
+
+    def word_id(self, word: str) -> int:
+        """
+        Function to get the id of the word by binary search over the sorted
+        words
+        Returns:
+            word id, None if the word is not in the corpus
+        """
+        word_id = bisect_left(self._words, word)
+        if word_id < self.num_words and self._words[word_id] == word:
+            return word_id
+        return None
+
+    def word_postings(self, word_id: int) -> tuple:
+        """
+        Function to get the postings list of the word
+        Returns:
+            (memoryview of summary indexes, memoryview of frequencies)
+        """
+        start, end = self._postings_offsets[word_id], self._postings_offsets[word_id + 1]
+        return (self._sections[POSTINGS_DOCS][start:end],
+                self._sections[POSTINGS_FREQUENCIES][start:end])
+
+    def postings_arrays(self) -> tuple:
+        """
+        Function to get the postings lists of all the words
+        Returns:
+            (postings offsets of the words in word id order, summary indexes,
+             frequencies) as memoryviews
+        """
+        return (self._postings_offsets,
+                self._sections[POSTINGS_DOCS][:self._postings_offsets[-1]],
+                self._sections[POSTINGS_FREQUENCIES][:self._postings_offsets[-1]])
+
+
+class _WordList:
+    """
+    Class which gives the sorted words of the corpus as a list for bisect
+    """
+
+    def __init__(self, corpus: MappedCorpus):
+        self._corpus = corpus
+
+    def __len__(self) -> int:
+        return self._corpus.num_words
+
+    def __getitem__(self, word_id: int) -> str:
+        return self._corpus.word(word_id)
+
+
+class MappedIndex(InvertedIndex):
+    """
+    Class which reads the postings lists of the inverted index from the
+    memory mapped corpus file
+    """
+
+    def __init__(self, corpus: MappedCorpus):
+        self._corpus = corpus
+        self.num_docs = corpus.num_docs
+        self._positions = {}
+        self._num_changes = 0
+
+    def __len__(self) -> int:
+        return self._corpus.num_words
+
+    def terms(self) -> list:
+        return [self._corpus.word(word_id) for word_id in range(self._corpus.num_words)]
+
+    def postings(self, term: str) -> list:
+        word_id = self._corpus.word_id(term)
+        if word_id is None:
+            return []
+        doc_indexes, frequencies = self._corpus.word_postings(word_id)
+        return list(zip(doc_indexes, frequencies))
+
+    def postings_arrays(self) -> tuple:
+        return self._corpus.postings_arrays()
+
+    def token_stream(self, doc_index: int):
+        return self._corpus.token_ids(doc_index)
+
+    def term_id(self, term: str) -> int:
+        return self._corpus.word_id(term)
+
+    def doc_lengths(self) -> list:
+        offsets = self._corpus.token_offsets()
+        return [offsets[doc_index + 1] - offsets[doc_index]
+                for doc_index in range(self.num_docs)]
+
+    def document_frequency(self, term: str) -> int:
+        word_id = self._corpus.word_id(term)
+        if word_id is None:
+            return 0
+        return len(self._corpus.word_postings(word_id)[0])
+
+    def term(self, term_id: int) -> str:
+        return self._corpus.word(term_id)
+
+
+def load_corpus(file_path: str, input_file: str=None, logger=None) -> MappedCorpus:
+    """
+    Function to load the corpus file if it is usable
+    Args:
+        file_path: corpus file path
+        input_file: input json file the corpus is built from, corpus older
+        than it is not used
+        logger: logger object
+    Returns:
+        MappedCorpus, None if the file is missing, stale or not supported
+    """
+    if not path.exists(file_path):
+        return None
+    if input_file and path.exists(input_file) and \
+            path.getmtime(input_file) > path.getmtime(file_path):
+        if logger:
+            logger.warning("Corpus file: %s is older than: %s, rebuild it with "
+                           "python search/corpus.py", file_path, input_file)
+        return None
+    try:
+        return MappedCorpus(file_path)
+    except (CorpusFormatError, OSError, ValueError, struct.error) as err:
+        if logger:
+            logger.warning("Unable to load the corpus file: %s, Error: %s",
+                           file_path, err)
+        return None
+
+
+if __name__ == "__main__":
+    from search.config import Config
+    data_dir = path.join(path.dirname(__file__), Config.DATA_DIR)
+    arg_parser = argparse.ArgumentParser("Build the binary corpus file.")
+    arg_parser.add_argument("--input", default=path.join(data_dir, Config.INPUT_FILE),
+                            help="input json file.")
+    arg_parser.add_argument("--output", default=path.join(data_dir, Config.CORPUS_FILE),
+                            help="corpus file to be built.")
+    args = arg_parser.parse_args()
+    num_docs = build_corpus(args.input, args.output)
+    print("Corpus file: %s is built with %d summaries" % (args.output, num_docs))
@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to search large batches of queries in parallel on
+# a pool of worker processes created once at startup. Each worker loads
+# the search data in its initializer, so the batches only send the
+# queries and receive the results. Batches smaller than the threshold
+# are searched in the calling process, where sending them to the workers
+# costs more than it saves.
+#
+# Sample Usage
+# executor = QueryExecutor(processes=4, min_batch=64, logger=logger)
+# executor.start()
+# executor.search_many(queries, summary_num, query_field="query")
+# executor.shutdown()
+
+from concurrent.futures import ProcessPoolExecutor
+
+from search.search_summary import Search
+
+# Logger of the worker process
+_worker_logger = None
+
+
+def _init_worker(logger):
+    """
+    Function to load the search data once in the worker process
+    """
+    global _worker_logger
+    _worker_logger = logger
+    Search.load(logger)
+
+
+def _ping():
+    return True
+
+
+def _search_chunk(queries: list, summary_num: int, page: int, query_field: str) -> list:
+    """
+    Function to search a chunk of the batch in the worker process
+    """
+    return Search.search_many(queries, summary_num, _worker_logger, page, query_field)
+
+
+class QueryExecutor:
+    """
+    Class which searches the batches of queries in the calling process or
+    shards them across the pool of worker processes
+    """
+
+    def __init__(self, processes: int, min_batch: int, logger=None):
+        self.processes = processes
+        self.min_batch = min_batch
+        self.logger = logger
+        self._pool = None
+
+    def start(self):
+        """
+        Function to start the worker processes and wait for them to load
+        the search data, no processes are started if processes is 0
+        """
+        if not self.processes:
+            return
+        self._pool = ProcessPoolExecutor(max_workers=self.processes,
+                                         initializer=_init_worker,
+                                         initargs=(self.logger,))
+        # Workers are started and initialized with the first task
+        self._pool.submit(_ping).result()
+        if self.logger:
+            self.logger.info("Query executor is started with %d processes",
+                             self.processes)
+
+    def search_many(self, queries: list, summary_num: int, page: int=0,
+                    query_field: str=None) -> list:
+        """
+        Function to get the relevant summaries for many queries, as returned
+        by Search.search_many. Unique queries of large batches are split into
+        one chunk per worker process.
+        Args:
+            queries: list of queries
+            summary_num: no of summaries to return for each query
+            page: page of summary_num results to return
+            query_field: if given, the query is added to each of its results
+            with this key
+        Returns:
+            list of results for each query
+        """
+        unique_queries = list(dict.fromkeys(queries))
+        if self._pool is None or len(unique_queries) < self.min_batch:
+            return Search.search_many(queries, summary_num, self.logger, page,
+                                      query_field)
+        chunk_size = -(-len(unique_queries) // self.processes)
+        futures = [
+            self._pool.submit(_search_chunk, unique_queries[start:start + chunk_size],
+                              summary_num, page, query_field)
+            for start in range(0, len(unique_queries), chunk_size)
+        ]
+        results = {}
+        for start, future in zip(range(0, len(unique_queries), chunk_size), futures):
+            for query, result in zip(unique_queries[start:start + chunk_size],
+                                     future.result()):
+                results[query] = result
+        return [results[query] for query in queries]
+
+    def shutdown(self):
+        """
+        Function to stop the worker processes
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
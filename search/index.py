@@ -0,0 +1,336 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module builds the inverted index over the summaries which is
+# used by the search engine to score only the summaries containing
+# the query words instead of scanning the whole corpus for every query.
+#
+# Sample Usage
+# index = InvertedIndex(summaries, "summary")
+# index.postings("problems")
+# [(0, 2), (48, 1), ...]
+# index.get_match_scores(["is", "your", "problems"])
+# {0: 5, 12: 3, 48: 7, ...}
+# index.get_match_scores_many([["is", "your"], ["problems"]])
+# [{0: 3, 12: 3, ...}, {0: 2, 48: 1, ...}]
+# index.remove_document(48)
+# index.add_document(48, "...new summary...")
+# [index.term(term_id) for term_id in index.token_stream(48)]
+# ["the", "book", "in", ...]
+# index.positions("problems")
+# {0: array("I", [4, 17]), 48: array("I", [2])}
+# index.match_phrase(("your", "problems"))
+# {0, 48}
+# index.match_near("gift", "problems", 3)
+# {48}
+
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from search.config import Config
+from search.tokenizer import Normalizer
+
+# Normalizer of the summaries and the queries, files storing the tokens
+# are tagged with its name
+NORMALIZER = Normalizer(Config.CASE_FOLD, Config.STRIP_PUNCTUATION,
+                        Config.STEMMER, Config.STOPWORDS, Config.LEGACY_SPLIT)
+
+
+def tokenize(text: str) -> list:
+    """
+    Function to split the text into the words used for indexing and matching
+    Args:
+        text: input text
+    Returns:
+        tokens: normalized words of the text without empty strings
+    Ex:
+        text = "  Hai, hello"
+        tokens = ["hai", "hello"]
+    """
+    return NORMALIZER.tokenize(text)
+
+
+class InvertedIndex:
+    """
+    Class which maps every word of the summaries to its postings list
+    postings list is the list of (summary index, term frequency) pairs
+    in the increasing order of summary index
+    Ex:
+      {
+          "problems": [(0, 2), (48, 1)],
+          "gift": [(12, 1)]
+      }
+    The words of each summary are tokenized once and kept in their order as
+    the ids of the words
+    Ex:
+      vocabulary = {"problems": 0, "gift": 1, "your": 2}
+      token_streams = [array("I", [2, 0, 0]), ...]
+    The positional postings of a word, positions of the word in each of its
+    summaries, are read from the token streams on its first phrase or
+    proximity query and kept until the word is changed
+    Ex:
+      {"problems": {0: array("I", [1, 2])}}
+    """
+
+    def __init__(self, documents: list, text_key: str):
+        self._postings = {}
+        self._vocabulary = {}
+        self._terms = []
+        self._token_streams = []
+        self._positions = {}
+        # No of changes made to the index, positions read while it changes
+        # are not kept
+        self._num_changes = 0
+        for doc_index, document in enumerate(documents):
+            tokens = tokenize(document[text_key])
+            for term, frequency in Counter(tokens).items():
+                self._postings.setdefault(term, []).append((doc_index, frequency))
+            self._token_streams.append(array("I", [self._get_term_id(term)
+                                                   for term in tokens]))
+        self.num_docs = len(documents)
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add_document(self, doc_index: int, text: str) -> set:
+        """
+        Function to index the words of a new or updated summary. Postings
+        lists are replaced instead of changed in place, so searches running
+        alongside keep reading a consistent list.
+        Args:
+            doc_index: index of the summary, not indexed already
+            text: summary text
+        Returns:
+            words of the summary
+        """
+        tokens = tokenize(text)
+        term_frequencies = Counter(tokens)
+        for term, frequency in term_frequencies.items():
+            postings = list(self._postings.get(term, []))
+            insort(postings, (doc_index, frequency))
+            self._postings[term] = postings
+        stream = array("I", [self._get_term_id(term) for term in tokens])
+        if doc_index >= len(self._token_streams):
+            self._token_streams.extend(
+                array("I") for _ in range(doc_index + 1 - len(self._token_streams)))
+        self._token_streams[doc_index] = stream
+        self.num_docs = max(self.num_docs, doc_index + 1)
+        self._drop_positions(term_frequencies)
+        return set(term_frequencies)
+
+    def _get_term_id(self, term: str) -> int:
+        term_id = self._vocabulary.get(term)
+        if term_id is None:
+            term_id = self._vocabulary[term] = len(self._terms)
+            self._terms.append(term)
+        return term_id
+
+    def remove_document(self, doc_index: int) -> set:
+        """
+        Function to remove the words of a summary from the index, the index
+        of the summary is kept so the other summaries keep their indexes
+        Args:
+            doc_index: index of the summary
+        Returns:
+            words of the summary
+        """
+        terms = set(self.term(term_id) for term_id in self.token_stream(doc_index))
+        self._token_streams[doc_index] = array("I")
+        for term in terms:
+            postings = [posting for posting in self._postings.get(term, [])
+                        if posting[0] != doc_index]
+            if postings:
+                self._postings[term] = postings
+            else:
+                self._postings.pop(term, None)
+        self._drop_positions(terms)
+        return terms
+
+    def _drop_positions(self, terms):
+        self._num_changes += 1
+        for term in terms:
+            self._positions.pop(term, None)
+
+    def token_stream(self, doc_index: int):
+        """
+        Function to get the ids of the words of the summary in their order
+        Returns:
+            Ex: array("I", [2, 0, 0])
+        """
+        return self._token_streams[doc_index]
+
+    def term(self, term_id: int) -> str:
+        """
+        Function to get the word of the word id
+        """
+        return self._terms[term_id]
+
+    def term_id(self, term: str) -> int:
+        """
+        Function to get the word id of the word, None if it is not indexed
+        """
+        return self._vocabulary.get(term)
+
+    def positions(self, term: str) -> dict:
+        """
+        Function to get the positional postings of a word
+        Args:
+            term: word to be looked up
+        Returns:
+            map of summary index and the positions of the word in it
+            Ex: {0: array("I", [4, 17]), 48: array("I", [2])}
+        """
+        positions = self._positions.get(term)
+        if positions is not None:
+            return positions
+        num_changes = self._num_changes
+        term_id = self.term_id(term)
+        positions = {}
+        for doc_index, _ in self.postings(term):
+            positions[doc_index] = array("I", [position for position, stream_term_id
+                                               in enumerate(self.token_stream(doc_index))
+                                               if stream_term_id == term_id])
+        if num_changes == self._num_changes:
+            self._positions[term] = positions
+        return positions
+
+    def match_phrase(self, terms: tuple) -> set:
+        """
+        Function to get the summaries having the words one after the other
+        by intersecting their positions
+        Args:
+            terms: words of the phrase in their order
+        Returns:
+            set of summary indexes
+        """
+        if not terms:
+            return set()
+        terms_positions = [self.positions(term) for term in terms]
+        rarest = min(terms_positions, key=len)
+        matches = set()
+        for doc_index in rarest:
+            if not all(doc_index in positions for positions in terms_positions):
+                continue
+            # Positions where the phrase can start
+            starts = set(terms_positions[0][doc_index])
+            for offset, positions in enumerate(terms_positions[1:], 1):
+                starts.intersection_update(position - offset
+                                           for position in positions[doc_index])
+                if not starts:
+                    break
+            if starts:
+                matches.add(doc_index)
+        return matches
+
+    def match_near(self, left: str, right: str, distance: int) -> set:
+        """
+        Function to get the summaries having the two words within the
+        distance of each other in any order
+        Args:
+            left, right: words to be matched
+            distance: max no of positions between the words
+        Returns:
+            set of summary indexes
+        """
+        left_positions = self.positions(left)
+        right_positions = self.positions(right)
+        if len(right_positions) < len(left_positions):
+            left_positions, right_positions = right_positions, left_positions
+        matches = set()
+        for doc_index, positions in left_positions.items():
+            others = right_positions.get(doc_index)
+            if others is None:
+                continue
+            for position in positions:
+                # First position of the other word not before the distance,
+                # the same occurence is skipped when both words are the same
+                other = bisect_left(others, position - distance)
+                while other < len(others) and others[other] <= position + distance:
+                    if others[other] != position or left != right:
+                        matches.add(doc_index)
+                        break
+                    other += 1
+                if doc_index in matches:
+                    break
+        return matches
+
+    def doc_lengths(self) -> list:
+        """
+        Function to get the no of words of each summary, deleted summaries
+        have no words
+        Returns:
+            Ex: [120, 86, 0, ...]
+        """
+        return [len(stream) for stream in self._token_streams]
+
+    def doc_length(self, doc_index: int) -> int:
+        """
+        Function to get the no of words of a summary, 0 if it is deleted
+        or not indexed
+        """
+        if doc_index < len(self._token_streams):
+            return len(self._token_streams[doc_index])
+        return 0
+
+    def document_frequency(self, term: str) -> int:
+        """
+        Function to get the no of summaries having the word
+        """
+        return len(self.postings(term))
+
+    def terms(self) -> list:
+        """
+        Function to get all the indexed words
+        """
+        return list(self._postings)
+
+    def postings(self, term: str) -> list:
+        """
+        Function to get the postings list of a word
+        Args:
+            term: word to be looked up
+        Returns:
+            postings list of the word, empty list if the word is not indexed
+        """
+        return self._postings.get(term, [])
+
+    def get_match_scores(self, query_terms: list) -> dict:
+        """
+        Function to get the matching score of the summaries having at least
+        one of the query words. Score of a summary is the total no of
+        occurences of all the query words in the summary, so a query word
+        repeated in the query is counted once for each repetition.
+        Args:
+            query_terms: list of query words
+        Returns:
+            scores: map of summary index and its matching score
+            Ex: {0: 5, 12: 3, 48: 7}
+        """
+        return self.get_match_scores_many([query_terms])[0]
+
+    def get_match_scores_many(self, queries_terms: list) -> list:
+        """
+        Function to get the matching scores of many queries at once, the
+        postings list of a word shared by the queries is looked up once
+        Args:
+            queries_terms: list of list of query words
+        Returns:
+            list of scores for each query, as returned by get_match_scores
+            Ex: [{0: 5, 12: 3}, {48: 7}]
+        """
+        # Map of word and the (query position, no of repetitions) using it
+        term_queries = {}
+        for position, query_terms in enumerate(queries_terms):
+            for term, term_count in Counter(query_terms).items():
+                term_queries.setdefault(term, []).append((position, term_count))
+        all_scores = [{} for _ in queries_terms]
+        for term, queries in term_queries.items():
+            postings = self.postings(term)
+            for position, term_count in queries:
+                scores = all_scores[position]
+                for doc_index, frequency in postings:
+                    scores[doc_index] = scores.get(doc_index, 0) + frequency * term_count
+        return all_scores
@@ -0,0 +1,154 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module has the MaxScore retrieval of the top K summaries for a
+# query. The postings lists of the query words are walked together in the
+# order of the summary indexes. Words are sorted by the upper bound of the
+# score they can add to a summary. The words having the lowest bounds, whose
+# bounds add up to no more than the score of the Kth best summary so far,
+# are non essential: a summary having only those words cannot enter the
+# top K, so they are only looked up for the summaries found in the other
+# words. A summary is dropped as soon as its score so far and the bounds of
+# the words not looked up cannot beat the Kth best summary.
+# The top K is the same as the top K of the exhaustive scoring, ties are
+# ranked in the increasing order of the summary indexes.
+#
+# Sample Usage
+# words = [QueryWord(postings, bound=3, weigh=lambda doc_index, frequency: frequency)]
+# ranked, stats = max_score_top_k(words, 10)
+# ranked = [12, 3, 48]
+# stats = {"scored": 20, "skipped": 300}
+
+import heapq
+from bisect import bisect_left
+
+# Relative margin on the bounds, so that the rounding of the float scores
+# never prunes a summary which could enter the top K
+BOUND_MARGIN = 1e-9
+
+
+class QueryWord:
+    """
+    Class which holds the postings list of a query word with the upper
+    bound of the score it adds to a summary
+    """
+
+    def __init__(self, postings: list, bound: float, weigh):
+        """
+        Args:
+            postings: list of (summary index, frequency) sorted by the
+            summary index
+            bound: max score the word adds to a summary
+            weigh: function giving the score the word adds to a summary
+            from (summary index, frequency)
+        """
+        self.postings = postings
+        self.bound = bound
+        self.weigh = weigh
+        # Position of the next posting to be read
+        self.cursor = 0
+
+    def doc_index(self) -> int:
+        """
+        Function to get the summary index at the cursor, None once all the
+        postings are read
+        """
+        if self.cursor < len(self.postings):
+            return self.postings[self.cursor][0]
+        return None
+
+    def seek(self, doc_index: int):
+        """
+        Function to move the cursor to the first posting of a summary index
+        greater than or equal to the given one
+        """
+        if self.doc_index() is not None and self.postings[self.cursor][0] < doc_index:
+            self.cursor = bisect_left(self.postings, (doc_index,), self.cursor + 1)
+
+
+def max_score_top_k(words: list, num: int) -> tuple:
+    """
+    Function to get the top K summaries for the query words with MaxScore
+    Args:
+        words: list of QueryWord, the score of a summary is added up in the
+        order of this list
+        num: K, no of summaries to return
+    Returns:
+        (summary indexes in the desc order of score, stats)
+        stats has the no of summaries fully scored and the no of postings
+        skipped without being scored
+        Ex: ([12, 3, 48], {"scored": 20, "skipped": 300})
+    """
+    words = [word for word in words if word.postings]
+    num_postings = sum(len(word.postings) for word in words)
+    if num <= 0 or not words:
+        return [], {"scored": 0, "skipped": num_postings}
+    # Position of the words in the list for adding up the scores
+    positions = dict((id(word), position) for position, word in enumerate(words))
+    words = sorted(words, key=lambda word: word.bound)
+    bound_sums = []
+    total = 0
+    for word in words:
+        total += word.bound
+        bound_sums.append(total * (1 + BOUND_MARGIN))
+    # Min heap of (score, -summary index) of the top K so far, summaries
+    # are seen in the increasing order of their indexes so a later summary
+    # enters the top K only if its score is greater than the Kth score
+    top = []
+    threshold = 0
+    num_non_essential = 0
+    num_scored = 0
+    num_read = 0
+    while True:
+        doc_index = None
+        for word in words[num_non_essential:]:
+            word_doc_index = word.doc_index()
+            if word_doc_index is not None and (doc_index is None or word_doc_index < doc_index):
+                doc_index = word_doc_index
+        if doc_index is None:
+            break
+        weights = [0] * len(words)
+        score = 0
+        for word in words[num_non_essential:]:
+            if word.doc_index() == doc_index:
+                weight = word.weigh(doc_index, word.postings[word.cursor][1])
+                weights[positions[id(word)]] = weight
+                score += weight
+                word.cursor += 1
+                num_read += 1
+        # Non essential words are looked up from the highest bound
+        for index in range(num_non_essential - 1, -1, -1):
+            if score + bound_sums[index] <= threshold:
+                break
+            word = words[index]
+            word.seek(doc_index)
+            if word.doc_index() == doc_index:
+                weight = word.weigh(doc_index, word.postings[word.cursor][1])
+                weights[positions[id(word)]] = weight
+                score += weight
+                word.cursor += 1
+                num_read += 1
+        else:
+            # Score is added up again in the order of the words, so it is
+            # the same float as the exhaustive score
+            score = 0
+            for weight in weights:
+                score += weight
+            num_scored += 1
+            if len(top) < num:
+                heapq.heappush(top, (score, -doc_index))
+            elif score > top[0][0]:
+                heapq.heapreplace(top, (score, -doc_index))
+            else:
+                continue
+            if len(top) == num:
+                threshold = top[0][0]
+                while (num_non_essential < len(words)
+                       and bound_sums[num_non_essential] <= threshold):
+                    num_non_essential += 1
+                if num_non_essential == len(words):
+                    break
+    ranked = [-negative_index for _, negative_index in sorted(top, key=lambda item: (-item[0], -item[1]))]
+    return ranked, {"scored": num_scored, "skipped": num_postings - num_read}
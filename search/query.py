@@ -0,0 +1,154 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module parses the query syntax of the search engine. A query is a
+# bag of words ranked by their matches, with optional constraints which
+# the matching summaries must satisfy:
+#   "gift of the magi": quoted phrase, the words appear together in order
+#   gift NEAR/3 magi: the two words appear within 3 words of each other
+# The words of the phrases and the proximity constraints are also ranked
+# like the other words of the query. Constraints are evaluated from the
+# positional postings of the inverted index.
+# The ranking doesn't depend on the order of the words, so the queries are
+# keyed and ranked by their canonical words: the normalized words sorted
+# with their repetitions. "a is gift", "gift  is A" and "a is gift " share
+# one ranking.
+#
+# Sample Usage
+# query = parse_query('"a gift" NEAR/2 problems is')
+# query.terms
+# ["a", "gift", "problems", "is"]
+# query.phrases
+# [("a", "gift")]
+# query.proximities
+# [("gift", "problems", 2)]
+# query.canonical_terms()
+# ["a", "gift", "is", "problems"]
+# query.key()
+# 'a gift is problems "a gift" gift NEAR/2 problems'
+# query.matching_docs(index)
+# {0, 48}
+
+import re
+
+from search.index import tokenize
+
+NEAR_OPERATOR = "NEAR/"
+# Quoted phrases, proximity operators and the other text of the query
+QUERY_PATTERN = re.compile(r'"([^"]*)"|\b%s(\d+)\b|([^\s"]+|")' % NEAR_OPERATOR)
+
+
+class ParsedQuery:
+    """
+    Class which holds the words of a query with its phrase and proximity
+    constraints
+    """
+
+    def __init__(self, terms: list, phrases: list=None, proximities: list=None):
+        """
+        Args:
+            terms: list of query words in their order
+            phrases: list of tuples of the words of the phrases
+            proximities: list of (word, word, max distance)
+        """
+        self.terms = terms
+        self.phrases = phrases or []
+        self.proximities = proximities or []
+
+    def has_constraints(self) -> bool:
+        return bool(self.phrases or self.proximities)
+
+    def canonical_terms(self) -> list:
+        """
+        Function to get the words of the query sorted, repeated words are
+        kept as they add to the score
+        Ex:
+            ["gift", "is", "a", "is"] -> ["a", "gift", "is", "is"]
+        """
+        return sorted(self.terms)
+
+    def key(self) -> str:
+        """
+        Function to get the canonical key of the query for the result cache,
+        queries differing only in case, spaces, punctuation or the order of
+        the words have the same key. The words of the query are kept
+        separated by spaces, so a key is found by its words.
+        Ex:
+            "Gift is a  is" -> "a gift is is"
+        """
+        parts = [" ".join(self.canonical_terms())]
+        parts.extend(sorted('"%s"' % " ".join(phrase) for phrase in set(self.phrases)))
+        # Proximity is the same in both the orders of the words
+        parts.extend(sorted("%s %s%d %s" % (min(left, right), NEAR_OPERATOR, distance,
+                                            max(left, right))
+                            for left, right, distance in set(self.proximities)))
+        return " ".join(part for part in parts if part)
+
+    def matching_docs(self, index) -> set:
+        """
+        Function to get the summaries satisfying all the constraints
+        Args:
+            index: inverted index of the summaries
+        Returns:
+            set of summary indexes
+        """
+        matches = None
+        for phrase in self.phrases:
+            matches = _intersect(matches, index.match_phrase(phrase))
+        for left, right, distance in self.proximities:
+            matches = _intersect(matches, index.match_near(left, right, distance))
+        return matches if matches is not None else set()
+
+
+def _intersect(matches: set, docs: set) -> set:
+    return docs if matches is None else matches & docs
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """
+    Function to parse the query into its words and constraints. The operand
+    of NEAR is the closest word on each side, unclosed quotes and NEAR
+    without a word right next to it on both sides are ignored.
+    Args:
+        query: query text
+    Returns:
+        ParsedQuery
+    Ex:
+        query = 'is "your problems"'
+        ParsedQuery(["is", "your", "problems"], [("your", "problems")])
+    """
+    if '"' not in query and NEAR_OPERATOR not in query:
+        return ParsedQuery(tokenize(query))
+    terms = []
+    phrases = []
+    # Words of each part of the query, None for the NEAR operators
+    parts = []
+    # Positions of the NEAR operators in the parts with their distance
+    operators = []
+    for match in QUERY_PATTERN.finditer(query):
+        phrase, distance, text = match.groups()
+        if phrase is not None:
+            part_terms = tokenize(phrase)
+            # Single word phrases only need the word
+            if len(part_terms) > 1:
+                phrases.append(tuple(part_terms))
+        elif distance is not None:
+            operators.append((len(parts), int(distance)))
+            parts.append(None)
+            continue
+        elif text == '"':
+            # Unclosed quote
+            continue
+        else:
+            part_terms = tokenize(text)
+        terms.extend(part_terms)
+        parts.append(part_terms)
+    # Operands are the words of the parts next to the operator, a part
+    # normalized to no words, like a stopword, drops the operator
+    proximities = [(parts[position - 1][-1], parts[position + 1][0], distance)
+                   for position, distance in operators
+                   if 0 < position < len(parts) - 1
+                   and parts[position - 1] and parts[position + 1]]
+    return ParsedQuery(terms, phrases, proximities)
@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to rank the summary indexes in the desc order of
+# their matching scores. Only as many summaries as requested are ranked,
+# so asking for the top K results does not sort the whole list of matches,
+# and the next pages continue from where the previous one stopped.
+#
+# Sample Usage
+# ranking = Ranking({0: 7, 1: 9, 2: 2, 3: 9})
+# ranking.top(2)
+# [1, 3]
+# ranking.page(1, 2)
+# [0, 2]
+# ranking.ranked()
+# [1, 3, 0, 2]
+# ranking.top_scored(2)
+# [(1, 9), (3, 9)]
+
+import heapq
+import threading
+
+
+class Ranking:
+    """
+    Class which lazily ranks the summary indexes in the desc order of
+    their scores, indexes having the same score are ranked in their
+    increasing order. Summaries with zero score are not ranked.
+    """
+    # True if the ranking may be cut off before the last match
+    truncated = False
+
+    def __init__(self, scores: dict):
+        # Heap of the matches yet to be ranked, heapify is linear in the
+        # no of matches and every ranked summary costs a log(n) pop
+        self._heap = [(-score, index) for index, score in scores.items() if score]
+        heapq.heapify(self._heap)
+        self._ranked = []
+        # Scores of the ranked summaries, None if they are not known
+        self._ranked_scores = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ranked(cls, ranked: list, truncated: bool=False):
+        """
+        Function to create the ranking from an already ranked list of
+        summary indexes
+        Args:
+            ranked: summary indexes in the desc order of match
+            truncated: True if the list may not have all the matches
+        """
+        ranking = cls({})
+        ranking._ranked = list(ranked)
+        ranking._ranked_scores = None
+        ranking.truncated = truncated
+        return ranking
+
+    def __len__(self) -> int:
+        return len(self._ranked) + len(self._heap)
+
+    def top(self, num: int) -> list:
+        """
+        Function to get the top ranked summary indexes
+        Args:
+            num: no of summary indexes to return
+        Returns:
+            Ex: [1, 3]
+        """
+        with self._lock:
+            while len(self._ranked) < num and self._heap:
+                score, index = heapq.heappop(self._heap)
+                self._ranked.append(index)
+                self._ranked_scores.append(-score)
+            return self._ranked[:num]
+
+    def top_scored(self, num: int) -> list:
+        """
+        Function to get the top ranked summary indexes with their scores,
+        rankings created from a ranked list have no scores
+        Args:
+            num: no of summary indexes to return
+        Returns:
+            Ex: [(1, 9), (3, 9)]
+        """
+        ranked = self.top(num)
+        if self._ranked_scores is None:
+            raise ValueError("Scores of the ranking are not known")
+        return list(zip(ranked, self._ranked_scores))
+
+    def page(self, number: int, size: int) -> list:
+        """
+        Function to get a page of the ranked summary indexes
+        Args:
+            number: page number starting from 0
+            size: no of summary indexes in a page
+        Returns:
+            Ex: [0, 2]
+        """
+        return self.top((number + 1) * size)[number * size:]
+
+    def ranked(self) -> list:
+        """
+        Function to get all the ranked summary indexes
+        Returns:
+            Ex: [1, 3, 0, 2]
+        """
+        return self.top(len(self))
+
@@ -0,0 +1,599 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module has the scoring backends used to rank the summaries for
+# the query words. Both the backends give the same rankings.
+#   python: sums the postings lists of the inverted index in pure python
+#   numpy: precomputes the sparse document-term count matrix and scores
+#          a query as one vectorized sum of its word columns, falls back
+#          to python if numpy is not installed
+# The ranking modes weigh a query word in a summary as:
+#   count: no of occurences of the word in the summary
+#   bm25: okapi bm25 of the word, rare words weigh more and the occurences
+#         in long summaries weigh less
+#   tfidf: (1 + log(occurences)) * idf of the word, divided by the square
+#          root of the length of the summary
+# Document lengths and the document frequencies of the words are taken
+# from the index when the scorer is created, so a query is still scored in
+# a single pass over the postings lists of its words. The python backend
+# updates the lengths of the changed summaries in place when the summaries
+# change, the bm25 length part of each summary is computed from its length
+# while weighing, so a change does not touch the other summaries. An index holding a
+# shard of the summaries is weighed with the statistics of the whole
+# collection, so its summaries get the scores of the unsharded index.
+# The score of a summary is a sum over the query words, so the python
+# backend caches the weighted postings list of each word, its score vector,
+# in a LRU cache bounded by memory. A new query adds up the cached vectors
+# of its words and only the other words are read and weighed from the
+# index. Cached vectors are dropped when the summaries change.
+#
+# Sample Usage
+# scorer = create_scorer("numpy", index, logger)
+# scorer = create_scorer("python", index, logger, ranking_mode="bm25",
+#                        term_cache_bytes=64 * 1024 * 1024)
+# scorer.rank(["is", "your", "problems"]).top(3)
+# [48, 0, 21]
+# [ranking.top(3) for ranking in scorer.rank_many([["is"], ["a", "gift"]])]
+# [[...], [...]]
+
+import math
+import threading
+import sys
+from collections import Counter
+
+from search.cache import TermVectorCache
+from search.corpus import MappedIndex
+from search.index import InvertedIndex
+from search.pruning import QueryWord, max_score_top_k
+from search.ranking import Ranking
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PYTHON_BACKEND = "python"
+NUMPY_BACKEND = "numpy"
+COUNT_MODE = "count"
+BM25_MODE = "bm25"
+TFIDF_MODE = "tfidf"
+RANKING_MODES = (COUNT_MODE, BM25_MODE, TFIDF_MODE)
+# Default bm25 parameters, k1 saturates the occurences of a word and b
+# sets how much the length of the summary matters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Approximate bytes of a (summary index, weight) item of a score vector,
+# the tuple and the numbers it holds
+VECTOR_ITEM_BYTES = 100
+
+
+class DocumentStatistics:
+    """
+    Class which holds the statistics of the summaries used to weigh the
+    occurences of a word in a summary
+    """
+
+    def __init__(self, index: InvertedIndex, mode: str, k1: float=BM25_K1,
+                 b: float=BM25_B, collection: dict=None):
+        """
+        Args:
+            index: inverted index of the summaries
+            mode: "bm25" or "tfidf"
+            k1, b: bm25 parameters
+            collection: statistics of the whole collection if the index has
+            a shard of it, as returned by collection_statistics
+        """
+        self.mode = mode
+        self.k1 = k1
+        self.b = b
+        # No of words of each summary of the index
+        self.lengths = index.doc_lengths()
+        # Map of word and the no of summaries having it in the collection,
+        # None if the index has the whole collection
+        self.document_frequencies = None
+        if collection is None:
+            self.num_docs = sum(1 for length in self.lengths if length)
+            self.total_length = sum(self.lengths)
+        else:
+            self.num_docs = collection["num_docs"]
+            self.total_length = collection["total_length"]
+            self.document_frequencies = collection["document_frequencies"]
+        # Inverse of the square root of the length of each summary for tfidf
+        self._tfidf_norms = None
+        if mode != BM25_MODE:
+            self._tfidf_norms = [_tfidf_norm(length) for length in self.lengths]
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / max(self.num_docs, 1)
+
+    @property
+    def doc_norms(self) -> list:
+        """
+        Function to get the length part of the weights of each summary, the
+        length part of the denominator for bm25
+        """
+        if self.mode != BM25_MODE:
+            return self._tfidf_norms
+        k1, b, avg_length = self.k1, self.b, self.avg_length
+        return [k1 * (1 - b + b * length / avg_length) if avg_length else k1
+                for length in self.lengths]
+
+    def update_document(self, doc_index: int, length: int):
+        """
+        Function to update the statistics for a summary added, changed or
+        deleted in the index
+        Args:
+            doc_index: index of the summary
+            length: no of words of the summary, 0 if it is deleted
+        """
+        if self.document_frequencies is not None:
+            raise ValueError("Statistics of the collection cannot be updated")
+        if doc_index >= len(self.lengths):
+            self.lengths.extend([0] * (doc_index + 1 - len(self.lengths)))
+            if self._tfidf_norms is not None:
+                self._tfidf_norms.extend([0.0] * (doc_index + 1 - len(self._tfidf_norms)))
+        old_length = self.lengths[doc_index]
+        self.lengths[doc_index] = length
+        self.num_docs += bool(length) - bool(old_length)
+        self.total_length += length - old_length
+        if self._tfidf_norms is not None:
+            self._tfidf_norms[doc_index] = _tfidf_norm(length)
+
+    def idf(self, document_frequency: int) -> float:
+        """
+        Function to get the inverse document frequency of a word, it is
+        positive for all the words so every matching summary has a score
+        """
+        if self.mode == BM25_MODE:
+            return math.log(1 + (self.num_docs - document_frequency + 0.5)
+                            / (document_frequency + 0.5))
+        return math.log((1 + self.num_docs) / (1 + document_frequency)) + 1
+
+    def document_frequency(self, term: str, index_frequency: int) -> int:
+        """
+        Function to get the no of summaries of the collection having the word
+        Args:
+            term: word
+            index_frequency: no of summaries of the index having the word
+        """
+        if self.document_frequencies is None:
+            return index_frequency
+        return self.document_frequencies.get(term, index_frequency)
+
+    def weigh_postings(self, postings: list, document_frequency: int=None) -> list:
+        """
+        Function to weigh the occurences of a word in the summaries
+        Args:
+            postings: postings list of the word
+            document_frequency: no of summaries of the collection having the
+            word, the length of the postings list if None
+        Returns:
+            list of (summary index, weight)
+        """
+        idf = self.idf(len(postings) if document_frequency is None else document_frequency)
+        if self.mode == BM25_MODE:
+            k1, b, avg_length, lengths = self.k1, self.b, self.avg_length, self.lengths
+            k1_plus_1 = k1 + 1
+            return [(doc_index, idf * frequency * k1_plus_1
+                     / (frequency + k1 * (1 - b + b * lengths[doc_index] / avg_length)))
+                    for doc_index, frequency in postings]
+        doc_norms = self._tfidf_norms
+        return [(doc_index, idf * (1 + math.log(frequency)) * doc_norms[doc_index])
+                for doc_index, frequency in postings]
+
+    def weigher(self, document_frequency: int, term_count: int=1):
+        """
+        Function to get the function weighing the occurences of a word in a
+        summary, it gives the same weights as weigh_postings
+        Args:
+            document_frequency: no of summaries having the word
+            term_count: no of times the word is repeated in the query
+        Returns:
+            function of (summary index, frequency) returning the weight
+        """
+        idf = self.idf(document_frequency)
+        if self.mode == BM25_MODE:
+            k1, b, avg_length, lengths = self.k1, self.b, self.avg_length, self.lengths
+            k1_plus_1 = k1 + 1
+            return lambda doc_index, frequency: (
+                idf * frequency * k1_plus_1
+                / (frequency + k1 * (1 - b + b * lengths[doc_index] / avg_length))) * term_count
+        doc_norms = self._tfidf_norms
+        return lambda doc_index, frequency: (
+            idf * (1 + math.log(frequency)) * doc_norms[doc_index]) * term_count
+
+
+def _tfidf_norm(length: int) -> float:
+    return 1 / math.sqrt(length) if length else 0.0
+
+
+def _count_weigher(term_count: int):
+    return lambda doc_index, frequency: frequency * term_count
+
+
+def collection_statistics(index: InvertedIndex) -> dict:
+    """
+    Function to get the statistics of the summaries of the index used to
+    weigh the words
+    Args:
+        index: inverted index of the summaries
+    Returns:
+        {"num_docs": 60, "total_length": 5000,
+         "document_frequencies": {"gift": 3, ...}}
+    """
+    lengths = index.doc_lengths()
+    return {
+        "num_docs": sum(1 for length in lengths if length),
+        "total_length": sum(lengths),
+        "document_frequencies": dict((term, index.document_frequency(term))
+                                     for term in index.terms())
+    }
+
+
+def merge_collection_statistics(shards_statistics: list) -> dict:
+    """
+    Function to merge the statistics of the shards of the summaries into
+    the statistics of the whole collection
+    Args:
+        shards_statistics: list of statistics returned by collection_statistics
+    Returns:
+        statistics of the collection, in the same format
+    """
+    document_frequencies = {}
+    for statistics in shards_statistics:
+        for term, frequency in statistics["document_frequencies"].items():
+            document_frequencies[term] = document_frequencies.get(term, 0) + frequency
+    return {
+        "num_docs": sum(statistics["num_docs"] for statistics in shards_statistics),
+        "total_length": sum(statistics["total_length"] for statistics in shards_statistics),
+        "document_frequencies": document_frequencies
+    }
+
+
+class PythonScorer:
+    """
+    Class which scores the summaries by adding up the postings lists of the
+    query words in the inverted index
+    """
+
+    def __init__(self, index: InvertedIndex, ranking_mode: str=COUNT_MODE,
+                 statistics: DocumentStatistics=None, term_cache_bytes: int=0):
+        self.index = index
+        self.ranking_mode = ranking_mode
+        self.statistics = statistics
+        if ranking_mode != COUNT_MODE and statistics is None:
+            self.statistics = DocumentStatistics(index, ranking_mode)
+        # Cache of the score vectors of the words, None if it is turned off.
+        # Vectors of the count mode are the postings lists, which are the
+        # lists of the inverted index itself, so only the postings decoded
+        # from the memory mapped corpus are cached
+        self.term_cache = None
+        if term_cache_bytes > 0 and (ranking_mode != COUNT_MODE
+                                     or isinstance(index, MappedIndex)):
+            self.term_cache = TermVectorCache(term_cache_bytes)
+        # Map of the words and the max score they add to a summary, filled
+        # on the first pruned retrieval having the word
+        self._bounds = {}
+
+    def update_documents(self, doc_indexes, changed_terms: set):
+        """
+        Function to update the scorer for the summaries changed in its index,
+        only the statistics of the changed summaries are updated. It is
+        called while no search is running.
+        Args:
+            doc_indexes: indexes of the added, changed and deleted summaries
+            changed_terms: words of the changed summaries
+        """
+        if self.statistics is None:
+            for term in changed_terms:
+                self._bounds.pop(term, None)
+        else:
+            for doc_index in doc_indexes:
+                self.statistics.update_document(doc_index, self.index.doc_length(doc_index))
+            # Weights of all the words depend on the no of summaries and
+            # their average length
+            self._bounds = {}
+        if self.term_cache is not None:
+            self.term_cache.clear()
+
+    def rank(self, query_terms: list) -> Ranking:
+        """
+        Function to rank the summaries for the query words
+        Args:
+            query_terms: list of query words
+        Returns:
+            ranking of the summaries in the desc order of match
+        """
+        return self.rank_many([query_terms])[0]
+
+    def rank_many(self, queries_terms: list) -> list:
+        """
+        Function to rank the summaries for many queries at once
+        Args:
+            queries_terms: list of list of query words
+        Returns:
+            list of rankings for each query
+        """
+        if self.ranking_mode == COUNT_MODE and self.term_cache is None:
+            return [Ranking(scores)
+                    for scores in self.index.get_match_scores_many(queries_terms)]
+        return [Ranking(scores) for scores in self._get_scores_many(queries_terms)]
+
+    def rank_top(self, query_terms: list, num: int) -> tuple:
+        """
+        Function to rank the top K summaries for the query with MaxScore,
+        summaries which cannot enter the top K are not fully scored
+        Args:
+            query_terms: list of query words
+            num: K, no of summaries to rank
+        Returns:
+            (ranking of the top K summaries, stats of the retrieval)
+            Ex: (ranking, {"scored": 20, "skipped": 300})
+        """
+        words = []
+        for term, term_count in Counter(query_terms).items():
+            postings = self.index.postings(term)
+            if not postings:
+                continue
+            if self.ranking_mode == COUNT_MODE:
+                weigh = _count_weigher(term_count)
+            else:
+                weigh = self.statistics.weigher(
+                    self.statistics.document_frequency(term, len(postings)), term_count)
+            words.append(QueryWord(postings, self._get_bound(term, postings) * term_count, weigh))
+        ranked, stats = max_score_top_k(words, num)
+        return Ranking.from_ranked(ranked), stats
+
+    def _get_bound(self, term: str, postings: list) -> float:
+        bound = self._bounds.get(term)
+        if bound is None:
+            if self.ranking_mode == COUNT_MODE:
+                bound = max(frequency for _, frequency in postings)
+            else:
+                weigh = self.statistics.weigher(
+                    self.statistics.document_frequency(term, len(postings)))
+                bound = max(weigh(doc_index, frequency) for doc_index, frequency in postings)
+            self._bounds[term] = bound
+        return bound
+
+    def _get_scores_many(self, queries_terms: list) -> list:
+        """
+        Function to add up the score vectors of the query words in the
+        summaries, the vector of a word shared by the queries is looked up
+        once
+        """
+        term_queries = {}
+        for position, query_terms in enumerate(queries_terms):
+            for term, term_count in Counter(query_terms).items():
+                term_queries.setdefault(term, []).append((position, term_count))
+        all_scores = [{} for _ in queries_terms]
+        for term, queries in term_queries.items():
+            vector = self._get_term_vector(term)
+            for position, term_count in queries:
+                scores = all_scores[position]
+                for doc_index, weight in vector:
+                    scores[doc_index] = scores.get(doc_index, 0) + weight * term_count
+        return all_scores
+
+    def _get_term_vector(self, term: str) -> list:
+        """
+        Function to get the score vector of a word from the term cache, or
+        from the index if it is not cached
+        Args:
+            term: query word
+        Returns:
+            list of (summary index, weight) of the summaries having the word
+        """
+        if self.term_cache is not None:
+            vector = self.term_cache.get(term)
+            if vector is not None:
+                return vector
+        postings = self.index.postings(term)
+        if not postings:
+            return postings
+        # Weights in the count mode are the frequencies of the postings list
+        if self.ranking_mode == COUNT_MODE:
+            vector = postings
+        else:
+            vector = self.statistics.weigh_postings(
+                postings, self.statistics.document_frequency(term, len(postings)))
+        if self.term_cache is not None:
+            self.term_cache.put(term, vector,
+                                sys.getsizeof(vector) + len(vector) * VECTOR_ITEM_BYTES)
+        return vector
+
+
+class NumpyScorer:
+    """
+    Class which scores the summaries from the document-term count matrix,
+    the matrix is stored column wise in the compressed sparse format
+    Ex:
+      vocabulary = {"gift": 0, "problems": 1}
+      column_starts = [0, 1, 3]
+      doc_indexes = [12, 0, 48]
+      counts = [1, 2, 1]
+    """
+
+    def __init__(self, index: InvertedIndex, ranking_mode: str=COUNT_MODE,
+                 statistics: DocumentStatistics=None):
+        self.num_docs = index.num_docs
+        self.vocabulary = dict((term, column) for column, term in enumerate(index.terms()))
+        if isinstance(index, MappedIndex):
+            # Columns are read from the memory mapped corpus file
+            column_starts, doc_indexes, counts = index.postings_arrays()
+            self.column_starts = numpy.frombuffer(column_starts, dtype=numpy.uint64)
+            self.doc_indexes = numpy.frombuffer(doc_indexes, dtype=numpy.uint32)
+            self.counts = numpy.frombuffer(counts, dtype=numpy.uint32)
+        else:
+            column_starts = [0]
+            doc_indexes = []
+            counts = []
+            for term in self.vocabulary:
+                for doc_index, frequency in index.postings(term):
+                    doc_indexes.append(doc_index)
+                    counts.append(frequency)
+                column_starts.append(len(doc_indexes))
+            self.column_starts = numpy.array(column_starts, dtype=numpy.int64)
+            self.doc_indexes = numpy.array(doc_indexes, dtype=numpy.int64)
+            self.counts = numpy.array(counts, dtype=numpy.float64)
+        if ranking_mode != COUNT_MODE:
+            # Counts are replaced by the weights of the occurences
+            self.counts = self._weigh_counts(
+                statistics or DocumentStatistics(index, ranking_mode))
+
+    def _weigh_counts(self, statistics: DocumentStatistics):
+        """
+        Function to get the weights of all the occurences of the words in
+        the column order of the matrix
+        """
+        column_starts = self.column_starts.astype(numpy.int64)
+        document_frequencies = numpy.diff(column_starts)
+        idfs = numpy.array([statistics.idf(statistics.document_frequency(term, int(frequency)))
+                            for term, frequency in zip(self.vocabulary, document_frequencies)],
+                           dtype=numpy.float64)
+        idfs = numpy.repeat(idfs, document_frequencies)
+        counts = self.counts.astype(numpy.float64)
+        doc_norms = numpy.array(statistics.doc_norms, dtype=numpy.float64)[
+            self.doc_indexes.astype(numpy.int64)]
+        if statistics.mode == BM25_MODE:
+            return idfs * counts * (statistics.k1 + 1) / (counts + doc_norms)
+        return idfs * (1 + numpy.log(counts)) * doc_norms
+
+    def rank(self, query_terms: list) -> Ranking:
+        """
+        Function to rank the summaries for the query words
+        Args:
+            query_terms: list of query words
+        Returns:
+            ranking of the summaries in the desc order of match
+        """
+        columns = Counter(self.vocabulary[term] for term in query_terms
+                          if term in self.vocabulary)
+        if not columns:
+            return NumpyRanking(numpy.zeros(self.num_docs))
+        # Repeated query words multiply their column, the columns are added
+        # in the order of the python backend so the float scores are equal
+        slices = [numpy.arange(int(self.column_starts[column]),
+                               int(self.column_starts[column + 1]))
+                  for column in columns]
+        positions = numpy.concatenate(slices)
+        repeats = numpy.repeat(numpy.array(list(columns.values()), dtype=numpy.float64),
+                               [len(positions_slice) for positions_slice in slices])
+        scores = numpy.bincount(self.doc_indexes[positions],
+                                weights=self.counts[positions] * repeats,
+                                minlength=self.num_docs)
+        return NumpyRanking(scores)
+
+    def rank_many(self, queries_terms: list) -> list:
+        """
+        Function to rank the summaries for many queries at once
+        Args:
+            queries_terms: list of list of query words
+        Returns:
+            list of rankings for each query
+        """
+        return [self.rank(query_terms) for query_terms in queries_terms]
+
+    def rank_top(self, query_terms: list, num: int) -> tuple:
+        """
+        Function to rank the summaries for the query, all the summaries are
+        scored by the vectorized sum so nothing is skipped
+        Returns:
+            (ranking, stats of the retrieval), as returned by
+            PythonScorer.rank_top
+        """
+        ranking = self.rank(query_terms)
+        return ranking, {"scored": len(ranking), "skipped": 0}
+
+
+class NumpyRanking(Ranking):
+    """
+    Class which ranks the summaries from the array of their scores, only
+    the top K are selected with argpartition before ordering them
+    """
+
+    def __init__(self, scores):
+        self._scores = scores
+        self._num_matches = int(numpy.count_nonzero(scores))
+        self._ranked = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._num_matches
+
+    def top(self, num: int) -> list:
+        """
+        Function to get the top ranked summary indexes
+        Args:
+            num: no of summary indexes to return
+        Returns:
+            Ex: [1, 3]
+        """
+        num = min(num, self._num_matches)
+        with self._lock:
+            if len(self._ranked) < num:
+                # Rank ahead so that the next pages are served from the
+                # ranked prefix
+                self._ranked = self._rank_prefix(
+                             min(max(num, 2 * len(self._ranked)), self._num_matches))
+            return self._ranked[:num]
+
+    def _rank_prefix(self, num: int) -> list:
+        """
+        Function to rank the top num summary indexes, summaries having the
+        score of the num-th summary are all kept as candidates so that the
+        ties are ranked in the increasing order of index
+        """
+        scores = self._scores
+        if num < len(scores):
+            kth_index = numpy.argpartition(-scores, num - 1)[num - 1]
+            candidates = numpy.flatnonzero(scores >= scores[kth_index])
+        else:
+            candidates = numpy.arange(len(scores))
+        candidates = candidates[scores[candidates] > 0]
+        order = numpy.argsort(-scores[candidates], kind="stable")
+        return candidates[order][:num].tolist()
+
+    def top_scored(self, num: int) -> list:
+        return [(index, float(self._scores[index])) for index in self.top(num)]
+
+
+def create_scorer(backend: str, index: InvertedIndex, logger=None,
+                  ranking_mode: str=COUNT_MODE, k1: float=BM25_K1, b: float=BM25_B,
+                  term_cache_bytes: int=0, collection: dict=None):
+    """
+    Function to create the scoring backend
+    Args:
+        backend: "python" or "numpy"
+        index: inverted index of the summaries
+        logger: logger object
+        ranking_mode: "count", "bm25" or "tfidf"
+        k1, b: bm25 parameters
+        term_cache_bytes: memory budget of the cached score vectors of the
+        python backend, 0 turns off the cache
+        collection: statistics of the whole collection if the index has a
+        shard of it, as returned by collection_statistics
+    Returns:
+        scorer object
+    """
+    if ranking_mode not in RANKING_MODES:
+        if logger:
+            logger.warning("Unknown ranking mode: %s, using the %s ranking mode",
+                           ranking_mode, COUNT_MODE)
+        ranking_mode = COUNT_MODE
+    statistics = None
+    if ranking_mode != COUNT_MODE:
+        statistics = DocumentStatistics(index, ranking_mode, k1, b, collection)
+    if backend == NUMPY_BACKEND:
+        if numpy is not None:
+            return NumpyScorer(index, ranking_mode, statistics)
+        if logger:
+            logger.warning("numpy is not installed, using the %s scoring backend",
+                           PYTHON_BACKEND)
+    elif backend != PYTHON_BACKEND and logger:
+        logger.warning("Unknown scoring backend: %s, using the %s scoring backend",
+                       backend, PYTHON_BACKEND)
+    return PythonScorer(index, ranking_mode, statistics, term_cache_bytes)
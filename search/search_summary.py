@@ -10,6 +10,17 @@
 # query = "is your problems"
 # summary_num = 3
 # res = Search(query, summary_num).get_query_search_results()
+# Next page of the results
+# res = Search(query, summary_num, page=1).get_query_search_results()
+# Results for many queries at once
+# res = Search.search_many(["is your problems", "a is gift"], summary_num)
+# Phrase and proximity queries
+# res = Search('"your problems" is', summary_num).get_query_search_results()
+# res = Search("gift NEAR/3 problems", summary_num).get_query_search_results()
+# Add or update summaries and delete summaries at runtime, the corpus
+# version is returned
+# version = Search.update_summaries([{"id": 60, "summary": "....."}])
+# version = Search.delete_summaries([12])
 # res is of the format:
 #  [
 #   {
@@ -26,11 +37,23 @@
 #    },
 #  ]
 
+import atexit
+import json
+import threading
 from os import path
 
+from search.cache import ResultCache
 from search.config import Config
-from utilities.json_parser import dump_json, load_json
-from utilities.logger import create_logger
+from search.corpus import MappedCorpus, load_corpus
+from search.index import NORMALIZER, InvertedIndex
+from search.query import parse_query
+from search.ranking import Ranking
+from search.scoring import COUNT_MODE, PythonScorer, create_scorer
+from utilities.file_store import file_lock
+from utilities.json_parser import load_json
+from utilities.logger import PayloadSummary, create_logger
+from utilities.metrics import Counter, Gauge, add_collector, set_enabled, stage_timer
+from utilities.rw_lock import ReadWriteLock
 
 class Search:
     """
@@ -56,22 +79,55 @@ class Search:
     """
     # Data from input.json
     INPUT_DATA = {}
+    # Inverted index of the summaries built once from INPUT_DATA
+    INDEX = None
+    # Scoring backend ranking the summaries from INDEX
+    SCORER = None
+    # In memory cache of the sorted summary indexes for the queries
+    RESULT_CACHE = None
+    # No of changes made to the summaries since they were loaded
+    CORPUS_VERSION = 0
     SUMMARIES_KEY = "summaries"
     SUMMARY_KEY = "summary"
+    # Lock to load the data only once when searched from many threads
+    _LOAD_LOCK = threading.Lock()
+    # Lock to apply the changes to the summaries one at a time
+    _UPDATE_LOCK = threading.RLock()
+    # Lock held by the searches as readers and by the changes to the
+    # summaries, the index and the scorer as the writer
+    _SEARCH_LOCK = ReadWriteLock()
+    # Map of summary id and summary index, built on the first change
+    _ID_INDEXES = None
+    # No of bytes of the updates file applied in this process
+    _UPDATES_OFFSET = 0
+    UPDATE_CHANGE = "update"
+    DELETE_CHANGE = "delete"
 
-    def __init__(self, query: str, summary_num: int, logger=None):
+    def __init__(self, query: str, summary_num: int, logger=None, page: int=0,
+                 parsed_query=None):
         self.logger = logger
         if not logger:
             self.logger = create_logger(Config.LOG_DIR, Config.LOG_FILE)
-        self.logger.info("Query: '%s', No of summaries to return: %d"
-                         % (query, summary_num))
-        self.query = query.lower()
+        self.logger.debug("Query: '%s', No of summaries to return: %d",
+                          query, summary_num)
+        # Query already parsed by the caller is not parsed again
+        self.parsed_query = parsed_query if parsed_query is not None else parse_query(query)
+        # Words are ranked in the canonical order, so the equivalent
+        # queries sharing the cache entry get the same ranking
+        self.query_terms = self.parsed_query.canonical_terms()
+        # Queries differing only in case, spaces or the order of the words
+        # share the cache entry
+        self.cache_key = self.parsed_query.key()
         self.summary_num = summary_num
+        # Page of summary_num results to return, 0 is the most relevant
+        self.page = page
 
-    def _load_json_for_keys(self, file: str, *keys: list, directory: str="") -> dict:
+    @staticmethod
+    def _load_json_for_keys(logger, file: str, *keys: list, directory: str="") -> dict:
         """
         Function load the json file and returns the result for specified keys
         Args:
+            logger: logger object
             file: json file name
             directory: json file directory
             keys: list of keys to be filtered in the loaded json
@@ -84,10 +140,11 @@ class Search:
         if not err:
             # Filtering the json output for only specific keys
             filtered_json = dict((key, json_out[key]) for key in keys if key in json_out)
-            self.logger.debug("Loaded json for filtered keys is: %s" % filtered_json)
+            logger.debug("Loaded json for filtered keys is: %s",
+                         PayloadSummary(filtered_json))
             return filtered_json
-        self.logger.error("Error while loading the json file:%s , Error:%s, Trace: %s"
-                          % (file, err, trace))
+        logger.error("Error while loading the json file:%s , Error:%s, Trace: %s",
+                          file, err, trace)
         return json_out
 
     def get_query_search_results(self, **custom_dict: dict):
@@ -112,75 +169,411 @@ class Search:
                             },
                         ]
         """
+        self.load(self.logger)
+        # Summaries are not changed while they are searched
+        with self._SEARCH_LOCK.read():
+            # Get the cached ranking of summaries in the order of relevance
+            with stage_timer("cache"):
+                cache_data = self.RESULT_CACHE.get(self.cache_key)
+            if cache_data is not None and not self._is_truncated(cache_data):
+                # If data is cached return it from the cache
+                self.logger.debug("Cached ranking for the search query: %s, "
+                                  "no of matches: %d", self.cache_key, len(cache_data))
+                return self._get_limited_search_results(cache_data, custom_dict)
+            # Get the ranking of summary indexes in desc order based the match
+            version = self.RESULT_CACHE.version
+            ranking = self._get_relevant_summaries()
+            self.logger.debug("No of summaries matching the query: %d", len(ranking))
+            # Update the cache with the ranking of summary indexes for the query,
+            # the next pages continue the same ranking. Ranking is not cached if
+            # the summaries have changed while it was computed
+            with stage_timer("cache"):
+                self.RESULT_CACHE.put(self.cache_key, ranking, version)
+            # Get the top K matches
+            summary_dict = self._get_limited_search_results(ranking, custom_dict)
+            self.logger.debug("Matching output summary: %s", PayloadSummary(summary_dict))
+            return summary_dict
+
+    @classmethod
+    def search_many(cls, queries: list, summary_num: int, logger=None,
+                    page: int=0, query_field: str=None) -> list:
+        """
+        Function to get the relevant summaries for many queries at once.
+        Repeated queries are searched once and the queries missing in the
+        cache are scored together from the inverted index.
+        Args:
+            queries: list of queries
+            summary_num: no of summaries to return for each query
+            logger: logger object
+            page: page of summary_num results to return
+            query_field: if given, the query is added to each of its results
+            with this key
+        Returns:
+            list of results of get_query_search_results for each query
+            [
+                [
+                    {
+                        "id": 48,
+                        "summary":"....."
+                    },
+                    {...}
+                ],
+                [...]
+            ]
+        """
+        # Queries having the same cache key share the search
+        searches = {}
+        query_keys = []
+        for query in queries:
+            parsed_query = parse_query(query)
+            cache_key = parsed_query.key()
+            if cache_key not in searches:
+                searches[cache_key] = cls(query, summary_num, logger, page, parsed_query)
+                logger = searches[cache_key].logger
+            query_keys.append(cache_key)
+        if not searches:
+            return []
+        cls.load(logger)
+        with cls._SEARCH_LOCK.read():
+            rankings = {}
+            missed_keys = []
+            with stage_timer("cache"):
+                for cache_key, search in searches.items():
+                    rankings[cache_key] = cls.RESULT_CACHE.get(cache_key)
+                    if rankings[cache_key] is None or search._is_truncated(rankings[cache_key]):
+                        missed_keys.append(cache_key)
+            logger.debug("Queries: %d, unique: %d, not cached: %d",
+                         len(queries), len(searches), len(missed_keys))
+            BATCH_QUERIES.inc(len(searches), search="unique")
+            BATCH_QUERIES.inc(len(queries) - len(searches), search="shared")
+            version = cls.RESULT_CACHE.version
+            with stage_timer("score"):
+                missed_rankings = cls._rank_queries(
+                    [searches[cache_key].parsed_query for cache_key in missed_keys],
+                    (page + 1) * summary_num, logger)
+            with stage_timer("cache"):
+                for cache_key, ranking in zip(missed_keys, missed_rankings):
+                    rankings[cache_key] = ranking
+                    cls.RESULT_CACHE.put(cache_key, ranking, version)
+            return [
+                searches[cache_key]._get_limited_search_results(
+                    rankings[cache_key], {query_field: query} if query_field else {})
+                for query, cache_key in zip(queries, query_keys)
+            ]
+
+    @classmethod
+    def load(cls, logger=None):
+        """
+        Function to load the input json data, build the inverted index and
+        create the result cache if they are not loaded yet in this process,
+        and apply the changes made by the other processes since.
+        It is called by the searches, servers can call it at startup so that
+        the first requests do not pay for it.
+        Args:
+            logger: logger object
+        """
+        if cls.RESULT_CACHE is None:
+            if not logger:
+                logger = create_logger(Config.LOG_DIR, Config.LOG_FILE)
+            set_enabled(Config.METRICS_ENABLED)
+            with cls._LOAD_LOCK, stage_timer("load"):
+                cls._load_data(logger)
+        cls._sync_updates(logger)
+
+    @classmethod
+    def _load_data(cls, logger):
+        # Memory map the corpus file if it is built, the summaries are
+        # decoded only when they are returned
+        if not cls.INPUT_DATA and Config.CORPUS_FILE:
+            data_dir = path.join(path.dirname(__file__), Config.DATA_DIR)
+            corpus = load_corpus(path.join(data_dir, Config.CORPUS_FILE),
+                                 path.join(data_dir, Config.INPUT_FILE), logger)
+            if corpus is not None:
+                cls.INPUT_DATA[cls.SUMMARIES_KEY] = corpus
+                cls.INDEX = corpus.index
+                logger.info("Corpus file: %s is loaded with %d summaries",
+                            corpus.file_path, len(corpus))
         # If there is not loaded input json data load it from the 
         # input json file
-        if not self.INPUT_DATA:
-            self.INPUT_DATA.update(
-                self._load_json_for_keys(
+        if not cls.INPUT_DATA:
+            cls.INPUT_DATA.update(
+                cls._load_json_for_keys(
+                    logger,
                     Config.INPUT_FILE, 
-                    self.SUMMARIES_KEY,
+                    cls.SUMMARIES_KEY,
                     directory=Config.DATA_DIR))
-        # Get the cached indexes of summaries in the order of relevance
-        cache_data = self._load_json_for_keys(
-                   Config.CACHE_FILE, 
-                   self.query,
-                   directory=Config.DATA_DIR)
-        if cache_data:
-            # If data is cached return it from the cache
-            self.logger.debug("Cached data json with search query and relevant "
-                              "summary indexes, data: %s" % cache_data)
-            return self._get_limited_search_results(cache_data[self.query], custom_dict)
-        # Get the matching score for each of the summary
-        summary_match_scores = self._get_relevant_summaries()
-        # Get the sorted summary indexes in desc order based the match
-        sorted_summary_match_score = self._get_sorted_match_on_relevance(
-                                   summary_match_scores)
-        self.logger.debug("Sorted summary match scores: %s" 
-                          % sorted_summary_match_score)
-        # Update the cache with the map of summary index with desc order of
-        # match and query
-        self._update_cache(sorted_summary_match_score)
-        # Get the top K matches
-        summary_dict = self._get_limited_search_results(sorted_summary_match_score, 
-                                                        custom_dict)
-        self.logger.info("Matching output summary: %s" % summary_dict)
-        return summary_dict
-
-    def _update_cache(self, sorted_summary_match_score: list):
-        """
-        Update the result cache with the query and matching scores in desc 
-        order of match
+        # Build the inverted index once for the loaded summaries
+        if cls.INDEX is None:
+            cls.INDEX = InvertedIndex(cls.INPUT_DATA.get(cls.SUMMARIES_KEY, []),
+                                      cls.SUMMARY_KEY)
+            logger.info("Inverted index is built with %d words", len(cls.INDEX))
+        # Changes made to the summaries since the input data was written
+        cls._sync_updates(logger)
+        if cls.SCORER is None:
+            cls.SCORER = create_scorer(Config.SCORING_BACKEND, cls.INDEX, logger,
+                                       Config.RANKING_MODE, Config.BM25_K1, Config.BM25_B,
+                                       int(Config.TERM_CACHE_SIZE_MB * 1024 * 1024))
+            logger.info("Scoring backend: %s", type(cls.SCORER).__name__)
+        if cls.RESULT_CACHE is None:
+            store_file = None
+            if Config.CACHE_FILE:
+                store_file = path.join(path.dirname(__file__), Config.DATA_DIR,
+                                       Config.CACHE_FILE)
+            # Only the top of the rankings is ranked for the store
+            cls.RESULT_CACHE = ResultCache(Config.CACHE_SIZE, Config.CACHE_TTL,
+                                           store_file, logger,
+                                           encode=_encode_ranking,
+                                           decode=_decode_ranking,
+                                           version=cls._get_cache_version(),
+                                           flush_interval=Config.CACHE_FLUSH_INTERVAL)
+            if store_file:
+                # Entries still batched are appended when the process exits
+                atexit.register(cls.RESULT_CACHE.flush)
+            logger.info("Result cache is loaded with %d queries",
+                        len(cls.RESULT_CACHE))
+
+    @classmethod
+    def get_summary_ids(cls) -> list:
+        """
+        Function to get the ids of all the loaded summaries
+        Returns:
+            Ex: [0, 1, 2, ...]
+        """
+        summaries = cls.INPUT_DATA.get(cls.SUMMARIES_KEY, [])
+        if isinstance(summaries, MappedCorpus):
+            return summaries.ids()
+        return [summary["id"] for summary in summaries if summary is not None]
+
+    @classmethod
+    def get_corpus_size(cls) -> int:
+        """
+        Function to get the no of loaded summaries without the deleted ones
+        """
+        if cls._ID_INDEXES is not None:
+            return len(cls._ID_INDEXES)
+        return len(cls.INPUT_DATA.get(cls.SUMMARIES_KEY, []))
+
+    @classmethod
+    def update_summaries(cls, summaries: list, logger=None) -> int:
+        """
+        Function to add the summaries with new ids and replace the summaries
+        with existing ids. Only the cached queries having the words of the
+        old or new summaries are invalidated.
         Args:
-            sorted_summary_match_score: sorted indexes of summaries in the
-            desc order of match
-            [2, 3, 1, 34, 15, ...]
+            summaries: list of summaries
+            Ex: [{"id": 60, "summary": "....."}]
+            logger: logger object
+        Returns:
+            corpus version after the change
         """
-        cache_file = path.join(path.dirname(__file__), Config.DATA_DIR, 
-                               Config.CACHE_FILE)
-        cache_dict, err, trace = load_json(cache_file)
-        if not err:
-            # If no error update the cache json data
-            cache_dict.update({
-                self.query: sorted_summary_match_score
-            })
-            # Dump the updated cache into file
-            err, trace = dump_json(cache_file, cache_dict)
-            if err:
-                self.logger.error("Error dumping the data into cache file: %s,"
-                                  "Error: %s, Trace: %s" 
-                                  % (cache_file, err, trace))
+        summaries = [{"id": summary["id"], cls.SUMMARY_KEY: summary[cls.SUMMARY_KEY]}
+                     for summary in summaries]
+        return cls._change_summaries(cls.UPDATE_CHANGE, summaries, logger)
+
+    @classmethod
+    def delete_summaries(cls, ids: list, logger=None) -> int:
+        """
+        Function to delete the summaries of the ids, unknown ids are ignored
+        Args:
+            ids: list of summary ids
+            logger: logger object
+        Returns:
+            corpus version after the change
+        """
+        return cls._change_summaries(cls.DELETE_CHANGE, list(ids), logger)
+
+    @classmethod
+    def _change_summaries(cls, change: str, items: list, logger=None) -> int:
+        """
+        Function to apply the change in this process. If there is an updates
+        file the change is appended to it, so that the other processes and
+        the restarted ones apply it too.
+        """
+        if not logger:
+            logger = create_logger(Config.LOG_DIR, Config.LOG_FILE)
+        cls.load(logger)
+        with cls._UPDATE_LOCK:
+            updates_file = cls._get_updates_file()
+            if not updates_file:
+                cls._apply_changes([(change, items)], logger)
+                return cls.CORPUS_VERSION
+            # Applied in the order of the file along with the changes of
+            # the other processes, the lock keeps their lines whole
+            with file_lock(updates_file), open(updates_file, "a", encoding="utf-8") as fp:
+                fp.write(json.dumps([change, items], separators=(",", ":")) + "\n")
+            cls._sync_updates(logger)
+            return cls.CORPUS_VERSION
+
+    @classmethod
+    def _get_cache_version(cls) -> str:
+        """
+        Function to get the version of the cached results, results of
+        another normalizer, ranking mode or corpus version are not used
+        Ex: "fold+punct:count:3"
+        """
+        ranking = Config.RANKING_MODE
+        if Config.TOP_K_PRUNING:
+            # Pruned rankings are cut off after PRUNED_TOP_K summaries
+            ranking = "%s-top%d" % (ranking, Config.PRUNED_TOP_K)
+        return "%s:%s:%d" % (NORMALIZER.name, ranking, cls.CORPUS_VERSION)
+
+    @staticmethod
+    def _get_updates_file() -> str:
+        if not Config.UPDATES_FILE:
+            return None
+        return path.join(path.dirname(__file__), Config.DATA_DIR, Config.UPDATES_FILE)
+
+    @classmethod
+    def _sync_updates(cls, logger):
+        """
+        Function to apply the changes appended to the updates file since it
+        was last read in this process, corrupt lines are logged and skipped
+        """
+        updates_file = cls._get_updates_file()
+        if not updates_file:
+            return
+        try:
+            if path.getsize(updates_file) <= cls._UPDATES_OFFSET:
+                return
+        except OSError:
+            return
+        if not logger:
+            logger = create_logger(Config.LOG_DIR, Config.LOG_FILE)
+        with cls._UPDATE_LOCK:
+            changes = []
+            with open(updates_file, "rb") as fp:
+                fp.seek(cls._UPDATES_OFFSET)
+                for line in fp:
+                    # Line still being written is read on the next sync
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        change = json.loads(line)
+                        if (not isinstance(change, list) or len(change) != 2
+                                or not isinstance(change[1], list)):
+                            raise ValueError("change is not a [change, items] pair")
+                        changes.append(change)
+                    except ValueError as err:
+                        logger.error("Skipping the corrupt line at offset %d of the "
+                                     "updates file: %s, Error: %s",
+                                     cls._UPDATES_OFFSET, updates_file, err)
+                    cls._UPDATES_OFFSET += len(line)
+            if changes:
+                cls._apply_changes(changes, logger)
+
+    @classmethod
+    def _apply_changes(cls, changes: list, logger):
+        """
+        Function to apply the changes to the summaries and the inverted
+        index, invalidate the cached queries having the changed words and
+        update the scoring backend. Searches wait until all the changes are
+        applied, so they never see a half changed index.
+        The python backend updates the statistics of the changed summaries
+        only. The numpy backend rebuilds its count matrix, which is linear
+        in the size of the corpus, once for all the changes applied together.
+        Args:
+            changes: list of (change, items)
+            Ex: [("update", [{"id": 60, "summary": "....."}]), ("delete", [12])]
+        """
+        with cls._SEARCH_LOCK.write():
+            cls._apply_changes_locked(changes, logger)
+
+    @classmethod
+    def _apply_changes_locked(cls, changes: list, logger):
+        summaries = cls._get_editable_summaries(logger)
+        changed_docs = set()
+        all_changed_terms = set()
+        for change, items in changes:
+            changed_terms = set()
+            if change == cls.UPDATE_CHANGE:
+                for summary in items:
+                    doc_index, terms = cls._update_summary(summaries, summary)
+                    changed_docs.add(doc_index)
+                    changed_terms |= terms
+            elif change == cls.DELETE_CHANGE:
+                for summary_id in items:
+                    doc_index, terms = cls._delete_summary(summaries, summary_id)
+                    if doc_index is not None:
+                        changed_docs.add(doc_index)
+                    changed_terms |= terms
             else:
-                self.logger.info("Cache file: %s is updated successfully" % cache_file)
+                logger.error("Unknown change to the summaries: %s", change)
+            all_changed_terms |= changed_terms
+            cls.CORPUS_VERSION += 1
+            if cls.RESULT_CACHE is not None:
+                if Config.RANKING_MODE == COUNT_MODE:
+                    is_stale = lambda key: not changed_terms.isdisjoint(key.split(" "))
+                else:
+                    # Word weights depend on all the summaries, so every
+                    # cached ranking may change
+                    is_stale = lambda key: True
+                num_invalidated = cls.RESULT_CACHE.invalidate(
+                    is_stale, cls._get_cache_version())
+                logger.debug("Cached queries invalidated by the change: %d",
+                             num_invalidated)
+        if isinstance(cls.SCORER, PythonScorer) and cls.SCORER.index is cls.INDEX:
+            cls.SCORER.update_documents(changed_docs, all_changed_terms)
+        elif cls.SCORER is not None:
+            # Scorer of the memory mapped corpus or of the numpy backend
+            cls.SCORER = create_scorer(Config.SCORING_BACKEND, cls.INDEX, logger,
+                                       Config.RANKING_MODE, Config.BM25_K1, Config.BM25_B,
+                                       int(Config.TERM_CACHE_SIZE_MB * 1024 * 1024))
+            logger.info("Scoring backend is rebuilt for the changes: %s",
+                        type(cls.SCORER).__name__)
+        logger.info("Applied %d changes to the summaries, corpus version: %d",
+                    len(changes), cls.CORPUS_VERSION)
+
+    @classmethod
+    def _get_editable_summaries(cls, logger) -> list:
+        """
+        Function to get the list of summaries which can be changed, summaries
+        of the memory mapped corpus are decoded and indexed in memory on the
+        first change. That is linear in the size of the corpus and done once
+        by each process.
+        """
+        summaries = cls.INPUT_DATA.setdefault(cls.SUMMARIES_KEY, [])
+        if isinstance(summaries, MappedCorpus):
+            summaries = list(summaries)
+            cls.INDEX = InvertedIndex(summaries, cls.SUMMARY_KEY)
+            cls.INPUT_DATA[cls.SUMMARIES_KEY] = summaries
+            logger.info("Corpus file is loaded in memory to apply the changes")
+        if cls._ID_INDEXES is None:
+            cls._ID_INDEXES = dict((summary["id"], doc_index)
+                                   for doc_index, summary in enumerate(summaries)
+                                   if summary is not None)
+        return summaries
+
+    @classmethod
+    def _update_summary(cls, summaries: list, summary: dict) -> tuple:
+        doc_index = cls._ID_INDEXES.get(summary["id"])
+        changed_terms = set()
+        if doc_index is None:
+            doc_index = len(summaries)
+            summaries.append(summary)
+            cls._ID_INDEXES[summary["id"]] = doc_index
         else:
-            self.logger.error("Error loading the cache file: %s, Error: %s, "
-                              "Trace: %s" % (cache_file, err, trace))
+            summaries[doc_index] = summary
+            changed_terms |= cls.INDEX.remove_document(doc_index)
+        changed_terms |= cls.INDEX.add_document(doc_index, summary[cls.SUMMARY_KEY])
+        return doc_index, changed_terms
+
+    @classmethod
+    def _delete_summary(cls, summaries: list, summary_id: int) -> tuple:
+        # Index of the deleted summary is not reused, so the indexes of the
+        # other summaries and their cached rankings stay valid
+        doc_index = cls._ID_INDEXES.pop(summary_id, None)
+        if doc_index is None:
+            return None, set()
+        changed_terms = cls.INDEX.remove_document(doc_index)
+        summaries[doc_index] = None
+        return doc_index, changed_terms
 
-    def _get_limited_search_results(self, data: list, custom_fields: dict={}) -> list: 
+    def _get_limited_search_results(self, data: Ranking, custom_fields: dict={}) -> list: 
         """
-        Function to get the top K search results from the input json with
-        custom fields if required
+        Function to get the top K search results of the page from the input
+        json with custom fields if required
         Args:
-            data: list of summary indexes in the desc order of match for a query
+            data: ranking of summary indexes in the desc order of match for a query
             custom_fields: custom key-value pairs to be stored in the result array
         Returns:
             The array of summaries in desc order of match with the given query
@@ -196,70 +589,134 @@ class Search:
                 {...}
             ]
         """
-        return [
-            {**self.INPUT_DATA[self.SUMMARIES_KEY][summary_index], **custom_fields}
-            for summary_index in data[:self.summary_num]
-        ]
+        summaries = self.INPUT_DATA[self.SUMMARIES_KEY]
+        # Summaries deleted after the ranking was read are skipped
+        with stage_timer("rank"):
+            return [
+                {**summary, **custom_fields}
+                for summary in (summaries[summary_index]
+                                for summary_index in data.page(self.page, self.summary_num))
+                if summary is not None
+            ]
 
-    def _get_relevant_summaries(self) -> list:
+    def _get_relevant_summaries(self) -> Ranking:
         """
-        Function to return the array of scores of summaries for the given array:
+        Function to rank the summaries having at least one of the query
+        words in desc order of their match, indexes having the same score
+        are ranked in their increasing order
         Returns:
-            Ex: [7, 5, 11, 23,..]
+            Ranking, Ex: ranking.ranked() = [1, 0, 2]
         """
-        query_splits = self._remove_empty_str(self.query)
-        return [self._get_query_match_score(summary[self.SUMMARY_KEY], query_splits)
-                for summary in self.INPUT_DATA[self.SUMMARIES_KEY]]
+        with stage_timer("score"):
+            return self._rank_queries([self.parsed_query],
+                                      (self.page + 1) * self.summary_num, self.logger)[0]
 
-    @staticmethod
-    def _remove_empty_str(string):
+    @classmethod
+    def _rank_queries(cls, queries: list, num: int, logger) -> list:
         """
-        Remove the empty strings in a splitted array
+        Function to rank the summaries for the queries, only the top
+        summaries are ranked if the pruning is on and they fill the pages.
+        Queries with phrases or proximities are ranked fully and only the
+        summaries satisfying them are kept.
         Args:
-            string: string input
+            queries: list of ParsedQuery
+            num: no of top summaries needed for each query
+            logger: logger object
         Returns:
-            string_splits: array of words in the string without empty strings
-        Ex:
-            string = "  hai hello"
-            string_splits = ["hai", "hello"]
-        """ 
-        string_splits = string.split(" ")
-        empty_str = ""
-        while empty_str in string_splits:
-            string_splits.remove(empty_str)
-        return string_splits
+            list of rankings for each query
+        """
+        pruned = Config.TOP_K_PRUNING and num <= Config.PRUNED_TOP_K
+        rankings = [None] * len(queries)
+        positions = [position for position, query in enumerate(queries)
+                     if not pruned or query.has_constraints()]
+        full_rankings = cls.SCORER.rank_many([queries[position].canonical_terms()
+                                              for position in positions])
+        for position, ranking in zip(positions, full_rankings):
+            query = queries[position]
+            if query.has_constraints():
+                matches = query.matching_docs(cls.INDEX)
+                logger.debug("Summaries matching the constraints of the query: %s, %d of %d",
+                             query.key(), len(matches), len(ranking))
+                ranking = Ranking.from_ranked([summary_index for summary_index in ranking.ranked()
+                                               if summary_index in matches])
+            rankings[position] = ranking
+        for position, query in enumerate(queries):
+            if rankings[position] is not None:
+                continue
+            ranking, stats = cls.SCORER.rank_top(query.canonical_terms(), Config.PRUNED_TOP_K)
+            logger.debug("Pruned retrieval of the query: %s, scored: %d, skipped: %d",
+                         query.key(), stats["scored"], stats["skipped"])
+            PRUNING_DOCUMENTS.inc(stats["scored"], outcome="scored")
+            PRUNING_DOCUMENTS.inc(stats["skipped"], outcome="skipped")
+            rankings[position] = ranking
+        return rankings
 
-    @staticmethod
-    def _get_query_match_score(summary: str, query_splits: list) -> int:
+    def _is_truncated(self, ranking: Ranking) -> bool:
         """
-        This is the function to get  the matching score for a summary with 
-        the qiven query
-        Args:
-            summary: summary string
-            query_splits: array of splitted queries
-        Returns:
-            query_count_in_summary: no of matches of the query in the given summary
-        This method returns the total no of occurences of all the query words in the 
-        summary.
+        Function to check if the ranking may be cut off by the pruned
+        retrieval or the cache store before the page of the search, a pruned
+        ranking with less than PRUNED_TOP_K summaries has all the matches
         """
-        summary_words = summary.lower().split(" ")
-        query_count_in_summary = 0
-        for qry in query_splits:
-            query_count_in_summary += summary_words.count(qry)
-        return query_count_in_summary
+        if len(ranking) >= (self.page + 1) * self.summary_num:
+            return False
+        return ranking.truncated or (Config.TOP_K_PRUNING
+                                     and len(ranking) >= Config.PRUNED_TOP_K)
 
-    @staticmethod
-    def _get_sorted_match_on_relevance(data: list) -> list:
-        """
-        Function to sort the indexes in desc order of their value
-        Ex:
-         input = [7, 9, 2]
-         output = [1, 0, 2]
 
-        """
-        return [i[0] for i in sorted(enumerate(data), key=lambda x: x[1], reverse=True) if i[1] != 0]
+def _encode_ranking(ranking: Ranking) -> list:
+    """
+    Function to get the top of the ranking written to the cache store
+    """
+    return ranking.top(Config.CACHE_STORED_RESULTS)
+
+
+def _decode_ranking(ranked: list) -> Ranking:
+    """
+    Function to restore the ranking from the cache store, a full list of
+    stored results may not have all the matches
+    """
+    return Ranking.from_ranked(ranked, len(ranked) >= Config.CACHE_STORED_RESULTS)
 
 
+CORPUS_SIZE = Gauge("search_corpus_summaries", "No of summaries in the corpus.")
+CORPUS_VERSION = Gauge("search_corpus_version", "No of changes made to the summaries.")
+RESULT_CACHE_LOOKUPS = Counter("search_result_cache_lookups_total",
+                               "Lookups of the query result cache by result.")
+RESULT_CACHE_HIT_RATIO = Gauge("search_result_cache_hit_ratio",
+                               "Ratio of the query result cache lookups which hit.")
+RESULT_CACHE_SIZE = Gauge("search_result_cache_queries",
+                          "No of queries in the query result cache.")
+BATCH_QUERIES = Counter("search_batch_queries_total",
+                        "Queries of the batch searches, shared queries reuse the "
+                        "search of an equivalent query of the batch.")
+PRUNING_DOCUMENTS = Counter("search_pruning_documents_total",
+                            "Summaries fully scored and postings skipped by the "
+                            "pruned retrieval.")
+TERM_CACHE_LOOKUPS = Counter("search_term_cache_lookups_total",
+                             "Lookups of the score vectors of the query words by result.")
+TERM_CACHE_BYTES = Gauge("search_term_cache_bytes",
+                         "Approximate bytes of the cached score vectors of the query words.")
+
+
+def _collect_metrics():
+    """
+    Function to set the metrics of the search data of this process
+    """
+    CORPUS_SIZE.set(Search.get_corpus_size())
+    CORPUS_VERSION.set(Search.CORPUS_VERSION)
+    if Search.RESULT_CACHE is not None:
+        stats = Search.RESULT_CACHE.stats()
+        RESULT_CACHE_LOOKUPS.set(stats["hits"], result="hit")
+        RESULT_CACHE_LOOKUPS.set(stats["misses"], result="miss")
+        lookups = stats["hits"] + stats["misses"]
+        RESULT_CACHE_HIT_RATIO.set(stats["hits"] / lookups if lookups else 0.0)
+        RESULT_CACHE_SIZE.set(stats["size"])
+    term_cache = getattr(Search.SCORER, "term_cache", None)
+    if term_cache is not None:
+        stats = term_cache.stats()
+        TERM_CACHE_LOOKUPS.set(stats["hits"], result="hit")
+        TERM_CACHE_LOOKUPS.set(stats["misses"], result="miss")
+        TERM_CACHE_BYTES.set(stats["bytes"])
 
 
-    
\ No newline at end of file
+add_collector(_collect_metrics)
@@ -0,0 +1,316 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to search the summaries split into shards, each
+# shard is indexed and searched by its own worker process on this machine.
+# Summaries are assigned to the shards by their id, and keep their index in
+# the input data so the ties are ranked as in the unsharded search. The
+# queries are sent to all the shards, each shard returns its top matches
+# with their scores and the top matches of all the shards are merged in
+# the desc order of score and the increasing order of index.
+# The bm25 and tfidf weights depend on all the summaries, so the shards
+# report the statistics of their summaries at startup and are weighed with
+# the statistics of the whole collection.
+# Shards map the binary corpus file and decode only their own summaries,
+# the file is built at startup if it is missing or older than the input
+# json file, so the shards do not each parse the input json file. The
+# changes made to the summaries at runtime are not applied to them.
+#
+# Sample Usage
+# sharded_search = ShardedSearch(shards=4, logger=logger)
+# sharded_search.start()  # builds the corpus file if needed
+# sharded_search.search_many(queries, summary_num, query_field="query")
+# sharded_search.shutdown()
+
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os import path
+
+from search.config import Config
+from search.corpus import MappedCorpus, build_corpus, load_corpus
+from search.index import InvertedIndex
+from search.query import parse_query
+from search.scoring import (COUNT_MODE, collection_statistics, create_scorer,
+                            merge_collection_statistics)
+from search.search_summary import Search
+from utilities.file_store import file_lock
+from utilities.json_parser import load_json
+from utilities.metrics import stage_timer
+
+# Shard and logger of the worker process
+_worker_shard = None
+_worker_logger = None
+
+
+def get_shard(summary_id: int, num_shards: int) -> int:
+    """
+    Function to get the shard of the summary
+    Args:
+        summary_id: id of the summary
+        num_shards: no of shards
+    Returns:
+        Ex: 2
+    """
+    return summary_id % num_shards
+
+
+def _get_data_files() -> tuple:
+    """
+    Function to get the paths of the input json file and the corpus file
+    """
+    data_dir = path.join(path.dirname(__file__), Config.DATA_DIR)
+    if not Config.CORPUS_FILE:
+        raise ValueError("Sharded search needs the corpus file, set CORPUS_FILE "
+                         "in search/config.py")
+    return (path.join(data_dir, Config.INPUT_FILE),
+            path.join(data_dir, Config.CORPUS_FILE))
+
+
+def prepare_corpus(logger) -> str:
+    """
+    Function to build the corpus file mapped by the shards if it is missing
+    or older than the input json file, the server processes starting
+    together build it once
+    Returns:
+        corpus file path
+    """
+    input_file, corpus_file = _get_data_files()
+    with file_lock(corpus_file):
+        if load_corpus(corpus_file, input_file) is None:
+            num_docs = build_corpus(input_file, corpus_file, Search.SUMMARIES_KEY,
+                                    Search.SUMMARY_KEY)
+            logger.info("Corpus file: %s is built for the shards with %d summaries",
+                        corpus_file, num_docs)
+    return corpus_file
+
+
+def load_summaries(logger) -> list:
+    """
+    Function to load the summaries of the corpus file, or the input json
+    file if the corpus file is not built
+    Returns:
+        list of summary dicts, the memory mapped corpus is decoded lazily
+    """
+    data_dir = path.join(path.dirname(__file__), Config.DATA_DIR)
+    input_file = path.join(data_dir, Config.INPUT_FILE)
+    if Config.CORPUS_FILE:
+        corpus = load_corpus(path.join(data_dir, Config.CORPUS_FILE), input_file, logger)
+        if corpus is not None:
+            return corpus
+    input_data, err, trace = load_json(input_file)
+    if err:
+        logger.error("Error while loading the json file:%s , Error:%s, Trace: %s",
+                     input_file, err, trace)
+        return []
+    return input_data.get(Search.SUMMARIES_KEY, [])
+
+
+def load_summary_ids(logger) -> list:
+    """
+    Function to get the ids of all the summaries without indexing them
+    Returns:
+        Ex: [0, 1, 2, ...]
+    """
+    summaries = load_summaries(logger)
+    if isinstance(summaries, MappedCorpus):
+        return summaries.ids()
+    return [summary["id"] for summary in summaries]
+
+
+class IndexShard:
+    """
+    Class which indexes and ranks the summaries of a shard, the summaries
+    are ranked by their index in the input data
+    """
+
+    def __init__(self, summaries: list, positions: list):
+        """
+        Args:
+            summaries: list of summary dicts of the shard
+            positions: index of each summary in the input data
+        """
+        self.summaries = summaries
+        self.positions = positions
+        self.index = InvertedIndex(summaries, Search.SUMMARY_KEY)
+        self.scorer = None
+
+    @classmethod
+    def load(cls, shard: int, num_shards: int, logger):
+        """
+        Function to load the summaries of the shard from the corpus file
+        built by prepare_corpus, only the summaries of the shard are decoded
+        Args:
+            shard: shard number starting from 0
+            num_shards: no of shards
+            logger: logger object
+        """
+        input_file, corpus_file = _get_data_files()
+        corpus = load_corpus(corpus_file, input_file, logger)
+        if corpus is None:
+            raise ValueError("Corpus file: %s of the shards is missing or stale"
+                             % corpus_file)
+        positions = [position for position, summary_id in enumerate(corpus.ids())
+                     if get_shard(summary_id, num_shards) == shard]
+        return cls([corpus[position] for position in positions], positions)
+
+    def statistics(self) -> dict:
+        """
+        Function to get the statistics of the summaries of the shard
+        """
+        return collection_statistics(self.index)
+
+    def create_scorer(self, logger=None, collection: dict=None):
+        """
+        Function to create the scoring backend of the shard
+        Args:
+            logger: logger object
+            collection: statistics of the whole collection for the bm25 and
+            tfidf modes
+        """
+        self.scorer = create_scorer(Config.SCORING_BACKEND, self.index, logger,
+                                    Config.RANKING_MODE, Config.BM25_K1, Config.BM25_B,
+                                    int(Config.TERM_CACHE_SIZE_MB * 1024 * 1024),
+                                    collection)
+
+    def search_many(self, queries: list, num: int) -> list:
+        """
+        Function to get the top matches of the shard for many queries
+        Args:
+            queries: list of queries
+            num: no of top matches to return for each query
+        Returns:
+            list of matches for each query in the desc order of score
+            [[(-score, index in the input data, summary), ...], [...]]
+        """
+        parsed_queries = [parse_query(query) for query in queries]
+        rankings = self.scorer.rank_many([parsed_query.canonical_terms()
+                                          for parsed_query in parsed_queries])
+        results = []
+        for parsed_query, ranking in zip(parsed_queries, rankings):
+            if parsed_query.has_constraints():
+                matches = parsed_query.matching_docs(self.index)
+                scored = [(summary_index, score)
+                          for summary_index, score in ranking.top_scored(len(ranking))
+                          if summary_index in matches][:num]
+            else:
+                scored = ranking.top_scored(num)
+            results.append([(-score, self.positions[summary_index],
+                             self.summaries[summary_index])
+                            for summary_index, score in scored])
+        return results
+
+
+def _init_shard(shard: int, num_shards: int, logger):
+    """
+    Function to load the shard once in the worker process
+    """
+    global _worker_shard, _worker_logger
+    _worker_logger = logger
+    _worker_shard = IndexShard.load(shard, num_shards, logger)
+    logger.info("Shard %d of %d is loaded with %d summaries",
+                shard, num_shards, len(_worker_shard.summaries))
+
+
+def _get_statistics() -> dict:
+    return _worker_shard.statistics()
+
+
+def _create_scorer(collection: dict):
+    _worker_shard.create_scorer(_worker_logger, collection)
+
+
+def _search_shard(queries: list, num: int) -> list:
+    return _worker_shard.search_many(queries, num)
+
+
+def merge_matches(shards_matches: list, num: int) -> list:
+    """
+    Function to merge the top matches of the shards for a query
+    Args:
+        shards_matches: list of matches of each shard, as returned by
+        IndexShard.search_many for the query
+        num: no of top matches to return
+    Returns:
+        top summaries of all the shards in the desc order of score, ties in
+        the increasing order of their index in the input data
+    """
+    return [summary for _, _, summary in islice(heapq.merge(*shards_matches), num)]
+
+
+class ShardedSearch:
+    """
+    Class which searches the queries on all the shards of the summaries
+    and merges their top matches
+    """
+
+    def __init__(self, shards: int, logger):
+        self.shards = shards
+        self.logger = logger
+        # One single process pool for each shard, so a shard is always
+        # searched by the process holding it
+        self._pools = []
+
+    def start(self):
+        """
+        Function to build the corpus file if needed, start the shard
+        processes and wait for them to load their summaries
+        """
+        prepare_corpus(self.logger)
+        self._pools = [ProcessPoolExecutor(max_workers=1, initializer=_init_shard,
+                                           initargs=(shard, self.shards, self.logger))
+                       for shard in range(self.shards)]
+        collection = None
+        if Config.RANKING_MODE != COUNT_MODE:
+            collection = merge_collection_statistics(
+                self._gather([pool.submit(_get_statistics) for pool in self._pools]))
+        self._gather([pool.submit(_create_scorer, collection) for pool in self._pools])
+        self.logger.info("Sharded search is started with %d shards", self.shards)
+
+    def search_many(self, queries: list, summary_num: int, page: int=0,
+                    query_field: str=None) -> list:
+        """
+        Function to get the relevant summaries for many queries from all
+        the shards, as returned by Search.search_many. Queries having the
+        same canonical key are searched once.
+        Args:
+            queries: list of queries
+            summary_num: no of summaries to return for each query
+            page: page of summary_num results to return
+            query_field: if given, the query is added to each of its results
+            with this key
+        Returns:
+            list of results for each query
+        """
+        # Map of cache key and the query searched for it
+        unique_queries = {}
+        query_keys = [parse_query(query).key() for query in queries]
+        for query, query_key in zip(queries, query_keys):
+            unique_queries.setdefault(query_key, query)
+        num = (page + 1) * summary_num
+        with stage_timer("score"):
+            shards_results = self._gather([
+                pool.submit(_search_shard, list(unique_queries.values()), num)
+                for pool in self._pools])
+        results = {}
+        for position, query_key in enumerate(unique_queries):
+            results[query_key] = merge_matches(
+                [shard_results[position] for shard_results in shards_results],
+                num)[page * summary_num:]
+        return [[{**summary, query_field: query} if query_field else dict(summary)
+                 for summary in results[query_key]]
+                for query, query_key in zip(queries, query_keys)]
+
+    def shutdown(self):
+        """
+        Function to stop the shard processes
+        """
+        for pool in self._pools:
+            pool.shutdown()
+        self._pools = []
+
+    @staticmethod
+    def _gather(futures: list) -> list:
+        return [future.result() for future in futures]
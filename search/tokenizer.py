@@ -0,0 +1,166 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module has the normalizer which turns the summaries and the queries
+# into the words used for indexing and matching. The same normalizer is
+# used for both, so a query word matches a summary word only if both
+# normalize to the same token. The steps are:
+#   case folding: "Gift" -> "gift"
+#   punctuation stripping: "gift," -> "gift", "don't" is kept as a word
+#   stemming (optional): "gifts" -> "gift", "giving" -> "giv"
+#   stopwords (optional): "is", "a", ... are dropped
+# The legacy split lower cases the text and splits it only on the space
+# character like the first versions of the engine, so its rankings are the
+# same as theirs: tabs, newlines and non breaking spaces are kept inside
+# the words and "Gift" is lower cased but not case folded.
+# The name of the normalizer tags the files storing the tokens, so tokens
+# of another normalizer are not mixed with its tokens.
+#
+# Sample Usage
+# normalizer = Normalizer(strip_punctuation=True, stemmer="light")
+# normalizer.tokenize("  Gifts, given  freely")
+# ["gift", "given", "freely"]
+# normalizer.name
+# "fold+punct+light"
+
+import re
+import sys
+import zlib
+
+# Words of the text when punctuation is stripped, apostrophes inside a
+# word are kept
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)*")
+LIGHT_STEMMER = "light"
+
+ENGLISH_STOPWORDS = frozenset((
+    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and",
+    "any", "are", "as", "at", "be", "because", "been", "before", "being", "below",
+    "between", "both", "but", "by", "can", "did", "do", "does", "doing", "down",
+    "during", "each", "few", "for", "from", "further", "had", "has", "have",
+    "having", "he", "her", "here", "hers", "herself", "him", "himself", "his",
+    "how", "i", "if", "in", "into", "is", "it", "its", "itself", "just", "me",
+    "more", "most", "my", "myself", "no", "nor", "not", "now", "of", "off", "on",
+    "once", "only", "or", "other", "our", "ours", "ourselves", "out", "over",
+    "own", "same", "she", "should", "so", "some", "such", "than", "that", "the",
+    "their", "theirs", "them", "themselves", "then", "there", "these", "they",
+    "this", "those", "through", "to", "too", "under", "until", "up", "very",
+    "was", "we", "were", "what", "when", "where", "which", "while", "who",
+    "whom", "why", "will", "with", "you", "your", "yours", "yourself",
+    "yourselves"))
+
+# Suffixes removed by the light stemmer with their replacement, the first
+# matching suffix is used
+_LIGHT_SUFFIXES = (("sses", "ss"), ("ies", "y"), ("ss", "ss"), ("s", ""),
+                   ("ingly", ""), ("edly", ""), ("ing", ""), ("ed", ""), ("ly", ""))
+
+
+def light_stem(word: str) -> str:
+    """
+    Function to remove the common inflectional suffixes of an english word,
+    the stem is kept at least 3 characters long
+    Ex:
+        light_stem("problems") = "problem"
+        light_stem("stories") = "story"
+    """
+    for suffix, replacement in _LIGHT_SUFFIXES:
+        if word.endswith(suffix):
+            stem = word[:len(word) - len(suffix)] + replacement
+            if len(stem) >= 3:
+                return stem
+            return word
+    return word
+
+
+class Normalizer:
+    """
+    Class which splits the text into the normalized words used for
+    indexing and matching
+    """
+    STEMMERS = {LIGHT_STEMMER: light_stem}
+
+    def __init__(self, case_fold: bool=True, strip_punctuation: bool=True,
+                 stemmer: str=None, stopwords=None, legacy_split: bool=False):
+        """
+        Args:
+            case_fold: case fold the words
+            strip_punctuation: split the text on the non word characters
+            instead of the whitespace
+            stemmer: "light" or None
+            stopwords: collection of the words to be dropped, "english" for
+            ENGLISH_STOPWORDS or None
+            legacy_split: lower case the text and split it on the space
+            character, case_fold and strip_punctuation are not used
+        """
+        if stemmer is not None and stemmer not in self.STEMMERS:
+            raise ValueError("Unknown stemmer: %s" % stemmer)
+        if stopwords == "english":
+            stopwords = ENGLISH_STOPWORDS
+        self.case_fold = case_fold
+        self.strip_punctuation = strip_punctuation
+        self.stemmer = stemmer
+        self.legacy_split = legacy_split
+        self._stem = self.STEMMERS.get(stemmer)
+        self.stopwords = frozenset(stopwords) if stopwords else frozenset()
+        self.name = self._get_name()
+        # Map of the words seen and their tokens, words repeat a lot across
+        # the summaries so they are normalized once
+        self._tokens = {}
+
+    def _get_name(self) -> str:
+        steps = []
+        if self.legacy_split:
+            steps.append("legacy")
+        else:
+            if self.case_fold:
+                steps.append("fold")
+            steps.append("punct" if self.strip_punctuation else "split")
+        if self.stemmer:
+            steps.append(self.stemmer)
+        if self.stopwords:
+            words = "\n".join(sorted(self.stopwords)).encode("utf-8")
+            steps.append("stop-%08x" % zlib.crc32(words))
+        return "+".join(steps)
+
+    def tokenize(self, text: str) -> list:
+        """
+        Function to split the text into the normalized words
+        Args:
+            text: input text
+        Returns:
+            tokens: normalized words of the text without empty strings
+        Ex:
+            text = "  Hai, hello"
+            tokens = ["hai", "hello"]
+        """
+        if self.legacy_split:
+            words = [word for word in text.lower().split(" ") if word]
+        else:
+            if self.case_fold:
+                text = text.casefold()
+            if self.strip_punctuation:
+                words = WORD_PATTERN.findall(text)
+            else:
+                words = text.split()
+        if self._stem is None and not self.stopwords:
+            return words
+        tokens = []
+        cache = self._tokens
+        for word in words:
+            token = cache.get(word)
+            if token is None:
+                token = self._normalize_word(word)
+                # Unbounded words of the queries are not cached
+                if len(cache) < 1000000:
+                    cache[word] = token
+            if token:
+                tokens.append(token)
+        return tokens
+
+    def _normalize_word(self, word: str) -> str:
+        if word in self.stopwords:
+            return ""
+        if self._stem is not None:
+            word = self._stem(word)
+        return sys.intern(word)
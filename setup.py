@@ -21,6 +21,10 @@ setuptools.setup(
     url="https://github.com/pypa/sampleproject",
     packages=setuptools.find_packages(),
     install_requires=requirements,
+    extras_require={
+        "numpy": ["numpy"],
+        "server": ["gunicorn"],
+    },
     python_requires=">=3, <4",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -0,0 +1,379 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to resolve the authors of the books from the
+# author endpoint. The book ids missing in the cache are fetched
+# concurrently over a pooled http session with a limit on the no of
+# concurrent requests, timeouts and retries. Concurrent lookups of the
+# same book id share a single http request. Book ids the endpoint answers
+# without an author are remembered and not requested again.
+# The author table resolves the authors of all the books once at startup,
+# so the requests only read them from the table, and keeps retrying the
+# missing authors in the background. Requests can also resolve the authors
+# missing in the table themselves.
+#
+# Sample Usage
+# resolver = AuthorResolver(Config.AUTHOR_ENDPOINT, request_cache, logger)
+# resolver.resolve_many([48, 0, 48])
+# {48: "Mark Manson", 0: "Dan Harris"}
+# table = AuthorTable(resolver, Config.DATA_FILE_PATH, logger)
+# table.warm_up(book_ids)
+# table.start_refresh(Config.AUTHOR_REFRESH_INTERVAL)
+# table.attach(summaries)
+# table.attach(summaries, resolve_missing=True)
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utilities.json_parser import update_json
+
+
+def is_book_id(book_id) -> bool:
+    """
+    Function to check if the value is a valid book id, a non negative int
+    """
+    return isinstance(book_id, int) and not isinstance(book_id, bool) and book_id >= 0
+
+
+class AuthorResolver:
+    """
+    Class which resolves and caches the authors of the books
+    cache is the map of book id string and author
+    Ex:
+      {
+          "48": "Mark Manson",
+          "0": "Dan Harris"
+      }
+    """
+
+    def __init__(self, endpoint: str, cache: dict, logger=None,
+                 concurrency: int=8, timeout: float=5, retries: int=2,
+                 backoff: float=0.1):
+        self.endpoint = endpoint
+        self.cache = cache
+        self.logger = logger
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.session = self._create_session()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix="author-resolver")
+        # Map of book id string and the future of its running lookup
+        self._in_flight = {}
+        # Book ids the endpoint has no author for, they are not requested
+        # again by this process
+        self.unknown = set()
+        self._lock = threading.Lock()
+
+    def resolve(self, book_id: int) -> str:
+        """
+        Function to get the author of a book
+        Args:
+            book_id: id of the book
+        Returns:
+            author, None if it could not be resolved
+        """
+        return self.resolve_many([book_id])[book_id]
+
+    def resolve_many(self, book_ids: list) -> dict:
+        """
+        Function to get the authors of the books, the book ids missing in
+        the cache and not known to have no author are fetched concurrently
+        Args:
+            book_ids: list of book ids, can have duplicates
+        Returns:
+            authors: map of book id and author, None if it could not be resolved
+            Ex: {48: "Mark Manson", 0: "Dan Harris"}
+        """
+        authors = {}
+        futures = {}
+        for book_id in book_ids:
+            if book_id in authors or book_id in futures:
+                continue
+            author = self.cache.get(str(book_id))
+            if author or book_id in self.unknown:
+                authors[book_id] = author
+            else:
+                futures[book_id] = self._submit(book_id)
+        if futures:
+            if self.logger:
+                self.logger.debug("Fetching the authors of %d books", len(futures))
+            wait(futures.values())
+            for book_id, future in futures.items():
+                authors[book_id] = future.result()
+        return authors
+
+    def after_fork(self):
+        """
+        Function to be called in a forked child process, the worker threads
+        and the connections of the parent process are not shared with it
+        """
+        self.session = self._create_session()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                            thread_name_prefix="author-resolver")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Function to stop the workers and close the http connections
+        """
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def _create_session(self):
+        """
+        Function to create the http session, connections are reused across
+        the requests, one per worker
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _submit(self, book_id: int):
+        """
+        Function to get the future of the lookup for the book id, a running
+        lookup of the same book id is reused
+        """
+        book_id_str = str(book_id)
+        with self._lock:
+            future = self._in_flight.get(book_id_str)
+            if future is None:
+                future = self._executor.submit(self._fetch, book_id)
+                self._in_flight[book_id_str] = future
+                future.add_done_callback(
+                    lambda _: self._remove_in_flight(book_id_str))
+            return future
+
+    def _remove_in_flight(self, book_id_str: str):
+        with self._lock:
+            self._in_flight.pop(book_id_str, None)
+
+    def _fetch(self, book_id: int) -> str:
+        """
+        Function to request the author of the book from the endpoint,
+        connection errors, timeouts and server errors are retried with
+        exponential backoff
+        Returns:
+            author, None if it could not be resolved
+        """
+        req_body = json.dumps({"book_id": book_id})
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                resp = self.session.post(self.endpoint, data=req_body,
+                                         timeout=self.timeout)
+            except requests.RequestException as err:
+                self._log_error(book_id, attempt, err)
+                continue
+            if resp.status_code >= 500:
+                self._log_error(book_id, attempt, "HTTP %d" % resp.status_code)
+                continue
+            try:
+                author = resp.json().get("author", None) if resp.ok else None
+            except ValueError as err:
+                self._log_error(book_id, attempt, err)
+                return None
+            if author:
+                self.cache[str(book_id)] = author
+            else:
+                self.unknown.add(book_id)
+            return author
+        return None
+
+    def _log_error(self, book_id: int, attempt: int, err):
+        if self.logger:
+            self.logger.error("Error while getting the author of book: %s, "
+                              "attempt: %d, Error: %s", book_id, attempt + 1, err)
+
+
+class AuthorTable:
+    """
+    Class which holds the authors of all the books in a list indexed by
+    the book id, book ids are the ids of the summaries
+    Ex:
+      ["Dan Harris", "Grant Cardone", None, ...]
+    """
+
+    def __init__(self, resolver: AuthorResolver, file_path: str, logger=None,
+                 max_size: int=2 ** 22):
+        self.resolver = resolver
+        self.file_path = file_path
+        self.logger = logger
+        # Book ids are from 0 to less than max_size, the table is not
+        # extended for the larger ids
+        self.max_size = max_size
+        self._table = []
+        self._book_ids = []
+        # Book ids added after the warm up, resolved by the next refresh
+        self._new_book_ids = set()
+        # No of authors found and missing in the table by attach
+        self.hits = 0
+        self.misses = 0
+        # No of changes to the table and the no of changes persisted
+        self._version = 0
+        self._persisted_version = 0
+        self._stop_refresh = threading.Event()
+        self._refresh_thread = None
+
+    def warm_up(self, book_ids: list):
+        """
+        Function to fill the table with the authors of the books from the
+        resolver cache and the author endpoint, blocks until all of them are
+        resolved or failed
+        Args:
+            book_ids: ids of all the books, ids which are not ints from 0
+            to less than max_size are skipped
+        """
+        cached = set(self.resolver.cache)
+        authors = self.resolver.resolve_many([book_id for book_id in book_ids
+                                              if self._is_table_id(book_id)])
+        table = [None] * (max(authors, default=-1) + 1)
+        for book_id, author in authors.items():
+            table[book_id] = author
+            if author and str(book_id) not in cached:
+                self._version += 1
+        self._table = table
+        self._book_ids = list(authors)
+        missing = sum(1 for author in authors.values() if author is None)
+        if self.logger:
+            self.logger.info("Author table is loaded for %d books, missing: %d",
+                             len(book_ids), missing)
+
+    def attach(self, summaries: list, resolve_missing: bool=False):
+        """
+        Function to set the author of each summary from the table, authors
+        missing in the table are set to None. Books added after the warm up
+        are added to the table by the next refresh, ids which are not ints
+        from 0 to less than max_size are never added.
+        Args:
+            summaries: list of summaries having the book id in "id"
+            resolve_missing: if True the authors missing in the table are
+            resolved from the author endpoint before returning, else they
+            are left to the next refresh
+        """
+        table = self._table
+        size = len(table)
+        missing = []
+        for summary in summaries:
+            book_id = summary["id"]
+            if type(book_id) is int and 0 <= book_id < size:
+                summary["author"] = table[book_id]
+                if summary["author"] is None:
+                    missing.append(summary)
+            else:
+                summary["author"] = None
+                missing.append(summary)
+                if self._is_table_id(book_id):
+                    self._new_book_ids.add(book_id)
+        # Counters are not locked, a lost update only skews the hit ratio
+        self.hits += len(summaries) - len(missing)
+        self.misses += len(missing)
+        missing = [summary for summary in missing if is_book_id(summary["id"])]
+        if not resolve_missing or not missing:
+            return
+        authors = self.resolver.resolve_many([summary["id"] for summary in missing])
+        for summary in missing:
+            book_id = summary["id"]
+            summary["author"] = authors[book_id]
+            # Books added after the warm up are in the resolver cache for
+            # the refresh adding them to the table
+            if summary["author"] and book_id < size and table[book_id] is None:
+                table[book_id] = summary["author"]
+                self._version += 1
+
+    def refresh(self):
+        """
+        Function to retry the authors missing in the table and persist the
+        table if it has changed
+        """
+        if self._new_book_ids:
+            self._add_books()
+        table = self._table
+        unknown = self.resolver.unknown
+        # Books the endpoint has no author for are not polled again
+        missing = [book_id for book_id in self._book_ids
+                   if table[book_id] is None and book_id not in unknown]
+        if missing:
+            for book_id, author in self.resolver.resolve_many(missing).items():
+                if author:
+                    table[book_id] = author
+                    self._version += 1
+        self.persist()
+
+    def _add_books(self):
+        """
+        Function to extend the table with the books added after the warm up,
+        the table is replaced so that the requests keep reading a whole table
+        """
+        new_book_ids = set(self._new_book_ids)
+        self._new_book_ids -= new_book_ids
+        new_book_ids = [book_id for book_id in new_book_ids if book_id >= len(self._table)]
+        if not new_book_ids:
+            return
+        self._table = self._table + [None] * (max(new_book_ids) + 1 - len(self._table))
+        self._book_ids.extend(new_book_ids)
+
+    def persist(self):
+        """
+        Function to merge the table into the json file if it has changed
+        since it was last persisted, the authors written by the other
+        processes are kept
+        """
+        version = self._version
+        if version == self._persisted_version:
+            return
+        authors = dict((str(book_id), author) for book_id, author in enumerate(self._table)
+                       if author)
+        _, err, trace = update_json(self.file_path, lambda data: {**data, **authors})
+        if err:
+            if self.logger:
+                self.logger.error("Error dumping the author table into file: %s, "
+                                  "Error: %s, Trace: %s", self.file_path, err, trace)
+            return
+        self._persisted_version = version
+
+    def _is_table_id(self, book_id) -> bool:
+        return is_book_id(book_id) and book_id < self.max_size
+
+    def start_refresh(self, interval: float):
+        """
+        Function to start the background thread refreshing the table
+        every interval seconds
+        """
+        self._stop_refresh.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop,
+                                                args=(interval,),
+                                                name="author-table-refresh",
+                                                daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self):
+        """
+        Function to stop the background refresh and persist the last changes
+        """
+        self._stop_refresh.set()
+        if self._refresh_thread:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+        self.persist()
+
+    def _refresh_loop(self, interval: float):
+        while not self._stop_refresh.wait(interval):
+            try:
+                self.refresh()
+            except Exception as err:
+                if self.logger:
+                    self.logger.error("Error while refreshing the author table: %s",
+                                      err)
@@ -16,4 +16,55 @@ class Config:
                                "request_cache.json")
 
     # Endpoint to get Author for book
-    AUTHOR_ENDPOINT = "https://ie4djxzt8j.execute-api.eu-west-1.amazonaws.com/coding"
\ No newline at end of file
+    AUTHOR_ENDPOINT = "https://ie4djxzt8j.execute-api.eu-west-1.amazonaws.com/coding"
+    # Max no of concurrent requests to the author endpoint
+    AUTHOR_CONCURRENCY = 8
+    # Seconds to wait for the author endpoint to respond
+    AUTHOR_TIMEOUT = 5
+    # No of retries of a failed request to the author endpoint
+    AUTHOR_RETRIES = 2
+    # Seconds between the retries of the missing authors and the
+    # persistence of the author table
+    AUTHOR_REFRESH_INTERVAL = 60
+
+    # No of worker processes of each server process searching the large
+    # batches of queries in parallel, 0 searches them in the server process
+    SEARCH_PROCESSES = 0
+    # Min no of unique queries in a batch to search it on the worker processes
+    SEARCH_PARALLEL_MIN_BATCH = 64
+    # No of shards of the summaries, each searched by its own worker process
+    # of each server process, the queries are searched on all the shards and
+    # their top summaries are merged. 0 searches the whole index in the
+    # server process. The summaries cannot be changed at runtime when the
+    # search is sharded.
+    SEARCH_SHARDS = 0
+    # No of queries searched together in the streaming mode before their
+    # lines are sent
+    STREAM_CHUNK_SIZE = 32
+    # No of queries of a request searched together by the request pipeline,
+    # the authors of a chunk are resolved while the next chunk is searched.
+    # Chunks smaller than SEARCH_PARALLEL_MIN_BATCH are not searched on the
+    # worker processes.
+    PIPELINE_CHUNK_SIZE = 128
+    # Max no of chunks of a request searched ahead of their authors
+    PIPELINE_QUEUE_SIZE = 4
+    # Resolve the authors missing in the author table while serving the
+    # requests, the requests then wait for the author endpoint. False
+    # returns them as None until the background refresh resolves them, the
+    # request pipeline is not started then as the authors are attached in
+    # memory
+    RESOLVE_MISSING_AUTHORS = False
+    # Ids of the summaries added or deleted at runtime are from 0 to less
+    # than this, the author table has a slot for each id up to the largest
+    MAX_SUMMARY_ID = 2 ** 22
+
+    # Profile the search requests sending the X-Profile header or the
+    # profile param, "pstats" or "collapsed", instead of searching them
+    PROFILING_ENABLED = False
+    # Seconds between the samples of the stacks of all the server threads,
+    # None to not sample
+    PROFILE_SAMPLE_INTERVAL = None
+    # Seconds between the writes of the sampled stacks to the profile directory
+    PROFILE_DUMP_INTERVAL = 300
+    # Directory of the collapsed stack files of the sampler
+    PROFILE_DIR = path.join(path.dirname(path.dirname(__file__)), "profiles")
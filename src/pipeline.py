@@ -0,0 +1,202 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to serve the queries of a request as a pipeline of
+# two stages running on an asyncio event loop: the search stage scores the
+# queries in chunks on an executor, and the author stage resolves the
+# authors of each chunk on another executor as soon as it is searched. So
+# the authors of a chunk are resolved while the next chunk is scored, and
+# a request takes about the longer of the two stages instead of their sum.
+# The chunks searched ahead of the author stage wait in a bounded queue,
+# the search stage waits when it is full. A chunk is handed to the caller
+# only after the caller has taken the previous one, so a slow reader of
+# the results stops both the stages. The event loop runs in its own
+# thread, so the request threads of the server use the pipeline as a
+# blocking call or a blocking iterator.
+#
+# Sample Usage
+# pipeline = RequestPipeline(search_many, resolve_authors, queue_size=4,
+#                            logger=logger)
+# pipeline.start()
+# pipeline.search(queries, summary_limit, chunk_size=128)
+# [[{...}, {...}], [...]]
+# for start, results in pipeline.stream(queries, summary_limit, chunk_size=32):
+#     ...
+# pipeline.shutdown()
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Marks the end of the chunks of a request
+_DONE = object()
+# Max no of chunks with their authors waiting to be taken by the caller
+OUTPUT_CHUNKS = 1
+
+
+class RequestPipeline:
+    """
+    Class which searches the queries of the requests in chunks and resolves
+    the authors of each chunk while the next chunks are searched
+    search_many: function of (queries, summary_limit) returning the list
+    of results of each query
+    resolve_authors: function setting the authors of the list of results
+    of each query in place
+    """
+
+    def __init__(self, search_many, resolve_authors, queue_size: int=4,
+                 workers: int=None, logger=None):
+        """
+        Args:
+            search_many: function searching a chunk of queries
+            resolve_authors: function resolving the authors of a chunk
+            queue_size: max no of chunks of a request searched ahead of the
+            author stage
+            workers: no of threads of each stage, shared by the requests
+            logger: logger object
+        """
+        self.search_many = search_many
+        self.resolve_authors = resolve_authors
+        self.queue_size = queue_size
+        self.workers = workers
+        self.logger = logger
+        self._loop = None
+        self._thread = None
+        self._search_executor = None
+        self._author_executor = None
+
+    def start(self):
+        """
+        Function to start the event loop thread and the executors of the
+        stages, requests are served stage by stage in the calling thread
+        until it is started
+        """
+        self._search_executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix="pipeline-search")
+        self._author_executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix="pipeline-author")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name="request-pipeline", daemon=True)
+        self._thread.start()
+        if self.logger:
+            self.logger.info("Request pipeline is started")
+
+    @property
+    def running(self) -> bool:
+        """
+        True if the stages of the requests run on the event loop thread
+        """
+        return self._loop is not None
+
+    def shutdown(self):
+        """
+        Function to stop the event loop thread and the executors
+        """
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._search_executor.shutdown()
+        self._author_executor.shutdown()
+        self._loop = None
+        self._thread = None
+
+    def search(self, queries: list, summary_limit: int, chunk_size: int,
+               inline: bool=False) -> list:
+        """
+        Function to get the results of the queries with their authors
+        Args:
+            queries: list of queries
+            summary_limit: no of summaries to return for each query
+            chunk_size: no of queries searched together
+            inline: if True the stages are run one after the other in the
+            calling thread, so that the request can be profiled
+        Returns:
+            list of results of each query, as returned by search_many
+        """
+        results = []
+        for _, chunk_results in self.stream(queries, summary_limit, chunk_size, inline):
+            results.extend(chunk_results)
+        return results
+
+    def stream(self, queries: list, summary_limit: int, chunk_size: int,
+               inline: bool=False):
+        """
+        Generator of the results of the chunks of queries with their authors
+        in the order of the queries, a chunk is yielded as soon as its
+        authors are resolved
+        Args:
+            queries: list of queries
+            summary_limit: no of summaries to return for each query
+            chunk_size: no of queries searched together
+            inline: if True the stages are run one after the other in the
+            calling thread
+        Yields:
+            (index of the first query of the chunk, results of the chunk)
+        """
+        if inline or not self.running:
+            for start in range(0, len(queries), chunk_size):
+                results = self.search_many(queries[start:start + chunk_size], summary_limit)
+                self.resolve_authors(results)
+                yield start, results
+            return
+        # Chunks are handed over from the event loop without blocking it,
+        # the author stage waits for a credit given back by every chunk taken
+        output = queue.Queue()
+        credits = asyncio.Semaphore(OUTPUT_CHUNKS)
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(queries, summary_limit, chunk_size, output.put, credits), self._loop)
+        future.add_done_callback(lambda _: output.put(_DONE))
+        try:
+            while True:
+                item = output.get()
+                if item is _DONE:
+                    break
+                self._loop.call_soon_threadsafe(credits.release)
+                yield item
+            future.result()
+        finally:
+            # Stages of an abandoned stream are stopped
+            future.cancel()
+
+    async def _run(self, queries: list, summary_limit: int, chunk_size: int, emit,
+                   credits: asyncio.Semaphore):
+        """
+        Function to run the search stage and the author stage of a request
+        concurrently, the chunks are passed in their order. A chunk is
+        emitted only when a credit is available.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=self.queue_size)
+
+        async def search_chunks():
+            try:
+                for start in range(0, len(queries), chunk_size):
+                    results = await loop.run_in_executor(
+                        self._search_executor, self.search_many,
+                        queries[start:start + chunk_size], summary_limit)
+                    await chunks.put((start, results))
+            except Exception as err:
+                await chunks.put(err)
+                return
+            await chunks.put(_DONE)
+
+        search_task = loop.create_task(search_chunks())
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                await loop.run_in_executor(self._author_executor,
+                                           self.resolve_authors, item[1])
+                await credits.acquire()
+                emit(item)
+        finally:
+            search_task.cancel()
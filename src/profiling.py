@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to profile the server in place. A single request
+# can be profiled with cProfile, giving the pstats summary, or sampled,
+# giving the collapsed stacks which are read by the flame graph tools.
+# The stack sampler can also run over all the threads of the server at a
+# low rate, writing the aggregated collapsed stacks to a file on a
+# schedule.
+#
+# Sample Usage
+# text = profile_call("pstats", handler, request_data)
+# text = profile_call("collapsed", handler, request_data)
+# sampler = StackSampler(interval=0.05)
+# sampler.start(dump_dir="C:/Dev/profiles", dump_interval=300)
+# sampler.stop()
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from os import path
+
+PSTATS_FORMAT = "pstats"
+COLLAPSED_FORMAT = "collapsed"
+PROFILE_FORMATS = (PSTATS_FORMAT, COLLAPSED_FORMAT)
+# No of functions in the pstats summary
+PSTATS_LIMIT = 40
+# Seconds between the samples of a profiled request
+REQUEST_SAMPLE_INTERVAL = 0.001
+
+
+def profile_call(profile_format: str, func, *args) -> str:
+    """
+    Function to call the function with the profiler and get its profile
+    Args:
+        profile_format: "pstats" or "collapsed"
+        func: function to be profiled, it is called in this thread
+        args: arguments of the function
+    Returns:
+        pstats summary sorted by the cumulative time or the collapsed stacks
+    """
+    if profile_format == COLLAPSED_FORMAT:
+        sampler = StackSampler(REQUEST_SAMPLE_INTERVAL,
+                               thread_ids=[threading.get_ident()])
+        sampler.start()
+        try:
+            func(*args)
+        finally:
+            sampler.stop()
+        return sampler.collapsed()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        func(*args)
+    finally:
+        profiler.disable()
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PSTATS_LIMIT)
+    return output.getvalue()
+
+
+class StackSampler:
+    """
+    Class which samples the stacks of the threads at an interval and counts
+    the collapsed stacks
+    Ex:
+      {"server.py:get_matching_summaries;search_summary.py:search_many": 12}
+    """
+
+    def __init__(self, interval: float, thread_ids: list=None, logger=None):
+        self.interval = interval
+        # Threads to be sampled, all but the sampler if None
+        self.thread_ids = thread_ids
+        self.logger = logger
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, dump_dir: str=None, dump_interval: float=None):
+        """
+        Function to start sampling in a background thread
+        Args:
+            dump_dir: directory to which the stacks are written
+            dump_interval: seconds between the writes of the stacks
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop,
+                                        args=(dump_dir, dump_interval),
+                                        name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Function to stop sampling
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def sample(self):
+        """
+        Function to take one sample of the stacks of the threads
+        """
+        sampler_id = threading.get_ident()
+        frames = sys._current_frames()
+        thread_ids = self.thread_ids if self.thread_ids is not None else list(frames)
+        samples = []
+        for thread_id in thread_ids:
+            frame = frames.get(thread_id)
+            if frame is None or thread_id == sampler_id:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append("%s:%s" % (path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            samples.append(";".join(reversed(names)))
+        with self._lock:
+            self.stacks.update(samples)
+
+    def collapsed(self) -> str:
+        """
+        Function to get the counted stacks in the collapsed format, one
+        stack and its count in a line
+        """
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return "".join("%s %d\n" % (stack, count) for stack, count in items)
+
+    def dump(self, dump_dir: str) -> str:
+        """
+        Function to write the collapsed stacks to a file of the process in
+        the directory and start counting again
+        Returns:
+            file path, None if there are no stacks
+        """
+        text = self.collapsed()
+        with self._lock:
+            self.stacks.clear()
+        if not text:
+            return None
+        file_path = path.join(dump_dir, "profile-%d-%s.collapsed"
+                              % (os.getpid(), time.strftime("%Y%m%d-%H%M%S")))
+        try:
+            os.makedirs(dump_dir, exist_ok=True)
+            with open(file_path, "w", encoding="utf-8") as fp:
+                fp.write(text)
+        except OSError as err:
+            if self.logger:
+                self.logger.error("Error writing the profile: %s, Error: %s",
+                                  file_path, err)
+            return None
+        return file_path
+
+    def _sample_loop(self, dump_dir: str, dump_interval: float):
+        next_dump = time.monotonic() + dump_interval if dump_dir else None
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if next_dump is not None and time.monotonic() >= next_dump:
+                self.dump(dump_dir)
+                next_dump = time.monotonic() + dump_interval
+        if dump_dir:
+            self.dump(dump_dir)
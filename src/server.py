@@ -12,38 +12,210 @@
 #    "K": 5
 # }
 # requests.post("http://127.0.0.1:8080/api/v1/get-matching-summaries", data=json.dumps(data))
+# Queries can have quoted phrases and proximities of two words:
+# data = {
+#    "queries": ['"a gift" problems', "capitalism NEAR/3 selection"],
+#    "K": 5
+# }
+# To stream one json line per query with only the ids and authors:
+# data = {
+#    "queries": ["a is gift", "capitalism of selection "],
+#    "K": 5,
+#    "stream": true,
+#    "fields": ["id", "author"]
+# }
 # 
 # To test the server status Use:
 # request.get("http://127.0.0.1:8080/ping")
+# To get the metrics of the server process in the prometheus text format:
+# requests.get("http://127.0.0.1:8080/metrics")
+# To profile a search request when PROFILING_ENABLED is set in the config,
+# the pstats summary or the collapsed stacks are returned instead of the
+# results:
+# requests.post("http://127.0.0.1:8080/api/v1/get-matching-summaries",
+#               data=json.dumps(data), headers={"X-Profile": "pstats"})
+# requests.post("http://127.0.0.1:8080/api/v1/get-matching-summaries?profile=collapsed",
+#               data=json.dumps(data))
+# To add or update summaries and to delete summaries:
+# requests.post("http://127.0.0.1:8080/api/v1/summaries",
+#               data=json.dumps({"summaries": [{"id": 60, "summary": "....."}]}))
+# requests.delete("http://127.0.0.1:8080/api/v1/summaries", data=json.dumps({"ids": [12]}))
 # To run the server:
 # python src/server.py
+# To run the server in production mode with 4 worker processes having
+# 8 threads each (needs gunicorn):
+# python src/server.py --workers 4 --threads 8
 
 import argparse
+import atexit
+import gc
 import json
-from multiprocessing import cpu_count, Pool
+import time
 
-import requests
-from flask import Flask, request
+from flask import Flask, Response, g, request, stream_with_context
 
+from search.executor import QueryExecutor
 from search.search_summary import Search
+from search.shards import ShardedSearch, load_summary_ids, prepare_corpus
+from src.authors import AuthorResolver, AuthorTable, is_book_id
 from src.config import Config
-from utilities.json_parser import dump_json, load_json
+from src.pipeline import RequestPipeline
+from src.profiling import PROFILE_FORMATS, StackSampler, profile_call
+from utilities.json_parser import load_json
 from utilities.logger import create_logger
+from utilities.metrics import (Counter, Gauge, Histogram, add_collector, render_metrics,
+                               stage_timer)
+
+try:
+    from src.wsgi import SearchApplication
+except ImportError:
+    SearchApplication = None
 
 app = Flask(__name__)
 
+# Response header having the version of the summaries searched
+CORPUS_VERSION_HEADER = "X-Corpus-Version"
+
+# Request header and query param selecting the profile of a request
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAM = "profile"
+
+# Fields of a book which can be selected in the response
+BOOK_FIELDS = ("author", "id", "query", "summary")
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds",
+                            "Time taken to serve the requests by endpoint.")
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight",
+                           "No of requests being served by this process.")
+AUTHOR_LOOKUPS = Counter("author_table_lookups_total",
+                         "Lookups of the author table by result.")
+AUTHOR_HIT_RATIO = Gauge("author_table_hit_ratio",
+                         "Ratio of the author table lookups which found the author.")
+
 logger = None
 
 # json cache for http author requests
 request_cache = None
 
-def start_server():
+# Resolver fetching the authors missing in request_cache
+author_resolver = None
+
+# Authors of all the books, resolved before the server starts
+author_table = None
+
+# Executor searching the large batches of queries on worker processes,
+# or the sharded search if the summaries are sharded
+query_executor = None
+
+# Sampler writing the stacks of the server threads to the profile directory
+stack_sampler = None
+
+def warm_up():
     """
-    Function used to start the http server using Flask
+    Function to load the search data and resolve the authors of all the
+    books before the server starts, missing authors are retried and the
+    table is persisted in the background
     """
-    app.run(host = Config.HOSTNAME, port = Config.PORT)
-    logger.info('Http Server is running at http://%s:%s' 
-                % (Config.HOSTNAME, Config.PORT))
+    global author_table
+    if Config.SEARCH_SHARDS:
+        # Summaries are indexed by the shard processes from the corpus file
+        prepare_corpus(logger)
+        book_ids = load_summary_ids(logger)
+    else:
+        Search.load(logger)
+        book_ids = Search.get_summary_ids()
+    author_table = AuthorTable(author_resolver, Config.DATA_FILE_PATH, logger,
+                               Config.MAX_SUMMARY_ID)
+    author_table.warm_up(book_ids)
+    atexit.register(author_table.stop_refresh)
+
+def start_server(workers=0, threads=1, log_level="info"):
+    """
+    Function used to start the http server using Flask, or gunicorn with
+    the given no of worker processes and threads per worker in production
+    mode
+    Args:
+      workers: no of worker processes, 0 runs the Flask development server
+      threads: no of threads per worker process
+      log_level: gunicorn log level
+    """
+    logger.info('Http Server is running at http://%s:%s',
+                Config.HOSTNAME, Config.PORT)
+    if workers:
+        if SearchApplication:
+            # Objects loaded by warm up are never collected, freezing them
+            # keeps the workers from touching and copying their pages
+            gc.freeze()
+            SearchApplication(app, "%s:%s" % (Config.HOSTNAME, Config.PORT),
+                              workers, threads, post_fork=_after_fork,
+                              log_level=log_level).run()
+            return
+        logger.warning("gunicorn is not installed, running the Flask "
+                       "development server")
+    _start_background_tasks()
+    app.run(host = Config.HOSTNAME, port = Config.PORT, threaded=True)
+
+def _after_fork():
+    """
+    Function called in each worker process after it is forked, threads of
+    the master process are not running in the worker so they are started
+    again
+    """
+    author_resolver.after_fork()
+    _start_background_tasks()
+
+def _collect_metrics():
+    """
+    Function to set the author table metrics of this process
+    """
+    if author_table is None:
+        return
+    hits, misses = author_table.hits, author_table.misses
+    AUTHOR_LOOKUPS.set(hits, result="hit")
+    AUTHOR_LOOKUPS.set(misses, result="miss")
+    AUTHOR_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0.0)
+
+add_collector(_collect_metrics)
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.teardown_request
+def _observe_request_latency(exc=None):
+    # Called after the streamed responses are sent
+    if "request_start" not in g:
+        return
+    REQUESTS_IN_FLIGHT.dec()
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_start,
+                            endpoint=request.endpoint or "unknown")
+
+def _start_background_tasks():
+    """
+    Function to start the threads and processes used by the server process
+    """
+    global query_executor, stack_sampler
+    author_table.start_refresh(Config.AUTHOR_REFRESH_INTERVAL)
+    if Config.SEARCH_SHARDS:
+        query_executor = ShardedSearch(Config.SEARCH_SHARDS, logger)
+    else:
+        query_executor = QueryExecutor(Config.SEARCH_PROCESSES,
+                                       Config.SEARCH_PARALLEL_MIN_BATCH, logger)
+    query_executor.start()
+    atexit.register(query_executor.shutdown)
+    request_pipeline.logger = logger
+    # Authors of the table are attached in memory, the pipeline only adds
+    # hops between the threads unless the author stage waits for the author
+    # endpoint
+    if Config.RESOLVE_MISSING_AUTHORS:
+        request_pipeline.start()
+        atexit.register(request_pipeline.shutdown)
+    if Config.PROFILE_SAMPLE_INTERVAL:
+        stack_sampler = StackSampler(Config.PROFILE_SAMPLE_INTERVAL, logger=logger)
+        stack_sampler.start(Config.PROFILE_DIR, Config.PROFILE_DUMP_INTERVAL)
+        atexit.register(stack_sampler.stop)
+        logger.info("Stack sampler is writing the profiles to: %s", Config.PROFILE_DIR)
 
 @app.route('/ping', methods=['GET'])
 def ping():
@@ -53,6 +225,14 @@ def ping():
     res = {"status": "success"}
     return res
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Function to get the metrics of this server process in the prometheus
+    text format
+    """
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route('/api/v1/get-matching-summaries', methods=['POST'])
 def get_matching_summaries():
     """
@@ -60,8 +240,14 @@ def get_matching_summaries():
     search results
     Make http post request to the server with post data of the format:
     data = {
+      # Queries can have quoted phrases, "a gift", and proximities of two
+      # words, capitalism NEAR/3 selection
       "queries": ["a is gift", "capitalism of selection"],
-      "K": 2
+      "K": 2,
+      # Optional, send one json line per query as soon as it is resolved
+      "stream": false,
+      # Optional, fields of the books to be sent
+      "fields": ["author", "id", "query", "summary"]
     }
     Returns:
       {
@@ -87,17 +273,156 @@ def get_matching_summaries():
           ]
         ]
       }
+      In the streaming mode one json line per query:
+      {"index": 0, "query": "a is gift", "books": [{...}, {...}]}
+      In the profiling mode the profile of the request as text
     """
     request_data = json.loads(request.data)
+    if Config.PROFILING_ENABLED:
+        profile_format = (request.headers.get(PROFILE_HEADER)
+                          or request.args.get(PROFILE_PARAM))
+        if profile_format:
+            if profile_format not in PROFILE_FORMATS:
+                return {"status": "failure",
+                        "error": "profile must be one of: %s" % ", ".join(PROFILE_FORMATS)}, 400
+            # Profiler sees only this thread, so the request is not pipelined
+            g.profiling = True
+            profile = profile_call(profile_format, _send_search_response, request_data)
+            return Response(profile, mimetype="text/plain")
+    return _get_search_response(request_data)
+
+def _send_search_response(request_data):
+    """
+    Function to build the search response and generate its whole body, so
+    that the streamed responses are profiled till the end
+    """
+    response = _get_search_response(request_data)
+    if isinstance(response, Response):
+        response.get_data()
+
+def _get_search_response(request_data):
+    """
+    Function to get the response of get_matching_summaries for the request
+    data
+    """
     queries = request_data.get("queries", [])
     summary_limit = request_data.get("K", 0)
-    logger.info("Recieved request for query-set: %s and no of summaries to retrieve "
-                "based on the order of relevance is: %d" % (queries, summary_limit))
+    fields = request_data.get("fields")
+    if fields is not None and (not isinstance(fields, list)
+                               or not all(field in BOOK_FIELDS for field in fields)):
+        return {"status": "failure",
+                "error": "fields must be a list of: %s" % ", ".join(BOOK_FIELDS)}, 400
+    headers = {CORPUS_VERSION_HEADER: str(Search.CORPUS_VERSION)}
+    logger.info("Recieved request for %d queries, no of summaries to retrieve "
+                "based on the order of relevance is: %d, stream: %s",
+                len(queries), summary_limit, bool(request_data.get("stream")))
+    if request_data.get("stream"):
+        lines = _stream_matching_summaries(queries, summary_limit, fields)
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson",
+                        headers=headers)
     # Get the output result
     output_res = get_matching_summaries_with_author(queries, summary_limit)
-    # Update cache the author and book_id map
-    _update_cache(request_cache)
-    return {"books": output_res}
+    if fields is not None:
+        output_res = [_select_fields(summaries, fields) for summaries in output_res]
+    with stage_timer("serialize"):
+        body = json.dumps({"books": output_res})
+    # Clients can compare the version to detect the results of an older corpus
+    return Response(body, mimetype="application/json", headers=headers)
+
+def _stream_matching_summaries(queries, summary_limit, fields=None):
+    """
+    Generator of the response lines of the streaming mode, queries are
+    searched in chunks and each query is sent as soon as the authors of its
+    chunk are resolved, so the whole response is never held in memory
+    Args:
+      queries: list of queries
+      summary_limit: no of summaries to return based on the relevance
+      fields: fields of the books to be sent, all the fields if None
+    Yields:
+      one json line per query in the order of the queries
+      {"index": 0, "query": "a is gift", "books": [{...}, {...}]}
+    """
+    for start, chunk_summaries in request_pipeline.stream(
+            queries, summary_limit, Config.STREAM_CHUNK_SIZE,
+            inline=g.get("profiling", False)):
+        chunk = queries[start:start + len(chunk_summaries)]
+        for index, (query, summaries) in enumerate(zip(chunk, chunk_summaries), start):
+            if fields is not None:
+                summaries = _select_fields(summaries, fields)
+            with stage_timer("serialize"):
+                line = json.dumps({"index": index, "query": query, "books": summaries},
+                                  separators=(",", ":")) + "\n"
+            yield line
+
+def _select_fields(summaries, fields):
+    """
+    Function to keep only the selected fields of the books
+    Args:
+      summaries: list of books of a query
+      fields: list of fields to keep
+    Returns:
+      Ex: [{"id": 48, "author": "Mark Manson"}, {...}]
+    """
+    return [dict((field, summary[field]) for field in fields if field in summary)
+            for summary in summaries]
+
+@app.route('/api/v1/summaries', methods=['POST'])
+def update_summaries():
+    """
+    Function to add the summaries with new ids and replace the summaries
+    with existing ids, the change is applied by all the server processes
+    Make http post request to the server with post data of the format:
+    data = {
+      "summaries": [{"id": 60, "summary": "....."}]
+    }
+    Returns:
+      {"status": "success", "corpus_version": 1}
+    """
+    if Config.SEARCH_SHARDS:
+        return _sharded_change_response()
+    summaries = json.loads(request.data).get("summaries")
+    if not isinstance(summaries, list) or not all(
+            isinstance(summary, dict) and _is_summary_id(summary.get("id"))
+            and isinstance(summary.get(Search.SUMMARY_KEY), str)
+            for summary in summaries):
+        return {"status": "failure",
+                "error": "summaries must be a list of {\"id\": int, \"summary\": str}"
+                         " with ids from 0 to %d" % (Config.MAX_SUMMARY_ID - 1)}, 400
+    version = Search.update_summaries(summaries, logger)
+    logger.info("Updated %d summaries, corpus version: %d", len(summaries), version)
+    return {"status": "success", "corpus_version": version}
+
+@app.route('/api/v1/summaries', methods=['DELETE'])
+def delete_summaries():
+    """
+    Function to delete the summaries of the ids, the change is applied by
+    all the server processes
+    Make http delete request to the server with data of the format:
+    data = {
+      "ids": [12, 25]
+    }
+    Returns:
+      {"status": "success", "corpus_version": 2}
+    """
+    if Config.SEARCH_SHARDS:
+        return _sharded_change_response()
+    ids = json.loads(request.data).get("ids")
+    if not isinstance(ids, list) or not all(_is_summary_id(book_id) for book_id in ids):
+        return {"status": "failure",
+                "error": "ids must be a list of int from 0 to %d"
+                         % (Config.MAX_SUMMARY_ID - 1)}, 400
+    version = Search.delete_summaries(ids, logger)
+    logger.info("Deleted %d summaries, corpus version: %d", len(ids), version)
+    return {"status": "success", "corpus_version": version}
+
+def _is_summary_id(value):
+    # Bools are ints in python, ids of the json true and false are rejected
+    return is_book_id(value) and value < Config.MAX_SUMMARY_ID
+
+def _sharded_change_response():
+    # Shards are loaded from the input data at startup
+    return {"status": "failure",
+            "error": "summaries cannot be changed when the search is sharded"}, 409
 
 def get_matching_summaries_with_author(queries, summary_limit):
     """
@@ -130,26 +455,24 @@ def get_matching_summaries_with_author(queries, summary_limit):
           ]
         ]
     """
-    # Get the summaries for all the queries
-    summaries = _get_matching_summaries_for_queries(queries, summary_limit)
-    #summaries = _multiprocess_requests(queries, summary_limit)
-    # Get summaries with author info for each summary
-    summaries_with_author = _get_author_and_summary_res(summaries)
-    logger.info("Matching summaries with author info: %s." 
-                % summaries_with_author)
+    # Get the summaries for all the queries in chunks, the authors of each
+    # chunk are resolved while the next chunk is searched. Without the
+    # pipeline all the queries are searched together in the request thread
+    chunk_size = Config.PIPELINE_CHUNK_SIZE
+    if not request_pipeline.running:
+        chunk_size = max(len(queries), 1)
+    summaries_with_author = request_pipeline.search(queries, summary_limit, chunk_size,
+                                                    inline=g.get("profiling", False))
+    # Summaries are not logged as the payload can be large
+    logger.info("Matching summaries with author info for %d queries.",
+                len(summaries_with_author))
     return summaries_with_author
 
-def _update_cache(data):
-    """
-    Function which updates the author book map of request cache json
-    """
-    dump_json(Config.DATA_FILE_PATH, data)
-
 def _get_matching_summaries_for_queries(queries, summary_limit):
     """
     Function which accepts the list of queries and no of summaries to return
-    and get the the relevant summaries for individual queries from the search
-    engine utility.
+    and get the the relevant summaries for all the queries at once from the
+    search engine utility.
     Args:
       queries: list of queries
       summary_limit: no of summaries to return based on the relevance
@@ -175,12 +498,12 @@ def _get_matching_summaries_for_queries(queries, summary_limit):
           ]
         ]
     """
-    results = []
-    for query in queries:
-        # getting list of summaries for individual query
-        query_summaries = _make_search_summary_requests(query, summary_limit)
-        results.append(query_summaries)
-    return results
+    # Repeated queries are searched once and all the queries are scored
+    # together, large batches are split across the executor processes or
+    # searched on all the shards
+    if query_executor:
+        return query_executor.search_many(queries, summary_limit, query_field="query")
+    return Search.search_many(queries, summary_limit, logger, query_field="query")
 
 def _get_author_and_summary_res(all_summaries):
     """
@@ -211,53 +534,20 @@ def _get_author_and_summary_res(all_summaries):
           ]
         ]
     """  
-    for summary_set in all_summaries:
-        for summary in summary_set:
-          summary["author"] = _get_author_for_book(summary["id"])
+    # Authors are read from the table resolved at startup, the missing ones
+    # are resolved from the author endpoint if RESOLVE_MISSING_AUTHORS is set,
+    # all at once for all the queries
+    with stage_timer("author_resolve"):
+        author_table.attach([summary for summary_set in all_summaries
+                             for summary in summary_set],
+                            Config.RESOLVE_MISSING_AUTHORS)
     return all_summaries
 
-def _make_search_summary_requests(query, summary_num):
-    """
-    This function calls the search engine module to get the relevant summaries
-
-    """
-    summaries = Search(query, summary_num, logger).get_query_search_results(query=query)
-    logger.debug("The matching summaries for the query: %s are: %s"
-                  % (query, summaries))
-    return summaries
-
-
-def _get_author_for_book(book_id):
-    """
-      This function gets the book_id and retuns the author
-      either from cache or by making request to endpoint
-    """
-    req_body = {
-      "book_id": book_id
-    }
-    logger.debug("Request URL: %s, request body: %s" 
-                % (Config.AUTHOR_ENDPOINT, req_body))
-    book_id_str = str(book_id)
-    if book_id_str in request_cache:
-        return request_cache[book_id_str]
-    resp_body = requests.post(Config.AUTHOR_ENDPOINT, data=json.dumps(req_body))
-    logger.debug("Response: %s" % resp_body)
-    author = resp_body.json().get("author", None)
-    if author:
-        request_cache[book_id_str] = author
-    return author
-
-def _multiprocess_requests(queries, summary_limit):
-    """
-    Not in use
-    Can be used for multiprocessing the requests
-    """
-    inputs_args = []
-    for query in queries:
-      inputs_args.append((query, summary_limit))
-    with Pool(cpu_count()) as p:
-      res = p.starmap(_make_search_summary_requests, inputs_args)
-    return res
+# Pipeline searching the queries of the requests and resolving their
+# authors, the stages run in the request thread unless it is started
+request_pipeline = RequestPipeline(_get_matching_summaries_for_queries,
+                                   _get_author_and_summary_res,
+                                   Config.PIPELINE_QUEUE_SIZE)
 
 if __name__ == "__main__":
     # Initialize arg parser
@@ -265,6 +555,11 @@ if __name__ == "__main__":
     arg_parser.add_argument("--debug",
                             help="run in debug mode (log at DEBUG level).",
                             action="store_true")
+    arg_parser.add_argument("--workers", type=int, default=0,
+                            help="no of worker processes to serve the requests "
+                                 "with gunicorn, 0 runs the Flask development server.")
+    arg_parser.add_argument("--threads", type=int, default=1,
+                            help="no of threads per worker process.")
     args = arg_parser.parse_args()
     # If the server is running in debug mode log level is debug else info
     log_level = "debug" if args.debug else "info"
@@ -272,4 +567,9 @@ if __name__ == "__main__":
     logger = create_logger(Config.LOG_DIR, Config.LOG_FILE, log_level)
     # Get http request cache for authors from the json cache file
     request_cache, _, _ = load_json(Config.DATA_FILE_PATH)
-    start_server()
\ No newline at end of file
+    author_resolver = AuthorResolver(Config.AUTHOR_ENDPOINT, request_cache, logger,
+                                     concurrency=Config.AUTHOR_CONCURRENCY,
+                                     timeout=Config.AUTHOR_TIMEOUT,
+                                     retries=Config.AUTHOR_RETRIES)
+    warm_up()
+    start_server(args.workers, args.threads, log_level)
\ No newline at end of file
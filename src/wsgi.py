@@ -0,0 +1,45 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to serve the flask app in production with gunicorn.
+# Requests are served by pre-forked worker processes, each having a pool
+# of threads. The app is loaded in the master process before the workers
+# are forked, so the search index and the author table built at startup
+# are shared copy-on-write by all the workers.
+#
+# Sample Usage
+# SearchApplication(app, "0.0.0.0:8080", workers=4, threads=8).run()
+# To run the server in production mode:
+# python src/server.py --workers 4 --threads 8
+
+from gunicorn.app.base import BaseApplication
+
+
+class SearchApplication(BaseApplication):
+    """
+    Class which runs the already loaded flask app with gunicorn
+    """
+
+    def __init__(self, app, bind: str, workers: int, threads: int,
+                 post_fork=None, log_level: str="info"):
+        self.application = app
+        self.options = {
+            "bind": bind,
+            "workers": workers,
+            "threads": threads,
+            # The app is loaded once in the master process
+            "preload_app": True,
+            "loglevel": log_level
+        }
+        if post_fork:
+            self.options["post_fork"] = lambda server, worker: post_fork()
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
@@ -12,7 +12,7 @@
 # python tests/api_test.py
 
 import unittest
-from json import dumps
+from json import dumps, loads
 from os import path
 
 import requests
@@ -82,6 +82,29 @@ class ValidateAPIServer(unittest.TestCase):
         if resp.status_code != 200:
             raise Exception("Server http://%s:%s is not reachable." % (SERVER_IP, PORT)) 
 
+    def test_stream_with_fields(self):
+        # Streamed lines have the same books as the json response
+        queries = ["is your problems", "achieve take book", "is your problems"]
+        url = SERVER_API_URL.format(SERVER_IP, PORT)
+        expected = _get_api_results(queries, 3)["books"]
+        data = {"queries": queries, "K": 3, "stream": True, "fields": ["id", "author"]}
+        res = requests.post(url, data=dumps(data), stream=True)
+        lines = [loads(line) for line in res.iter_lines() if line]
+        self.assertListEqual([line["query"] for line in lines], queries)
+        self.assertListEqual(
+            [line["books"] for line in lines],
+            [[{"id": book["id"], "author": book["author"]} for book in books]
+             for books in expected])
+
+    def test_phrase_queries(self):
+        # Phrase results are the results of its words having the phrase
+        books = _get_api_results(['"your problems"', "your problems", "your NEAR/1 problems"],
+                                 60)["books"]
+        self.assertListEqual([book["id"] for book in books[0]], [0, 7])
+        self.assertListEqual(books[0], [dict(book, query='"your problems"') for book in books[1]
+                                        if book["id"] in (0, 7)])
+        self.assertListEqual([book["id"] for book in books[2]], [0, 7])
+
 if __name__ == "__main__":
     io_data = _load_test_json()
     _create_cases(io_data["positive_cases"])
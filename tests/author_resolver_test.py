@@ -0,0 +1,198 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the author resolver and the author
+# table against a local stub of the author endpoint which answers the
+# authors of input json file after a delay and counts the requests it
+# receives.
+# To run the testcase
+# python tests/author_resolver_test.py
+
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+
+from src.authors import AuthorResolver, AuthorTable
+from utilities.json_parser import load_json
+
+AUTHORS = {0: "Dan Harris", 1: "Grant Cardone", 48: "Mark Manson"}
+# Seconds taken by the stub to answer a request
+DELAY = 0.2
+
+
+class StubAuthorHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        book_id = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["book_id"]
+        with server.lock:
+            server.requests.append(book_id)
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+            fail = server.failures.get(book_id, 0)
+            if fail:
+                server.failures[book_id] = fail - 1
+        time.sleep(DELAY)
+        with server.lock:
+            server.running -= 1
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = json.dumps({"author": AUTHORS.get(book_id)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ValidateAuthorResolver(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubAuthorHandler)
+        cls.server.lock = threading.Lock()
+        cls.endpoint = "http://127.0.0.1:%d/coding" % cls.server.server_address[1]
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.running = 0
+        self.server.max_running = 0
+        self.server.failures = {}
+        self.cache = {}
+        self.resolver = AuthorResolver(self.endpoint, self.cache, concurrency=2,
+                                       timeout=2, retries=2, backoff=0)
+
+    def tearDown(self):
+        self.resolver.close()
+
+    def test_unique_ids_fetched_concurrently(self):
+        authors = self.resolver.resolve_many([48, 0, 48, 1, 0])
+        self.assertDictEqual(authors, AUTHORS)
+        self.assertEqual(sorted(self.server.requests), [0, 1, 48])
+        self.assertEqual(self.server.max_running, 2)
+        self.assertDictEqual(self.cache, {"0": "Dan Harris", "1": "Grant Cardone",
+                                          "48": "Mark Manson"})
+
+    def test_cached_ids_not_fetched(self):
+        self.cache["48"] = "Mark Manson"
+        self.assertEqual(self.resolver.resolve(48), "Mark Manson")
+        self.assertListEqual(self.server.requests, [])
+
+    def test_concurrent_lookups_coalesced(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.resolver.resolve(48)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(results, ["Mark Manson"] * 5)
+        self.assertListEqual(self.server.requests, [48])
+
+    def test_server_errors_retried(self):
+        self.server.failures[0] = 2
+        self.assertEqual(self.resolver.resolve(0), "Dan Harris")
+        self.assertListEqual(self.server.requests, [0, 0, 0])
+
+    def test_timeout_gives_no_author(self):
+        resolver = AuthorResolver(self.endpoint, {}, timeout=DELAY / 4, retries=1,
+                                  backoff=0)
+        self.assertIsNone(resolver.resolve(1))
+        resolver.close()
+        self.assertListEqual(self.server.requests, [1, 1])
+
+    def test_author_table_attach_and_refresh(self):
+        self.server.failures[1] = 3
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = path.join(tmp_dir, "request_cache.json")
+            table = AuthorTable(self.resolver, file_path)
+            table.warm_up([0, 1, 48])
+            summaries = [{"id": 48}, {"id": 1}, {"id": 7}]
+            table.attach(summaries)
+            self.assertListEqual([summary["author"] for summary in summaries],
+                                 ["Mark Manson", None, None])
+            table.refresh()
+            table.attach(summaries)
+            self.assertEqual(summaries[1]["author"], "Grant Cardone")
+            self.assertDictEqual(load_json(file_path)[0],
+                                 {"0": "Dan Harris", "1": "Grant Cardone",
+                                  "48": "Mark Manson"})
+            # Unchanged table is not persisted again
+            self.server.requests = []
+            with open(file_path, "w") as fp:
+                fp.write("{}")
+            table.refresh()
+            self.assertListEqual(self.server.requests, [])
+            self.assertDictEqual(load_json(file_path)[0], {})
+
+    def test_author_table_resolves_missing(self):
+        self.server.failures[1] = 3
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table = AuthorTable(self.resolver, path.join(tmp_dir, "request_cache.json"))
+            table.warm_up([0, 1, 48])
+            self.server.requests = []
+            summaries = [{"id": 48}, {"id": 1}, {"id": 7}]
+            table.attach(summaries, resolve_missing=True)
+            self.assertListEqual([summary["author"] for summary in summaries],
+                                 ["Mark Manson", "Grant Cardone", None])
+            self.assertListEqual(sorted(self.server.requests), [1, 7])
+            # Resolved author is kept in the table
+            self.server.requests = []
+            table.attach(summaries[:2], resolve_missing=True)
+            self.assertEqual(summaries[1]["author"], "Grant Cardone")
+            self.assertListEqual(self.server.requests, [])
+
+    def test_author_table_invalid_ids(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table = AuthorTable(self.resolver, path.join(tmp_dir, "request_cache.json"),
+                                max_size=1000)
+            table.warm_up([0, 48, -1, True, 10 ** 12])
+            # Negative ids do not read the authors of other books
+            summaries = [{"id": -1}, {"id": -48}, {"id": "0"}, {"id": False}]
+            table.attach(summaries)
+            self.assertListEqual([summary["author"] for summary in summaries],
+                                 [None] * 4)
+            # Ids past the max size are not added to the table
+            self.server.requests = []
+            table.attach([{"id": 10 ** 12}, {"id": 1000}, {"id": 60}])
+            table.refresh()
+            self.assertListEqual(self.server.requests, [60])
+            self.assertEqual(len(table._table), 61)
+            # Books the endpoint has no author for are not polled again
+            self.server.requests = []
+            table.refresh()
+            self.assertListEqual(self.server.requests, [])
+
+    def test_author_tables_merged(self):
+        # Tables of two processes sharing the file keep each others authors
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = path.join(tmp_dir, "request_cache.json")
+            first_table = AuthorTable(self.resolver, file_path)
+            first_table.warm_up([0, 48])
+            second_table = AuthorTable(AuthorResolver(self.endpoint, {}, backoff=0), file_path)
+            second_table.warm_up([1])
+            first_table.persist()
+            second_table.persist()
+            second_table.resolver.close()
+            self.assertDictEqual(load_json(file_path)[0],
+                                 {"0": "Dan Harris", "1": "Grant Cardone",
+                                  "48": "Mark Manson"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to load test the files shared by the processes:
+# the result cache store written by many processes at once and the json
+# files updated by many processes at once. No entry should be lost and no
+# line should be partially written. The values are encoded when they are
+# flushed without blocking the lookups, and only the top of the rankings
+# is stored.
+# To run the testcase
+# python tests/cache_store_test.py
+
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from os import path
+
+from search.cache import ResultCache
+from search.config import Config
+from search.search_summary import Search
+from utilities.json_parser import dump_json, load_json, update_json
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+NUM_PROCESSES = 4
+NUM_ENTRIES = 100
+NUM_REPEATS = 10
+# Long values so that the lines span many write buffers
+VALUE = list(range(2000))
+
+
+def _fill_cache(store_file: str, flush_interval: float, process_number: int):
+    cache = ResultCache(NUM_PROCESSES * NUM_ENTRIES, store_file=store_file,
+                        flush_interval=flush_interval)
+    # Repeated entries grow the store until it is compacted while the other
+    # processes append
+    for _ in range(NUM_REPEATS):
+        for number in range(NUM_ENTRIES):
+            cache.put("query %d %d" % (process_number, number), VALUE)
+    cache.flush()
+
+
+def _update_json(file_path: str, process_number: int):
+    for number in range(NUM_ENTRIES // 3):
+        key = "%d-%d" % (process_number, number)
+        _, err, trace = update_json(file_path, lambda data: {**data, key: number})
+        if err:
+            raise Exception("Unable to update the json file: %s, Error: %s, Trace:%s"
+                            % (file_path, err, trace))
+
+
+def _run_processes(target, *args):
+    processes = [multiprocessing.Process(target=target, args=args + (number,))
+                 for number in range(NUM_PROCESSES)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            raise Exception("Process failed with exit code: %d" % process.exitcode)
+
+
+class ValidateSharedCacheStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store_file = path.join(self.temp_dir.name, "cache.jsonl")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _check_store(self):
+        with open(self.store_file, "r", encoding="utf-8") as fp:
+            lines = fp.readlines()
+        for line in lines:
+            self.assertEqual(json.loads(line)[2], VALUE)
+        # Store is compacted at least once
+        self.assertLess(len(lines), NUM_PROCESSES * NUM_ENTRIES * NUM_REPEATS)
+        cache = ResultCache(NUM_PROCESSES * NUM_ENTRIES, store_file=self.store_file)
+        self.assertEqual(len(cache), NUM_PROCESSES * NUM_ENTRIES)
+        for process_number in range(NUM_PROCESSES):
+            for number in range(NUM_ENTRIES):
+                self.assertEqual(cache.get("query %d %d" % (process_number, number)), VALUE)
+        # Only the store file and its lock file are left
+        self.assertListEqual(sorted(os.listdir(self.temp_dir.name)),
+                             ["cache.jsonl", "cache.jsonl.lock"])
+
+    def test_concurrent_appends(self):
+        _run_processes(_fill_cache, self.store_file, 0)
+        self._check_store()
+
+    def test_batched_appends(self):
+        _run_processes(_fill_cache, self.store_file, 0.01)
+        self._check_store()
+
+    def test_partial_lines_skipped(self):
+        cache = ResultCache(10, store_file=self.store_file)
+        cache.put("a is gift", [1, 2])
+        with open(self.store_file, "a", encoding="utf-8") as fp:
+            fp.write('["your problems", 1, [3')
+            fp.write("\n")
+        cache.put("is your problems", [3])
+        cache = ResultCache(10, store_file=self.store_file)
+        self.assertEqual(cache.get("a is gift"), [1, 2])
+        self.assertEqual(cache.get("is your problems"), [3])
+
+    def test_pending_flush(self):
+        cache = ResultCache(10, store_file=self.store_file, flush_interval=60)
+        cache.put("a is gift", [1, 2])
+        self.assertEqual(len(ResultCache(10, store_file=self.store_file)), 0)
+        cache.flush()
+        self.assertEqual(ResultCache(10, store_file=self.store_file).get("a is gift"), [1, 2])
+
+    def test_encoded_on_flush(self):
+        encoded = []
+        cache = ResultCache(10, store_file=self.store_file, flush_interval=60,
+                            encode=lambda value: encoded.append(value) or value)
+        cache.put("a is gift", [1, 2])
+        self.assertListEqual(encoded, [])
+        cache.flush()
+        self.assertListEqual(encoded, [[1, 2]])
+
+    def test_lookups_not_blocked_by_flush(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def encode(value):
+            started.set()
+            release.wait(5)
+            return value
+
+        cache = ResultCache(10, store_file=self.store_file, flush_interval=60, encode=encode)
+        cache.put("a is gift", [1, 2])
+        flush_thread = threading.Thread(target=cache.flush)
+        flush_thread.start()
+        started.wait(5)
+        self.assertEqual(cache.get("a is gift"), [1, 2])
+        cache.put("is your problems", [3])
+        self.assertTrue(flush_thread.is_alive())
+        release.set()
+        flush_thread.join()
+        cache.flush()
+        self.assertEqual(len(ResultCache(10, store_file=self.store_file)), 2)
+
+
+class ValidateStoredRankings(unittest.TestCase):
+    def setUp(self):
+        self.config = (Config.DATA_DIR, Config.CACHE_FILE, Config.CACHE_FLUSH_INTERVAL,
+                       Config.CACHE_STORED_RESULTS, Config.CORPUS_FILE, Config.UPDATES_FILE)
+        self.temp_dir = tempfile.TemporaryDirectory()
+        shutil.copy(INP_FILE, path.join(self.temp_dir.name, Config.INPUT_FILE))
+        Config.DATA_DIR = self.temp_dir.name
+        Config.CACHE_FLUSH_INTERVAL = 0
+        Config.CACHE_STORED_RESULTS = 3
+        Config.CORPUS_FILE = None
+        Config.UPDATES_FILE = None
+        self._reset_search()
+
+    def tearDown(self):
+        (Config.DATA_DIR, Config.CACHE_FILE, Config.CACHE_FLUSH_INTERVAL,
+         Config.CACHE_STORED_RESULTS, Config.CORPUS_FILE, Config.UPDATES_FILE) = self.config
+        self._reset_search()
+        self.temp_dir.cleanup()
+
+    @staticmethod
+    def _reset_search():
+        Search.INPUT_DATA.clear()
+        Search.INDEX = None
+        Search.SCORER = None
+        Search.RESULT_CACHE = None
+
+    def test_restored_prefix(self):
+        Config.CACHE_FILE = None
+        expected = [Search("is your problems", 2, page=page).get_query_search_results()
+                    for page in range(4)]
+        Config.CACHE_FILE = "cache.jsonl"
+        Search.RESULT_CACHE = None
+        Search("is your problems", 2).get_query_search_results()
+        with open(path.join(self.temp_dir.name, Config.CACHE_FILE), encoding="utf-8") as fp:
+            self.assertListEqual([len(json.loads(line)[2]) for line in fp], [3])
+        # Pages past the stored top are searched again after a restart
+        Search.RESULT_CACHE = None
+        for page in range(4):
+            self.assertListEqual(Search("is your problems", 2, page=page)
+                                 .get_query_search_results(), expected[page])
+        self.assertTrue(expected[2])
+        ranking = Search.RESULT_CACHE.get(Search("is your problems", 2).cache_key)
+        self.assertGreater(len(ranking), Config.CACHE_STORED_RESULTS)
+
+
+class ValidateSharedJson(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.json_file = path.join(self.temp_dir.name, "request_cache.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _expected(self, num_writers: int) -> dict:
+        return dict(("%d-%d" % (writer, number), number)
+                    for writer in range(num_writers) for number in range(NUM_ENTRIES // 3))
+
+    def test_concurrent_processes(self):
+        _run_processes(_update_json, self.json_file)
+        data, err, _ = load_json(self.json_file)
+        self.assertIsNone(err)
+        self.assertDictEqual(data, self._expected(NUM_PROCESSES))
+
+    def test_concurrent_threads(self):
+        threads = [threading.Thread(target=_update_json, args=(self.json_file, number))
+                   for number in range(NUM_PROCESSES)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertDictEqual(load_json(self.json_file)[0], self._expected(NUM_PROCESSES))
+
+    def test_dump_replaces_file(self):
+        self.assertEqual(dump_json(self.json_file, {"1": "Dan Harris"}), (None, None))
+        self.assertEqual(dump_json(self.json_file, {"2": "Mark Manson"}), (None, None))
+        self.assertDictEqual(load_json(self.json_file)[0], {"2": "Mark Manson"})
+
+
+if __name__ == "__main__":
+    unittest.main()
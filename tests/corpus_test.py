@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test that the binary corpus file built from
+# the input json file gives the same summaries and postings lists as the
+# input json file and its inverted index, and that rebuilding the file does
+# not change the summaries of a corpus mapping it.
+# To run the testcase
+# python tests/corpus_test.py
+
+import json
+import os
+import tempfile
+import unittest
+from os import path
+
+from search.config import Config
+from search.corpus import build_corpus, load_corpus
+from search.index import InvertedIndex, tokenize
+from search.scoring import BM25_MODE, PythonScorer
+from utilities.json_parser import load_json
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+
+
+class ValidateMappedCorpus(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        input_data, err, trace = load_json(INP_FILE)
+        if err:
+            raise Exception("Unable to load the json file: %s, Error: %s, Trace:%s"
+                            % (INP_FILE, err, trace))
+        cls.summaries = input_data["summaries"]
+        cls.queries = input_data["queries"]
+        cls.index = InvertedIndex(cls.summaries, "summary")
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.corpus_file = path.join(cls.temp_dir.name, Config.CORPUS_FILE)
+        build_corpus(INP_FILE, cls.corpus_file)
+        cls.corpus = load_corpus(cls.corpus_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.corpus = None
+        cls.temp_dir.cleanup()
+
+    def test_summaries(self):
+        self.assertEqual(len(self.corpus), len(self.summaries))
+        self.assertListEqual(list(self.corpus), self.summaries)
+        self.assertListEqual(self.corpus.ids(),
+                             [summary["id"] for summary in self.summaries])
+
+    def test_token_ids(self):
+        for doc_index, summary in enumerate(self.summaries):
+            words = [self.corpus.word(word_id)
+                     for word_id in self.corpus.token_ids(doc_index)]
+            self.assertListEqual(words, tokenize(summary["summary"]))
+
+    def test_postings(self):
+        self.assertEqual(sorted(self.corpus.index.terms()), sorted(self.index.terms()))
+        for term in self.index.terms():
+            self.assertListEqual(self.corpus.index.postings(term), self.index.postings(term))
+        self.assertListEqual(self.corpus.index.postings("unknownword"), [])
+
+    def test_document_statistics(self):
+        self.assertListEqual(self.corpus.index.doc_lengths(), self.index.doc_lengths())
+        for term in self.index.terms():
+            self.assertEqual(self.corpus.index.document_frequency(term),
+                             self.index.document_frequency(term))
+
+    def test_rankings(self):
+        expected_scorer = PythonScorer(self.index)
+        scorer = PythonScorer(self.corpus.index)
+        for query in self.queries:
+            query_terms = tokenize(query)
+            self.assertListEqual(scorer.rank(query_terms).ranked(),
+                                 expected_scorer.rank(query_terms).ranked())
+        expected_scorer = PythonScorer(self.index, BM25_MODE)
+        scorer = PythonScorer(self.corpus.index, BM25_MODE)
+        for query in self.queries:
+            query_terms = tokenize(query)
+            self.assertListEqual(scorer.rank(query_terms).ranked(),
+                                 expected_scorer.rank(query_terms).ranked())
+
+    def test_rebuild_keeps_mapped_corpus(self):
+        corpus_file = path.join(self.temp_dir.name, "rebuilt.bin")
+        build_corpus(INP_FILE, corpus_file)
+        corpus = load_corpus(corpus_file)
+        input_file = path.join(self.temp_dir.name, "changed.json")
+        with open(input_file, "w", encoding="utf-8") as fp:
+            json.dump({"summaries": [{"id": 1000, "summary": "zebra crossing"}]}, fp)
+        build_corpus(input_file, corpus_file)
+        # Mapped corpus still reads the replaced file
+        self.assertListEqual(list(corpus), self.summaries)
+        self.assertListEqual(list(load_corpus(corpus_file)),
+                             [{"id": 1000, "summary": "zebra crossing"}])
+        self.assertListEqual([name for name in os.listdir(self.temp_dir.name)
+                              if name.endswith(".tmp")], [])
+
+    def test_missing_or_invalid_file(self):
+        self.assertIsNone(load_corpus(path.join(self.temp_dir.name, "missing.bin")))
+        invalid_file = path.join(self.temp_dir.name, "invalid.bin")
+        with open(invalid_file, "wb") as fp:
+            fp.write(b"not a corpus file")
+        self.assertIsNone(load_corpus(invalid_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
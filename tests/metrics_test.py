@@ -0,0 +1,50 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the metrics rendered in the prometheus
+# text format and the stage timers of the search.
+# To run the testcase
+# python tests/metrics_test.py
+
+import unittest
+
+from search.search_summary import Search
+from utilities import metrics
+
+
+class ValidateMetrics(unittest.TestCase):
+    def tearDown(self):
+        metrics.set_enabled(True)
+
+    def test_histogram_buckets(self):
+        histogram = metrics.Histogram("test_latency_seconds", "Test latency.",
+                                      buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, endpoint="test")
+        rendered = metrics.render_metrics()
+        self.assertIn("# TYPE test_latency_seconds histogram", rendered)
+        self.assertIn('test_latency_seconds_bucket{endpoint="test",le="0.1"} 1', rendered)
+        self.assertIn('test_latency_seconds_bucket{endpoint="test",le="1.0"} 3', rendered)
+        self.assertIn('test_latency_seconds_bucket{endpoint="test",le="+Inf"} 4', rendered)
+        self.assertIn('test_latency_seconds_sum{endpoint="test"} 6.05', rendered)
+        self.assertIn('test_latency_seconds_count{endpoint="test"} 4', rendered)
+
+    def test_search_stages(self):
+        Search("is your problems", 3).get_query_search_results()
+        rendered = metrics.render_metrics()
+        for stage in ("cache", "rank"):
+            self.assertIn('search_stage_seconds_count{stage="%s"}' % stage, rendered)
+        self.assertIn("search_corpus_summaries %d" % Search.get_corpus_size(), rendered)
+
+    def test_disabled_timers(self):
+        metrics.set_enabled(False)
+        count = metrics.STAGE_LATENCY.samples()
+        with metrics.stage_timer("disabled"):
+            pass
+        self.assertListEqual(metrics.STAGE_LATENCY.samples(), count)
+
+
+if __name__ == "__main__":
+    unittest.main()
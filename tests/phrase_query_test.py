@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the query syntax and the phrase and
+# proximity matching of the positional postings against a scan of the
+# token streams.
+# To run the testcase
+# python tests/phrase_query_test.py
+
+import random
+import tempfile
+import unittest
+from os import path
+from unittest import mock
+
+from search import index as search_index
+from search.config import Config
+from search.corpus import build_corpus, load_corpus
+from search.index import InvertedIndex, tokenize
+from search.query import parse_query
+from search.search_summary import Search
+from search.tokenizer import Normalizer
+from utilities.json_parser import load_json
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+
+
+def _has_phrase(tokens: list, phrase: tuple) -> bool:
+    return any(tuple(tokens[start:start + len(phrase)]) == phrase
+               for start in range(len(tokens)))
+
+
+def _has_near(tokens: list, left: str, right: str, distance: int) -> bool:
+    return any(tokens[first] == left and tokens[second] == right
+               and first != second and abs(first - second) <= distance
+               for first in range(len(tokens)) for second in range(len(tokens)))
+
+
+class ValidateQuerySyntax(unittest.TestCase):
+    def test_plain_query(self):
+        query = parse_query("  Is your  problems ")
+        self.assertListEqual(query.terms, ["is", "your", "problems"])
+        self.assertFalse(query.has_constraints())
+        self.assertEqual(query.key(), "is problems your")
+
+    def test_phrases_and_proximities(self):
+        query = parse_query('"A gift" NEAR/2 problems is "gift"')
+        self.assertListEqual(query.terms, ["a", "gift", "problems", "is", "gift"])
+        self.assertListEqual(query.phrases, [("a", "gift")])
+        self.assertListEqual(query.proximities, [("gift", "problems", 2)])
+        self.assertEqual(query.key(), 'a gift gift is problems "a gift" gift NEAR/2 problems')
+
+    def test_invalid_syntax(self):
+        query = parse_query('NEAR/2 gift "unclosed phrase')
+        self.assertListEqual(query.terms, ["gift", "unclosed", "phrase"])
+        self.assertFalse(query.has_constraints())
+        # Lower case near is a word
+        self.assertListEqual(parse_query("gift near/2 you").terms, ["gift", "near", "2", "you"])
+
+    def test_empty_operands(self):
+        # Operand normalized to no words does not bind NEAR to another word
+        query = parse_query("problems , NEAR/2 gift")
+        self.assertListEqual(query.terms, ["problems", "gift"])
+        self.assertFalse(query.has_constraints())
+        with mock.patch.object(search_index, "NORMALIZER",
+                               Normalizer(stopwords="english")):
+            query = parse_query("problems the NEAR/2 gift")
+            self.assertListEqual(query.terms, ["problems", "gift"])
+            self.assertFalse(query.has_constraints())
+            query = parse_query("problems NEAR/2 the gift")
+            self.assertFalse(query.has_constraints())
+            query = parse_query('"the problems" NEAR/2 "gift of"')
+            self.assertListEqual(query.proximities, [("problems", "gift", 2)])
+        # Stray quote is not an operand
+        self.assertListEqual(parse_query('gift NEAR/2 "problems').proximities,
+                             [("gift", "problems", 2)])
+
+
+class ValidatePositionalMatching(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        generator = random.Random(3)
+        words = ["w%d" % number for number in range(8)]
+        cls.summaries = [{"summary": " ".join(generator.choices(words, k=generator.randint(0, 20)))}
+                         for _ in range(300)]
+        cls.index = InvertedIndex(cls.summaries, "summary")
+        cls.tokens = [tokenize(summary["summary"]) for summary in cls.summaries]
+        cls.words = words
+        cls.generator = generator
+
+    def test_phrases(self):
+        for _ in range(50):
+            phrase = tuple(self.generator.choices(self.words, k=self.generator.randint(1, 3)))
+            self.assertSetEqual(self.index.match_phrase(phrase),
+                                set(doc_index for doc_index, tokens in enumerate(self.tokens)
+                                    if _has_phrase(tokens, phrase)))
+
+    def test_proximities(self):
+        for _ in range(50):
+            left, right = self.generator.choices(self.words, k=2)
+            distance = self.generator.randint(0, 4)
+            self.assertSetEqual(self.index.match_near(left, right, distance),
+                                set(doc_index for doc_index, tokens in enumerate(self.tokens)
+                                    if _has_near(tokens, left, right, distance)))
+
+    def test_changed_summaries(self):
+        index = InvertedIndex(self.summaries[:10], "summary")
+        phrase = tuple(self.tokens[3][:2])
+        self.assertIn(3, index.match_phrase(phrase))
+        index.remove_document(3)
+        self.assertNotIn(3, index.match_phrase(phrase))
+        index.add_document(3, " ".join(phrase))
+        self.assertIn(3, index.match_phrase(phrase))
+
+    def test_mapped_corpus(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            corpus_file = path.join(temp_dir, Config.CORPUS_FILE)
+            build_corpus(INP_FILE, corpus_file)
+            corpus = load_corpus(corpus_file)
+            input_data, err, trace = load_json(INP_FILE)
+            index = InvertedIndex(input_data["summaries"], "summary")
+            for term in ("your", "problems", "the", "unknownword"):
+                self.assertDictEqual(corpus.index.positions(term), index.positions(term))
+            corpus = None
+
+
+class ValidatePhraseSearch(unittest.TestCase):
+    def test_search_results(self):
+        # Results of a phrase query are the results of its words having the
+        # phrase, in the same order
+        for query, words in (('"your problems"', "your problems"),
+                             ('the "of the" NEAR/2 book', "the of the book")):
+            expected = Search(words, 60).get_query_search_results()
+            results = Search(query, 60).get_query_search_results()
+            parsed_query = parse_query(query)
+            self.assertListEqual(
+                results, [result for result in expected
+                          if all(_has_phrase(tokenize(result["summary"]), phrase)
+                                 for phrase in parsed_query.phrases)
+                          and all(_has_near(tokenize(result["summary"]), *proximity)
+                                  for proximity in parsed_query.proximities)])
+            self.assertGreater(len(results), 0)
+            self.assertNotEqual(Search(query, 1).cache_key, Search(words, 1).cache_key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the request profiler and the stack
+# sampler used by the server.
+# To run the testcase
+# python tests/profiling_test.py
+
+import os
+import tempfile
+import time
+import unittest
+
+from search.search_summary import Search
+from src.profiling import StackSampler, profile_call
+
+
+def _search():
+    Search("is your problems", 3).get_query_search_results()
+
+
+def _busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ValidateProfiling(unittest.TestCase):
+    def test_pstats_profile(self):
+        profile = profile_call("pstats", _search)
+        self.assertIn("cumulative", profile)
+        self.assertIn("get_query_search_results", profile)
+
+    def test_collapsed_profile(self):
+        profile = profile_call("collapsed", _busy_wait, 0.1)
+        counts = {}
+        for line in profile.splitlines():
+            stack, count = line.rsplit(" ", 1)
+            counts[stack] = int(count)
+        busy_samples = sum(count for stack, count in counts.items()
+                           if stack.endswith("profiling_test.py:_busy_wait"))
+        # Most of the samples are taken while the function is running
+        self.assertGreater(busy_samples, sum(counts.values()) / 2)
+
+    def test_sampler_dump(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            sampler = StackSampler(0.005)
+            sampler.start(dump_dir, dump_interval=60)
+            _busy_wait(0.1)
+            sampler.stop()
+            files = os.listdir(dump_dir)
+            self.assertEqual(len(files), 1)
+            with open(os.path.join(dump_dir, files[0]), "r", encoding="utf-8") as fp:
+                self.assertIn("_busy_wait", fp.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
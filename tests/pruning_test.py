@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test that the pruned top K retrieval ranks
+# the same summaries as the exhaustive scoring, for random corpora and for
+# the pages of the search engine.
+# To run the testcase
+# python tests/pruning_test.py
+
+import random
+import unittest
+
+from search.config import Config
+from search.index import InvertedIndex
+from search.scoring import BM25_MODE, COUNT_MODE, TFIDF_MODE, PythonScorer
+from search.search_summary import Search
+
+QUERIES = ["is your problems", "a is gift", "the of a", "of of the", "unknownword"]
+
+
+class ValidateMaxScore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        generator = random.Random(7)
+        cls.words = ["word%d" % number for number in range(20)]
+        # Zipf like frequencies, so the queries mix rare and common words
+        frequencies = [1 / (rank + 1) for rank in range(len(cls.words))]
+        summaries = [{"summary": " ".join(generator.choices(cls.words, frequencies,
+                                                            k=generator.randint(1, 30)))}
+                     for _ in range(500)]
+        cls.index = InvertedIndex(summaries, "summary")
+        cls.generator = generator
+
+    def test_same_top_k(self):
+        for mode in (COUNT_MODE, BM25_MODE, TFIDF_MODE):
+            scorer = PythonScorer(self.index, mode)
+            for _ in range(100):
+                query_terms = self.generator.choices(self.words, k=self.generator.randint(1, 5))
+                num = self.generator.choice([1, 5, 20])
+                ranking, stats = scorer.rank_top(query_terms, num)
+                self.assertListEqual(ranking.ranked(), scorer.rank(query_terms).ranked()[:num])
+                self.assertLessEqual(stats["scored"], len(scorer.rank(query_terms)))
+
+    def test_skipped_postings(self):
+        # Rare word with the most common word, most of the postings of the
+        # common word cannot enter the top 1
+        scorer = PythonScorer(self.index, BM25_MODE)
+        ranking, stats = scorer.rank_top(["word19", "word0"], 1)
+        self.assertEqual(len(ranking), 1)
+        self.assertGreater(stats["skipped"], 0)
+        self.assertLess(stats["scored"], len(scorer.rank(["word0"])))
+
+    def test_no_matches(self):
+        ranking, stats = PythonScorer(self.index).rank_top(["unknownword"], 5)
+        self.assertListEqual(ranking.ranked(), [])
+        self.assertDictEqual(stats, {"scored": 0, "skipped": 0})
+
+
+class ValidatePrunedSearch(unittest.TestCase):
+    def setUp(self):
+        self.config = (Config.TOP_K_PRUNING, Config.PRUNED_TOP_K, Config.CACHE_FILE)
+        Config.CACHE_FILE = None
+        Search.RESULT_CACHE = None
+        Search.load()
+        self.expected = dict((query, [Search(query, 2, page=page).get_query_search_results()
+                                      for page in range(4)])
+                             for query in QUERIES)
+        Config.TOP_K_PRUNING = True
+        Config.PRUNED_TOP_K = 3
+        Search.RESULT_CACHE = None
+
+    def tearDown(self):
+        Config.TOP_K_PRUNING, Config.PRUNED_TOP_K, Config.CACHE_FILE = self.config
+        Search.RESULT_CACHE = None
+
+    def test_pages(self):
+        # Pages beyond the pruned top K rank the cached query again
+        for query, pages in self.expected.items():
+            for page in range(4):
+                self.assertListEqual(Search(query, 2, page=page).get_query_search_results(),
+                                     pages[page])
+
+    def test_search_many(self):
+        for page in range(4):
+            results = Search.search_many(QUERIES, 2, page=page)
+            self.assertListEqual(results, [self.expected[query][page] for query in QUERIES])
+
+
+if __name__ == "__main__":
+    unittest.main()
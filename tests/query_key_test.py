@@ -0,0 +1,81 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test that the equivalent queries, differing
+# in case, spaces or the order of their words, share one cache entry and
+# one ranking in the single and the batch searches.
+# To run the testcase
+# python tests/query_key_test.py
+
+import unittest
+from unittest import mock
+
+from search.config import Config
+from search.query import parse_query
+from search.scoring import BM25_MODE
+from search import search_summary
+from search.search_summary import Search
+
+EQUIVALENT_QUERIES = ["a is gift", "a  is gift", "gift is a", "a is gift ", "Gift, IS a"]
+
+
+class ValidateCanonicalKeys(unittest.TestCase):
+    def setUp(self):
+        self.config = (Config.CACHE_FILE, Config.RANKING_MODE, Config.TOP_K_PRUNING)
+        Config.CACHE_FILE = None
+        Search.RESULT_CACHE = None
+        Search.load()
+
+    def tearDown(self):
+        Config.CACHE_FILE, Config.RANKING_MODE, Config.TOP_K_PRUNING = self.config
+        Search.RESULT_CACHE = None
+        Search.SCORER = None
+
+    def test_keys(self):
+        self.assertSetEqual(set(parse_query(query).key() for query in EQUIVALENT_QUERIES),
+                            {"a gift is"})
+        # Repeated words add to the score, so they are kept
+        self.assertEqual(parse_query("is a is").key(), "a is is")
+        self.assertNotEqual(parse_query("is a is").key(), parse_query("a is").key())
+        self.assertEqual(parse_query("problems NEAR/2 your").key(),
+                         parse_query("your NEAR/2 problems").key())
+
+    def test_single_searches_share_the_entry(self):
+        expected = Search(EQUIVALENT_QUERIES[0], 5).get_query_search_results()
+        stats = Search.RESULT_CACHE.stats()
+        for query in EQUIVALENT_QUERIES[1:]:
+            self.assertListEqual(Search(query, 5).get_query_search_results(), expected)
+        new_stats = Search.RESULT_CACHE.stats()
+        self.assertEqual(new_stats["size"], stats["size"])
+        self.assertEqual(new_stats["hits"] - stats["hits"], len(EQUIVALENT_QUERIES) - 1)
+
+    def test_batch_shares_the_search(self):
+        Config.RANKING_MODE = BM25_MODE
+        Search.SCORER = None
+        Search.RESULT_CACHE = None
+        results = Search.search_many(EQUIVALENT_QUERIES + ["your problems"], 5)
+        self.assertEqual(len(Search.RESULT_CACHE), 2)
+        for result in results[1:len(EQUIVALENT_QUERIES)]:
+            self.assertListEqual(result, results[0])
+
+    def test_batch_parses_and_scores_once(self):
+        # Pruned rankings are not scored by rank_many
+        Config.TOP_K_PRUNING = False
+        queries = ["your problems", "a is gift", "your problems", "gift is a"]
+        with mock.patch.object(search_summary, "parse_query",
+                               wraps=search_summary.parse_query) as parse, \
+                mock.patch.object(Search.SCORER, "rank_many",
+                                  wraps=Search.SCORER.rank_many) as rank_many:
+            results = Search.search_many(queries, 5)
+        self.assertEqual(parse.call_count, len(queries))
+        self.assertEqual(rank_many.call_count, 1)
+        self.assertEqual(len(rank_many.call_args[0][0]), 2)
+        self.assertListEqual(results[2], results[0])
+        self.assertListEqual(results[3], results[1])
+        self.assertListEqual(results[0], Search("your problems", 5).get_query_search_results())
+
+
+if __name__ == "__main__":
+    unittest.main()
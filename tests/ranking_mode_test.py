@@ -0,0 +1,97 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the bm25 and tfidf ranking modes of the
+# scoring backends against the scores computed by hand.
+# To run the testcase
+# python tests/ranking_mode_test.py
+
+import math
+import unittest
+
+from search.index import InvertedIndex, tokenize
+from search.scoring import (BM25_MODE, COUNT_MODE, TFIDF_MODE, NumpyScorer,
+                            PythonScorer, create_scorer, numpy)
+
+SUMMARIES = [
+    {"summary": "the gift of the magi"},
+    {"summary": "the gift"},
+    {"summary": "the the the the the the the the the the the the gift"},
+    {"summary": "magi"},
+]
+
+
+def _bm25(frequency, length, document_frequency, num_docs, avg_length,
+          k1=1.2, b=0.75):
+    idf = math.log(1 + (num_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+    return idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * length / avg_length))
+
+
+class ValidateRankingModes(unittest.TestCase):
+    def setUp(self):
+        self.index = InvertedIndex(SUMMARIES, "summary")
+
+    def test_document_statistics(self):
+        self.assertListEqual(self.index.doc_lengths(), [5, 2, 13, 1])
+        self.assertEqual(self.index.document_frequency("gift"), 3)
+        self.assertEqual(self.index.document_frequency("unknownword"), 0)
+
+    def test_bm25_scores(self):
+        scorer = PythonScorer(self.index, BM25_MODE)
+        scores = scorer.rank_many([tokenize("gift magi")])[0]._heap
+        avg_length = 21 / 4
+        expected = {
+            0: _bm25(1, 5, 3, 4, avg_length) + _bm25(1, 5, 2, 4, avg_length),
+            1: _bm25(1, 2, 3, 4, avg_length),
+            2: _bm25(1, 13, 3, 4, avg_length),
+            3: _bm25(1, 1, 2, 4, avg_length),
+        }
+        for score, doc_index in scores:
+            self.assertAlmostEqual(-score, expected[doc_index])
+        self.assertListEqual(scorer.rank(tokenize("gift magi")).ranked(), [0, 3, 1, 2])
+
+    def test_long_summaries_and_common_words(self):
+        # Count ranks the summary repeating "the" first, bm25 and tfidf
+        # rank the short summaries having the rare word first
+        self.assertListEqual(PythonScorer(self.index).rank(tokenize("the magi")).ranked(),
+                             [2, 0, 1, 3])
+        for mode in (BM25_MODE, TFIDF_MODE):
+            ranked = PythonScorer(self.index, mode).rank(tokenize("the magi")).ranked()
+            self.assertListEqual(ranked[:2], [0, 3])
+
+    def test_repeated_query_words(self):
+        scorer = PythonScorer(self.index, BM25_MODE)
+        single = dict((index, -score) for score, index in scorer.rank(["gift"])._heap)
+        double = dict((index, -score) for score, index in scorer.rank(["gift", "gift"])._heap)
+        for doc_index, score in single.items():
+            self.assertAlmostEqual(double[doc_index], 2 * score)
+
+    def test_unknown_mode(self):
+        scorer = create_scorer("python", self.index, ranking_mode="unknown")
+        self.assertEqual(scorer.ranking_mode, COUNT_MODE)
+
+    def test_removed_summaries(self):
+        self.index.remove_document(2)
+        scorer = PythonScorer(self.index, BM25_MODE)
+        self.assertEqual(scorer.statistics.num_docs, 3)
+        self.assertListEqual(scorer.rank(["the"]).ranked(), [1, 0])
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class ValidateNumpyRankingModes(unittest.TestCase):
+    def test_same_rankings(self):
+        index = InvertedIndex(SUMMARIES, "summary")
+        queries = [tokenize(query) for query in
+                   ("the magi", "gift gift the", "magi of", "unknownword", "")]
+        for mode in (BM25_MODE, TFIDF_MODE):
+            python_scorer = PythonScorer(index, mode)
+            numpy_scorer = NumpyScorer(index, mode)
+            for query_terms in queries:
+                self.assertListEqual(numpy_scorer.rank(query_terms).ranked(),
+                                     python_scorer.rank(query_terms).ranked())
+
+
+if __name__ == "__main__":
+    unittest.main()
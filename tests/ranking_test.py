@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the lazy ranking of the summary
+# indexes: the pages are slices of the full ranking, pages past the end
+# are empty and the summaries having the same score are ranked in the
+# increasing order of their index.
+# To run the testcase
+# python tests/ranking_test.py
+
+import unittest
+
+from search.ranking import Ranking
+from search.scoring import NumpyRanking, numpy
+
+SCORES = {0: 7, 1: 9, 2: 2, 3: 9, 4: 0, 5: 7, 6: 1}
+# Desc order of score, ties in the increasing order of index, zero scores
+# are not ranked
+RANKED = [1, 3, 0, 5, 2, 6]
+
+
+class ValidateRanking(unittest.TestCase):
+    def create_ranking(self, scores: dict) -> Ranking:
+        return Ranking(scores)
+
+    def test_ranked(self):
+        ranking = self.create_ranking(SCORES)
+        self.assertEqual(len(ranking), len(RANKED))
+        self.assertListEqual(ranking.ranked(), RANKED)
+
+    def test_pages(self):
+        ranking = self.create_ranking(SCORES)
+        self.assertListEqual(ranking.page(0, 4), RANKED[:4])
+        self.assertListEqual(ranking.page(1, 4), RANKED[4:])
+        self.assertListEqual(ranking.page(2, 2), RANKED[4:6])
+        # Earlier pages are served after the later ones
+        self.assertListEqual(ranking.page(0, 2), RANKED[:2])
+        self.assertListEqual(ranking.top(3), RANKED[:3])
+
+    def test_pages_past_the_end(self):
+        ranking = self.create_ranking(SCORES)
+        self.assertListEqual(ranking.page(3, 2), [])
+        self.assertListEqual(ranking.page(100, 10), [])
+        self.assertListEqual(ranking.top(100), RANKED)
+        self.assertListEqual(self.create_ranking({}).page(0, 3), [])
+
+    def test_tie_order(self):
+        scores = dict((index, 5) for index in (9, 4, 7, 0, 2))
+        ranking = self.create_ranking(scores)
+        self.assertListEqual(ranking.top(2), [0, 2])
+        self.assertListEqual(ranking.ranked(), [0, 2, 4, 7, 9])
+
+    def test_top_scored(self):
+        ranking = self.create_ranking(SCORES)
+        self.assertListEqual(ranking.top_scored(3), [(1, 9), (3, 9), (0, 7)])
+        self.assertEqual(ranking.top_scored(100)[-1], (6, 1))
+
+    def test_from_ranked(self):
+        ranking = Ranking.from_ranked([4, 2, 8])
+        self.assertEqual(len(ranking), 3)
+        self.assertListEqual(ranking.page(1, 2), [8])
+        self.assertListEqual(ranking.page(2, 2), [])
+        with self.assertRaises(ValueError):
+            ranking.top_scored(2)
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class ValidateNumpyRanking(ValidateRanking):
+    def create_ranking(self, scores: dict) -> Ranking:
+        array = numpy.zeros(max(scores, default=-1) + 1)
+        for index, score in scores.items():
+            array[index] = score
+        return NumpyRanking(array)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the request pipeline with stub search
+# and author stages which sleep for each chunk: the stages of the chunks
+# overlap, the chunks searched ahead of the authors are bounded and the
+# results are in the order of the queries.
+# To run the testcase
+# python tests/request_pipeline_test.py
+
+import threading
+import time
+import unittest
+
+from src.pipeline import RequestPipeline
+
+# Seconds taken by each stage for a chunk
+DELAY = 0.1
+NUM_CHUNKS = 5
+CHUNK_SIZE = 3
+QUERIES = ["query %d" % number for number in range(NUM_CHUNKS * CHUNK_SIZE - 1)]
+
+
+class StubStages:
+    def __init__(self, search_delay: float=DELAY, author_delay: float=DELAY):
+        self.search_delay = search_delay
+        self.author_delay = author_delay
+        self.searched = 0
+        self.resolved = 0
+        # Max no of chunks searched and not yet resolved
+        self.max_ahead = 0
+        self._lock = threading.Lock()
+
+    def search_many(self, queries: list, summary_limit: int) -> list:
+        time.sleep(self.search_delay)
+        with self._lock:
+            self.searched += 1
+            self.max_ahead = max(self.max_ahead, self.searched - self.resolved)
+        return [[{"id": number, "query": query} for number in range(summary_limit)]
+                for query in queries]
+
+    def resolve_authors(self, all_summaries: list):
+        time.sleep(self.author_delay)
+        for summaries in all_summaries:
+            for summary in summaries:
+                summary["author"] = "Author of %s" % summary["query"]
+        with self._lock:
+            self.resolved += 1
+
+
+def _expected_results(summary_limit: int) -> list:
+    return [[{"id": number, "query": query, "author": "Author of %s" % query}
+             for number in range(summary_limit)]
+            for query in QUERIES]
+
+
+class ValidateRequestPipeline(unittest.TestCase):
+    def _create_pipeline(self, stages: StubStages, queue_size: int=4) -> RequestPipeline:
+        pipeline = RequestPipeline(stages.search_many, stages.resolve_authors, queue_size)
+        pipeline.start()
+        self.addCleanup(pipeline.shutdown)
+        return pipeline
+
+    def test_stages_overlap(self):
+        pipeline = self._create_pipeline(StubStages())
+        start = time.perf_counter()
+        self.assertListEqual(pipeline.search(QUERIES, 2, CHUNK_SIZE), _expected_results(2))
+        pipelined = time.perf_counter() - start
+        start = time.perf_counter()
+        self.assertListEqual(pipeline.search(QUERIES, 2, CHUNK_SIZE, inline=True),
+                             _expected_results(2))
+        inline = time.perf_counter() - start
+        # Searches of all the chunks and the authors of the last chunk
+        self.assertGreaterEqual(inline, 2 * NUM_CHUNKS * DELAY)
+        self.assertLess(pipelined, (NUM_CHUNKS + 2.5) * DELAY)
+
+    def test_not_started(self):
+        stages = StubStages(search_delay=0, author_delay=0)
+        pipeline = RequestPipeline(stages.search_many, stages.resolve_authors)
+        self.assertFalse(pipeline.running)
+        # Stages run in the calling thread
+        self.assertListEqual(pipeline.search(QUERIES, 2, len(QUERIES)), _expected_results(2))
+        self.assertEqual(stages.searched, 1)
+        pipeline.start()
+        self.assertTrue(pipeline.running)
+        pipeline.shutdown()
+        self.assertFalse(pipeline.running)
+
+    def test_stream_order(self):
+        pipeline = self._create_pipeline(StubStages())
+        starts = []
+        results = []
+        for start, chunk_results in pipeline.stream(QUERIES, 1, CHUNK_SIZE):
+            starts.append(start)
+            results.extend(chunk_results)
+        self.assertListEqual(starts, list(range(0, len(QUERIES), CHUNK_SIZE)))
+        self.assertListEqual(results, _expected_results(1))
+        self.assertListEqual(pipeline.search([], 1, CHUNK_SIZE), [])
+
+    def test_backpressure(self):
+        stages = StubStages(search_delay=0, author_delay=DELAY / 4)
+        pipeline = self._create_pipeline(stages, queue_size=1)
+        pipeline.search(QUERIES, 1, 1)
+        # Chunks in the queue, the chunk waiting to be queued and the chunk
+        # being resolved
+        self.assertLessEqual(stages.max_ahead, 1 + 2)
+
+    def test_slow_consumer(self):
+        stages = StubStages(search_delay=0, author_delay=0)
+        pipeline = self._create_pipeline(stages, queue_size=1)
+        queries = ["query %d" % number for number in range(100)]
+        stream = pipeline.stream(queries, 1, 1)
+        self.assertEqual(next(stream)[0], 0)
+        time.sleep(3 * DELAY)
+        # Chunk waiting to be taken, the chunk waiting for its credit, the
+        # chunk in the queue, the chunk waiting to be queued and the taken one
+        self.assertLessEqual(stages.searched, 5)
+        self.assertEqual([start for start, _ in stream], list(range(1, len(queries))))
+
+    def test_search_error(self):
+        stages = StubStages(search_delay=0, author_delay=0)
+
+        def search_many(queries, summary_limit):
+            if "query 7" in queries:
+                raise ValueError("search failed")
+            return stages.search_many(queries, summary_limit)
+
+        pipeline = RequestPipeline(search_many, stages.resolve_authors)
+        pipeline.start()
+        self.addCleanup(pipeline.shutdown)
+        with self.assertRaises(ValueError):
+            pipeline.search(QUERIES, 1, CHUNK_SIZE)
+        self.assertEqual(len(pipeline.search(QUERIES[:7], 1, CHUNK_SIZE)), 7)
+
+    def test_abandoned_stream(self):
+        stages = StubStages(search_delay=0, author_delay=DELAY / 4)
+        pipeline = self._create_pipeline(stages)
+        for _ in pipeline.stream(QUERIES, 1, 1):
+            break
+        time.sleep(DELAY)
+        # Remaining chunks are not resolved after the stream is closed
+        self.assertLess(stages.resolved, len(QUERIES))
+        self.assertListEqual(pipeline.search(QUERIES, 1, CHUNK_SIZE), _expected_results(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the in memory result cache: least
+# recently used keys are evicted first, entries expire after the ttl of a
+# fake clock and the hits, misses and evictions are counted.
+# To run the testcase
+# python tests/result_cache_test.py
+
+import unittest
+
+from search.cache import ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ValidateResultCache(unittest.TestCase):
+    def test_lru_eviction_order(self):
+        cache = ResultCache(max_size=3)
+        for key in ("a", "b", "c"):
+            cache.put(key, key.upper())
+        # Read and rewritten keys become the most recently used
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("b", "B2")
+        cache.put("d", "D")
+        self.assertIsNone(cache.get("c"))
+        cache.put("e", "E")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "B2")
+        self.assertEqual(cache.get("d"), "D")
+        self.assertEqual(cache.get("e"), "E")
+        self.assertEqual(len(cache), 3)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = ResultCache(max_size=10, ttl=60, clock=clock)
+        cache.put("old", 1)
+        clock.now += 30
+        cache.put("new", 2)
+        clock.now += 30
+        # Entries expire only after more than ttl seconds
+        self.assertEqual(cache.get("old"), 1)
+        clock.now += 1
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.get("new"), 2)
+        self.assertEqual(len(cache), 1)
+        clock.now += 30
+        self.assertIsNone(cache.get("new"))
+        self.assertEqual(len(cache), 0)
+
+    def test_no_ttl(self):
+        clock = FakeClock()
+        cache = ResultCache(max_size=10, clock=clock)
+        cache.put("a", 1)
+        clock.now += 10 ** 9
+        self.assertEqual(cache.get("a"), 1)
+
+    def test_counters(self):
+        clock = FakeClock()
+        cache = ResultCache(max_size=2, ttl=10, clock=clock)
+        self.assertDictEqual(cache.stats(),
+                             {"size": 0, "hits": 0, "misses": 0, "evictions": 0})
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.get("unknown")
+        cache.put("c", 3)
+        self.assertDictEqual(cache.stats(),
+                             {"size": 2, "hits": 1, "misses": 1, "evictions": 1})
+        # Expired entries count as misses and not as evictions
+        clock.now += 11
+        cache.get("a")
+        self.assertDictEqual(cache.stats(),
+                             {"size": 1, "hits": 1, "misses": 2, "evictions": 1})
+
+    def test_stale_version_not_cached(self):
+        cache = ResultCache(max_size=2, version=1)
+        cache.put("a", 1, version=0)
+        cache.put("b", 2, version=1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test that the numpy scoring backend ranks
+# the summaries exactly like the python scoring backend for the sample
+# queries of the input json file.
+# To run the testcase
+# python tests/scoring_backend_test.py
+
+import unittest
+from os import path
+
+from search.config import Config
+from search.index import InvertedIndex, tokenize
+from search.scoring import NumpyScorer, PythonScorer, numpy
+from utilities.json_parser import load_json
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+# Queries with repeated words, extra spaces and unknown words
+EXTRA_QUERIES = ["is is your", "  a is  gift ", "unknownword", "", "the of a"]
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class ValidateNumpyScorer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        input_data, err, trace = load_json(INP_FILE)
+        if err:
+            raise Exception("Unable to load the json file: %s, Error: %s, Trace:%s"
+                            % (INP_FILE, err, trace))
+        index = InvertedIndex(input_data["summaries"], "summary")
+        cls.queries = [tokenize(query)
+                       for query in input_data["queries"] + EXTRA_QUERIES]
+        cls.python_scorer = PythonScorer(index)
+        cls.numpy_scorer = NumpyScorer(index)
+
+    def test_full_rankings(self):
+        for query_terms in self.queries:
+            self.assertListEqual(self.numpy_scorer.rank(query_terms).ranked(),
+                                 self.python_scorer.rank(query_terms).ranked())
+
+    def test_top_k_pages(self):
+        for query_terms in self.queries:
+            expected = self.python_scorer.rank(query_terms).ranked()
+            ranking = self.numpy_scorer.rank(query_terms)
+            for page in range(4):
+                self.assertListEqual(ranking.page(page, 3), expected[page * 3:page * 3 + 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test that the sharded search, with the
+# shards searched in their own processes and their top matches merged,
+# gives the results of the unsharded search in all the ranking modes. The
+# shards load their summaries from a corpus file built in a temp directory.
+# To run the testcase
+# python tests/sharded_search_test.py
+
+import os
+import tempfile
+import unittest
+from os import path
+
+from search.config import Config
+from search.scoring import BM25_MODE, COUNT_MODE, TFIDF_MODE, merge_collection_statistics
+from search.search_summary import Search
+from search.shards import (IndexShard, ShardedSearch, get_shard, load_summary_ids,
+                           merge_matches, prepare_corpus)
+from utilities.json_parser import load_json
+from utilities.logger import create_logger
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+# Queries with repeated words, unknown words, phrases and proximities
+EXTRA_QUERIES = ["is is your", "unknownword", "", "the of a", '"your problems" is',
+                 "the NEAR/3 book", "a is gift", "gift is a"]
+
+
+class ValidateShardedSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        input_data, err, trace = load_json(INP_FILE)
+        if err:
+            raise Exception("Unable to load the json file: %s, Error: %s, Trace:%s"
+                            % (INP_FILE, err, trace))
+        cls.queries = input_data["queries"] + EXTRA_QUERIES
+        cls.logger = create_logger(Config.LOG_DIR, Config.LOG_FILE)
+        cls.temp_dir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def setUp(self):
+        self.config = (Config.CACHE_FILE, Config.CORPUS_FILE, Config.RANKING_MODE,
+                       Config.TOP_K_PRUNING)
+        Config.CACHE_FILE = None
+        # Unsharded search loads the input json file
+        Config.CORPUS_FILE = None
+        Config.TOP_K_PRUNING = False
+        self._reset_search()
+
+    def tearDown(self):
+        (Config.CACHE_FILE, Config.CORPUS_FILE, Config.RANKING_MODE,
+         Config.TOP_K_PRUNING) = self.config
+        self._reset_search()
+
+    @staticmethod
+    def _reset_search():
+        Search.RESULT_CACHE = None
+        Search.SCORER = None
+
+    def _use_corpus_file(self) -> str:
+        Config.CORPUS_FILE = path.join(self.temp_dir.name, "corpus.bin")
+        return prepare_corpus(self.logger)
+
+    def _load_shards(self, num_shards: int) -> list:
+        self._use_corpus_file()
+        shards = [IndexShard.load(shard, num_shards, self.logger)
+                  for shard in range(num_shards)]
+        Config.CORPUS_FILE = None
+        collection = merge_collection_statistics([shard.statistics() for shard in shards])
+        for shard in shards:
+            shard.create_scorer(self.logger, collection)
+        return shards
+
+    def test_partition(self):
+        shards = self._load_shards(3)
+        ids = [summary["id"] for shard in shards for summary in shard.summaries]
+        self.assertListEqual(sorted(ids), sorted(load_summary_ids(self.logger)))
+        for number, shard in enumerate(shards):
+            self.assertTrue(all(get_shard(summary["id"], 3) == number
+                                for summary in shard.summaries))
+
+    def test_ranking_modes(self):
+        # Shards searched in this process, weighed with the statistics of
+        # all the summaries
+        for mode in (COUNT_MODE, BM25_MODE, TFIDF_MODE):
+            Config.RANKING_MODE = mode
+            self._reset_search()
+            shards = self._load_shards(4)
+            for num, page in ((3, 0), (5, 2), (100, 0)):
+                expected = Search.search_many(self.queries, num, self.logger, page)
+                shards_results = [shard.search_many(self.queries, (page + 1) * num)
+                                  for shard in shards]
+                for position, expected_results in enumerate(expected):
+                    results = merge_matches([shard_results[position]
+                                             for shard_results in shards_results],
+                                            (page + 1) * num)[page * num:]
+                    self.assertListEqual(results, expected_results, (mode, position))
+
+    def test_corpus_file_required(self):
+        with self.assertRaises(ValueError):
+            prepare_corpus(self.logger)
+        with self.assertRaises(ValueError):
+            IndexShard.load(0, 2, self.logger)
+        # Stale corpus file is rebuilt
+        corpus_file = self._use_corpus_file()
+        os.utime(corpus_file, (0, 0))
+        self.assertEqual(prepare_corpus(self.logger), corpus_file)
+        self.assertGreater(path.getmtime(corpus_file), 0)
+        self.assertEqual(len(IndexShard.load(0, 1, self.logger).summaries),
+                         len(load_summary_ids(self.logger)))
+
+    def test_shard_processes(self):
+        Config.RANKING_MODE = BM25_MODE
+        sharded_search = ShardedSearch(3, self.logger)
+        Config.CORPUS_FILE = path.join(self.temp_dir.name, "corpus.bin")
+        sharded_search.start()
+        Config.CORPUS_FILE = None
+        try:
+            self.assertListEqual(
+                sharded_search.search_many(self.queries, 5, query_field="query"),
+                Search.search_many(self.queries, 5, self.logger, query_field="query"))
+            self.assertListEqual(sharded_search.search_many(self.queries, 3, page=1),
+                                 Search.search_many(self.queries, 3, self.logger, page=1))
+            self.assertListEqual(sharded_search.search_many([], 3), [])
+        finally:
+            sharded_search.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
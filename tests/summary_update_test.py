@@ -0,0 +1,170 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the changes made to the summaries at
+# runtime. The search results after the changes are compared with the
+# results of a search engine loading the changed summaries from scratch,
+# in the count and the bm25 ranking modes, also while other threads search.
+# To run the testcase
+# python tests/summary_update_test.py
+
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from os import path
+
+from search.config import Config
+from search.index import InvertedIndex, tokenize
+from search.query import parse_query
+from search.scoring import BM25_MODE, PythonScorer
+from search.search_summary import Search
+from utilities.file_store import file_lock
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+QUERIES = ["is your problems", "a is gift", "zebra crossing", "the of a"]
+
+
+def _reset_search(data_dir: str):
+    """
+    Function to point the search engine to the data directory and drop
+    the data loaded in this process
+    """
+    Config.DATA_DIR = data_dir
+    Config.CACHE_FILE = None
+    Config.CORPUS_FILE = None
+    Search.INPUT_DATA.clear()
+    Search.INDEX = None
+    Search.SCORER = None
+    Search.RESULT_CACHE = None
+    Search.CORPUS_VERSION = 0
+    Search._ID_INDEXES = None
+    Search._UPDATES_OFFSET = 0
+
+
+class ValidateSummaryUpdates(unittest.TestCase):
+    def setUp(self):
+        self.config = (Config.DATA_DIR, Config.CACHE_FILE, Config.CORPUS_FILE,
+                       Config.RANKING_MODE)
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copy(INP_FILE, path.join(self.temp_dir, Config.INPUT_FILE))
+        _reset_search(self.temp_dir)
+        with open(INP_FILE, "r", encoding="utf-8") as fp:
+            self.summaries = json.load(fp)[Search.SUMMARIES_KEY]
+
+    def tearDown(self):
+        _reset_search(self.config[0])
+        Config.CACHE_FILE, Config.CORPUS_FILE, Config.RANKING_MODE = self.config[1:]
+        shutil.rmtree(self.temp_dir)
+
+    def _expected_results(self, summaries: list, query: str) -> list:
+        ranking = PythonScorer(InvertedIndex(summaries, "summary"),
+                               Config.RANKING_MODE).rank(tokenize(query))
+        return [summaries[summary_index] for summary_index in ranking.top(3)]
+
+    def _assert_results(self, summaries: list):
+        for query in QUERIES:
+            self.assertListEqual(Search(query, 3).get_query_search_results(),
+                                 self._expected_results(summaries, query))
+
+    def test_update_and_delete(self):
+        # Cache the results before the changes
+        self._assert_results(self.summaries)
+        new_summary = {"id": 1000, "summary": "zebra crossing is a gift"}
+        changed_summary = {"id": self.summaries[5]["id"], "summary": "your problems problems"}
+        self.assertEqual(Search.update_summaries([new_summary, changed_summary]), 1)
+        self.assertEqual(Search.delete_summaries([self.summaries[0]["id"], 12345]), 2)
+        expected = [changed_summary if summary["id"] == changed_summary["id"] else summary
+                    for summary in self.summaries[1:]] + [new_summary]
+        self._assert_results(expected)
+        self.assertNotIn(self.summaries[0]["id"], Search.get_summary_ids())
+        self.assertIn(new_summary["id"], Search.get_summary_ids())
+
+    def test_bm25_statistics_updated(self):
+        # Lengths of all the summaries are part of the bm25 weights
+        Config.RANKING_MODE = BM25_MODE
+        self._assert_results(self.summaries)
+        scorer = Search.SCORER
+        new_summary = {"id": 1000, "summary": "zebra crossing is a gift " * 20}
+        Search.update_summaries([new_summary])
+        Search.delete_summaries([self.summaries[0]["id"]])
+        self.assertIs(Search.SCORER, scorer)
+        self._assert_results(self.summaries[1:] + [new_summary])
+
+    def test_searches_during_changes(self):
+        Config.RANKING_MODE = BM25_MODE
+        Search.load()
+        errors = []
+        done = threading.Event()
+
+        def search():
+            while not done.is_set():
+                for query in QUERIES:
+                    try:
+                        Search(query, 3).get_query_search_results()
+                    except Exception as exc:
+                        errors.append(exc)
+
+        threads = [threading.Thread(target=search) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for summary_id in range(1000, 1050):
+            Search.update_summaries([{"id": summary_id, "summary": "zebra is a gift"}])
+        done.set()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(errors, [])
+        new_summaries = [{"id": summary_id, "summary": "zebra is a gift"}
+                         for summary_id in range(1000, 1050)]
+        self._assert_results(self.summaries + new_summaries)
+
+    def test_only_affected_queries_are_invalidated(self):
+        self._assert_results(self.summaries)
+        Search.update_summaries([{"id": 1000, "summary": "zebra"}])
+        self.assertIsNone(Search.RESULT_CACHE.get(parse_query("zebra crossing").key()))
+        self.assertIsNotNone(Search.RESULT_CACHE.get(parse_query("a is gift").key()))
+
+    def test_changes_are_applied_after_restart(self):
+        Search.update_summaries([{"id": 1000, "summary": "zebra crossing"}])
+        Search.delete_summaries([self.summaries[0]["id"]])
+        _reset_search(self.temp_dir)
+        self._assert_results(self.summaries[1:] + [{"id": 1000, "summary": "zebra crossing"}])
+        self.assertEqual(Search.CORPUS_VERSION, 2)
+
+    def test_append_waits_for_file_lock(self):
+        Search.load()
+        updates_file = path.join(self.temp_dir, Config.UPDATES_FILE)
+        thread = threading.Thread(
+            target=Search.update_summaries, args=([{"id": 1000, "summary": "zebra"}],))
+        # Another process appending to the updates file holds its lock
+        with file_lock(updates_file):
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            self.assertFalse(path.exists(updates_file))
+        thread.join()
+        self.assertIn(1000, Search.get_summary_ids())
+
+    def test_corrupt_updates_are_skipped(self):
+        updates_file = path.join(self.temp_dir, Config.UPDATES_FILE)
+        with open(updates_file, "w", encoding="utf-8") as fp:
+            fp.write('["update",[{"id":1000,"summary":"zebra"}]]\n{"broken\n"delete"\n'
+                     '["delete",[%d]]\n["update",[{"id":1001' % self.summaries[0]["id"])
+        Search.load()
+        self.assertEqual(Search.CORPUS_VERSION, 2)
+        self.assertIn(1000, Search.get_summary_ids())
+        self.assertNotIn(self.summaries[0]["id"], Search.get_summary_ids())
+        # Incomplete last line is applied once it is written
+        with open(updates_file, "a", encoding="utf-8") as fp:
+            fp.write(',"summary":"zebra crossing"}]]\n')
+        Search.load()
+        self.assertEqual(Search.CORPUS_VERSION, 3)
+        self.assertIn(1001, Search.get_summary_ids())
+
+
+if __name__ == "__main__":
+    unittest.main()
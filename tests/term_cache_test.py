@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the cache of the score vectors of the
+# query words: its memory budget and LRU eviction, and that the queries
+# composed from the cached words are ranked as without the cache. The
+# postings lists of the in memory index are not cached in the count mode.
+# To run the testcase
+# python tests/term_cache_test.py
+
+import random
+import tempfile
+import unittest
+from os import path
+
+from search.cache import TermVectorCache
+from search.config import Config
+from search.corpus import build_corpus, load_corpus
+from search.index import InvertedIndex, tokenize
+from search.scoring import BM25_MODE, COUNT_MODE, TFIDF_MODE, PythonScorer
+from utilities.json_parser import load_json
+
+INP_FILE = path.join(path.dirname(path.dirname(__file__)), "search",
+                     Config.DATA_DIR, Config.INPUT_FILE)
+
+
+class ValidateTermVectorCache(unittest.TestCase):
+    def test_budget_eviction(self):
+        cache = TermVectorCache(max_bytes=300)
+        cache.put("a", [(0, 1)], 100)
+        cache.put("is", [(1, 1)], 100)
+        cache.put("gift", [(2, 1)], 100)
+        # "a" is used last, so "is" is evicted first
+        self.assertEqual(cache.get("a"), [(0, 1)])
+        cache.put("your", [(3, 1)], 150)
+        self.assertIsNone(cache.get("is"))
+        self.assertIsNone(cache.get("gift"))
+        self.assertEqual(cache.get("your"), [(3, 1)])
+        self.assertDictEqual(cache.stats(), {"size": 2, "bytes": 250, "hits": 2,
+                                             "misses": 2, "evictions": 2})
+
+    def test_large_vector_not_cached(self):
+        cache = TermVectorCache(max_bytes=300)
+        cache.put("a", [(0, 1)], 100)
+        cache.put("the", [(0, 1)], 301)
+        self.assertIsNone(cache.get("the"))
+        self.assertEqual(cache.get("a"), [(0, 1)])
+
+    def test_replaced_vector(self):
+        cache = TermVectorCache(max_bytes=300)
+        cache.put("a", [(0, 1)], 100)
+        cache.put("a", [(0, 2)], 200)
+        self.assertEqual(cache.get("a"), [(0, 2)])
+        self.assertEqual(cache.stats()["bytes"], 200)
+
+
+class ValidateComposedQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        input_data, err, trace = load_json(INP_FILE)
+        cls.index = InvertedIndex(input_data["summaries"], "summary")
+        generator = random.Random(7)
+        words = tokenize(" ".join(summary["summary"]
+                                  for summary in input_data["summaries"][:20]))
+        cls.queries = [generator.choices(words, k=generator.randint(1, 5))
+                       for _ in range(100)]
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        corpus_file = path.join(cls.temp_dir.name, "corpus.bin")
+        build_corpus(INP_FILE, corpus_file)
+        cls.corpus = load_corpus(corpus_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.corpus = None
+        cls.temp_dir.cleanup()
+
+    def test_same_rankings(self):
+        for index, mode in ((self.index, BM25_MODE), (self.index, TFIDF_MODE),
+                            (self.corpus.index, COUNT_MODE), (self.corpus.index, BM25_MODE)):
+            self._assert_same_rankings(index, mode)
+
+    def _assert_same_rankings(self, index, mode: str):
+        expected_scorer = PythonScorer(self.index, mode)
+        # Small budget so that the words are evicted and read again
+        scorer = PythonScorer(index, mode, term_cache_bytes=200 * 1024)
+        for query_terms in self.queries:
+            self.assertListEqual(scorer.rank(query_terms).ranked(),
+                                 expected_scorer.rank(query_terms).ranked())
+        rankings = scorer.rank_many(self.queries)
+        for query_terms, ranking in zip(self.queries, rankings):
+            self.assertListEqual(ranking.ranked(),
+                                 expected_scorer.rank(query_terms).ranked())
+        stats = scorer.term_cache.stats()
+        self.assertGreater(stats["hits"], 0)
+        self.assertLessEqual(stats["bytes"], 200 * 1024)
+
+    def test_count_mode_postings_not_cached(self):
+        scorer = PythonScorer(self.index, COUNT_MODE, term_cache_bytes=200 * 1024)
+        self.assertIsNone(scorer.term_cache)
+        for query_terms in self.queries[:10]:
+            self.assertListEqual(scorer.rank(query_terms).ranked(),
+                                 PythonScorer(self.index).rank(query_terms).ranked())
+
+    def test_cached_words_reused(self):
+        scorer = PythonScorer(self.index, BM25_MODE, term_cache_bytes=64 * 1024 * 1024)
+        scorer.rank(["is", "your", "problems"])
+        stats = scorer.term_cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (3, 0, 3))
+        # Only the new word is read from the index
+        scorer.rank(["problems", "is", "gift"])
+        stats = scorer.term_cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"]), (4, 2, 4))
+        # Unknown words are not cached
+        scorer.rank(["unknownword"])
+        self.assertEqual(len(scorer.term_cache), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
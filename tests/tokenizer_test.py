@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This test script is used to test the normalizer of the summary and query
+# words and the token streams of the summaries kept by the inverted index.
+# To run the testcase
+# python tests/tokenizer_test.py
+
+import unittest
+
+from search.index import InvertedIndex, tokenize
+from search.tokenizer import Normalizer, light_stem
+
+
+class ValidateNormalizer(unittest.TestCase):
+    def test_punctuation_and_case(self):
+        normalizer = Normalizer()
+        self.assertListEqual(normalizer.tokenize("  A gift, GIFT!\tdon't (stop)."),
+                             ["a", "gift", "gift", "don't", "stop"])
+        self.assertEqual(normalizer.name, "fold+punct")
+
+    def test_split_on_spaces(self):
+        normalizer = Normalizer(case_fold=False, strip_punctuation=False)
+        self.assertListEqual(normalizer.tokenize("  A gift,  Gift "), ["A", "gift,", "Gift"])
+        # Tabs and newlines separate the words like the spaces
+        self.assertListEqual(normalizer.tokenize("A\tgift,\n\nGift\r\n"),
+                             ["A", "gift,", "Gift"])
+        self.assertEqual(normalizer.name, "split")
+
+    def test_legacy_split(self):
+        normalizer = Normalizer(legacy_split=True)
+        text = "  Your  PROBLEMS,\tthe\u00a0gift\nStraße "
+        # Same words as the lower cased text split on the spaces
+        self.assertListEqual(normalizer.tokenize(text),
+                             [word for word in text.lower().split(" ") if word])
+        self.assertListEqual(normalizer.tokenize(text),
+                             ["your", "problems,\tthe\u00a0gift\nstraße"])
+        self.assertEqual(normalizer.name, "legacy")
+
+    def test_stemmer_and_stopwords(self):
+        normalizer = Normalizer(stemmer="light", stopwords="english")
+        self.assertListEqual(normalizer.tokenize("Is your problems the stories?"),
+                             ["problem", "story"])
+        self.assertTrue(normalizer.name.startswith("fold+punct+light+stop-"))
+        self.assertLessEqual(len(normalizer.name), 32)
+
+    def test_light_stem(self):
+        for word, stem in (("problems", "problem"), ("classes", "class"),
+                           ("stories", "story"), ("is", "is"), ("glass", "glass"),
+                           ("running", "runn"), ("sing", "sing")):
+            self.assertEqual(light_stem(word), stem)
+
+    def test_unknown_stemmer(self):
+        with self.assertRaises(ValueError):
+            Normalizer(stemmer="unknown")
+
+
+class ValidateTokenStreams(unittest.TestCase):
+    def test_token_streams(self):
+        summaries = [{"summary": "A gift, a GIFT."}, {"summary": "your gift"}]
+        index = InvertedIndex(summaries, "summary")
+        for doc_index, summary in enumerate(summaries):
+            self.assertListEqual([index.term(term_id)
+                                  for term_id in index.token_stream(doc_index)],
+                                 tokenize(summary["summary"]))
+        self.assertListEqual(index.postings("gift"), [(0, 2), (1, 1)])
+        self.assertSetEqual(index.remove_document(0), {"a", "gift"})
+        self.assertListEqual(index.postings("gift"), [(1, 1)])
+        self.assertListEqual(index.postings("a"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module has the helpers to persist files shared by the threads and
+# the processes of the server. A file is replaced atomically by writing a
+# temp file in its directory and renaming it over the file, so readers see
+# either the old or the new file and never a partially written one. The
+# writers of a file are serialized with an advisory lock on a lock file
+# next to it.
+#
+# Sample Usage
+# with file_lock("C:/Dev/cache.jsonl"):
+#     atomic_write("C:/Dev/cache.jsonl", lambda fp: fp.write(text))
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from os import path
+
+try:
+    import fcntl
+except ImportError:
+    # Processes are not locked out on the platforms without fcntl, the
+    # threads of a process are still serialized
+    fcntl = None
+
+LOCK_SUFFIX = ".lock"
+
+# Locks of the threads of this process for each lock file, the advisory
+# lock alone is not held by a thread against the other threads on all the
+# platforms
+_THREAD_LOCKS = {}
+_THREAD_LOCKS_LOCK = threading.Lock()
+
+
+def _reset_thread_locks():
+    """
+    Function to drop the locks in a forked child, locks held by the threads
+    of the parent would never be released in the child
+    """
+    global _THREAD_LOCKS_LOCK
+    _THREAD_LOCKS.clear()
+    _THREAD_LOCKS_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_thread_locks)
+
+
+@contextmanager
+def file_lock(file_path: str):
+    """
+    Function to hold the lock of the file for the threads and the processes
+    writing it
+    Args:
+        file_path: path of the file to be locked, the lock is taken on
+        the file path with the .lock suffix
+    """
+    lock_path = file_path + LOCK_SUFFIX
+    with _THREAD_LOCKS_LOCK:
+        thread_lock = _THREAD_LOCKS.setdefault(lock_path, threading.RLock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, "a") as lock_fp:
+            fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(file_path: str, write, encoding: str="utf-8"):
+    """
+    Function to replace the file with the contents written by the write
+    function, the file is either fully replaced or left as it was
+    Args:
+        file_path: path of the file
+        write: function writing the contents to the file object
+        encoding: encoding of the text file, None writes a binary file
+    """
+    fd, temp_path = tempfile.mkstemp(prefix=path.basename(file_path) + ".",
+                                     suffix=".tmp", dir=path.dirname(file_path) or ".")
+    try:
+        with os.fdopen(fd, "w" if encoding else "wb", encoding=encoding) as fp:
+            if path.exists(file_path):
+                # Temp files are created readable only by the owner
+                os.chmod(temp_path, os.stat(file_path).st_mode & 0o777)
+            write(fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
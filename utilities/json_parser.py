@@ -5,15 +5,20 @@
 #
 # This function is used to load or dump json files
 # loader loads the json file and returns the loaded json data
-# dumper dumps the json data into the file
+# dumper dumps the json data into the file, the file is replaced atomically
+# updater merges the json data into the file under the file lock, so the
+# processes updating the same file do not drop each others changes
 # Usage
 # json_data = load_json("C:/Dev/test.json")
 # dump_json("C:/Dev/test.json")
+# update_json("C:/Dev/test.json", lambda data: {**data, "12": "Dan Harris"})
 
 from json import dump, load
 from os import path
 from traceback import format_exc
 
+from utilities.file_store import atomic_write, file_lock
+
 def load_json(file_path: str):
     """
     Function to load a json file and return json data
@@ -39,8 +44,29 @@ def dump_json(file: str, data: dict, indent=4):
         indent: file indentation(default-4)
     """
     try:
-        with open(file, "w") as fp:
-            dump(data, fp, indent=indent)
+        with file_lock(file):
+            atomic_write(file, lambda fp: dump(data, fp, indent=indent))
         return (None, None)
     except Exception as err:
-        return (err, format_exc())
\ No newline at end of file
+        return (err, format_exc())
+
+def update_json(file: str, update, indent=4):
+    """
+    Function to update the json data of the file, the data is read and
+    written under the file lock
+    Args:
+        file: file path
+        update: function returning the new data from the data of the file,
+        the data is {} if the file doesn't exist or is invalid
+        indent: file indentation(default-4)
+    Returns:
+        (new data, error, trace)
+    """
+    try:
+        with file_lock(file):
+            data, _, _ = load_json(file)
+            data = update(data)
+            atomic_write(file, lambda fp: dump(data, fp, indent=indent))
+        return (data, None, None)
+    except Exception as err:
+        return ({}, err, format_exc())
@@ -4,29 +4,123 @@
 # Author: adithya.bhat@gmail.com (Adithya bhat)
 #
 # This function is used to create the logger
-# accepts log-dir and log_file and returns the logger object 
+# accepts log-dir and log_file and returns the logger object
 # based on the logger level passed
+# The file handler of a log file is created once per process, records are
+# put on a queue by the logging threads and written to the file by a
+# background listener thread, so the requests never wait for the disk.
+# Messages should be passed with their arguments so that they are only
+# formatted if the record is logged, and large payloads should be wrapped
+# in PayloadSummary so that only their summary is logged.
 # Usage
 # logger = create_logger("C:/Dev", "test.log", level="error")
+# logger.debug("Results: %s", PayloadSummary(results))
 
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import reprlib
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from os import path
 
-def create_logger(log_dir, log_file, level="info"):
+# Map of log file path and (logger, queue handler, file handler, listener)
+_LOGGERS = {}
+_LOGGERS_LOCK = threading.Lock()
+
+# Repr of the payloads which stops at a few items of each container
+_PAYLOAD_REPR = reprlib.Repr()
+_PAYLOAD_REPR.maxlevel = 3
+_PAYLOAD_REPR.maxstring = 60
+_PAYLOAD_REPR.maxother = 60
+
+
+def create_logger(log_dir, log_file, level=None):
     """
     Function used to create logger object based on log directory
-    and log file name
+    and log file name, the same logger is returned for the same log file
+    Args:
+        log_dir: log directory
+        log_file: log file name
+        level: log level, None keeps the level of an existing logger and
+        sets info for a new one
+    """
+    file_path = path.abspath(path.join(log_dir, log_file))
+    with _LOGGERS_LOCK:
+        created = file_path not in _LOGGERS
+        if created:
+            _LOGGERS[file_path] = _create_queued_logger(file_path, log_file)
+        logger = _LOGGERS[file_path][0]
+    if created or level is not None:
+        logger.setLevel(_get_log_level(level or "info"))
+    return logger
+
+
+def _create_queued_logger(file_path, log_file):
     """
-    handler = RotatingFileHandler(filename=path.join(log_dir, log_file),
+    Function to create the logger writing to the file through a queue
+    Returns:
+        (logger, queue handler, file handler, listener)
+    """
+    handler = RotatingFileHandler(filename=file_path,
                                   mode='a', maxBytes=5000000, backupCount=10)
     formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(filename)s, %(lineno)d [%(name)s]: %(message)s', '%d-%b-%y %H:%M:%S')
     handler.setFormatter(formatter)
-    logger = logging.getLogger(__name__)
-    log_level = _get_log_level(level)
-    logger.setLevel(log_level)
-    logger.addHandler(handler)
-    return logger
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    listener = QueueListener(queue_handler.queue, handler)
+    listener.start()
+    logger = logging.getLogger("%s.%s" % (__name__, path.splitext(log_file)[0]))
+    logger.propagate = False
+    logger.addHandler(queue_handler)
+    return logger, queue_handler, handler, listener
+
+
+def _restart_listeners():
+    """
+    Function to start the listener threads again in a forked process, the
+    threads of the parent process do not run in the child
+    """
+    for file_path, (logger, queue_handler, handler, _) in list(_LOGGERS.items()):
+        queue_handler.queue = queue.SimpleQueue()
+        listener = QueueListener(queue_handler.queue, handler)
+        listener.start()
+        _LOGGERS[file_path] = (logger, queue_handler, handler, listener)
+
+
+def _stop_listeners():
+    """
+    Function to write the queued records before the process exits
+    """
+    for _, _, _, listener in list(_LOGGERS.values()):
+        listener.stop()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners)
+atexit.register(_stop_listeners)
+
+
+class PayloadSummary:
+    """
+    Class which wraps a large payload to be logged, only the type, size and
+    the first few items of the payload are formatted and only if the record
+    is logged
+    Ex:
+      str(PayloadSummary(list(range(100))))
+      "list of 100 items: [0, 1, 2, 3, 4, 5, ...]"
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        size = ""
+        if hasattr(self.payload, "__len__"):
+            size = " of %d items" % len(self.payload)
+        return "%s%s: %s" % (type(self.payload).__name__, size,
+                             _PAYLOAD_REPR.repr(self.payload))
+
 
 def _get_log_level(level):
     """
@@ -42,4 +136,4 @@ def _get_log_level(level):
         logging_level = logging.ERROR
     elif level == "critical":
         logging_level = logging.CRITICAL
-    return logging_level
\ No newline at end of file
+    return logging_level
@@ -0,0 +1,216 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module is used to collect the metrics of the process and render
+# them in the prometheus text format. Stages of the requests are timed
+# with stage_timer, which does nothing but return a shared object when
+# the metrics are disabled. Metrics are kept per process, so every worker
+# process of the server exposes its own.
+#
+# Sample Usage
+# with stage_timer("score"):
+#     ranking = scorer.rank(query_terms)
+# REQUESTS_IN_FLIGHT.inc()
+# REQUEST_LATENCY.observe(0.012, endpoint="get_matching_summaries")
+# render_metrics()
+# '# HELP search_stage_seconds ...'
+
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = True
+# Metrics in the order they are rendered
+_metrics = []
+# Functions called before rendering to set the gauges read from the objects
+_collectors = []
+
+
+class Gauge:
+    """
+    Class which holds a value which can go up and down
+    """
+    TYPE = "gauge"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list:
+        return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Counter(Gauge):
+    """
+    Class which holds a value which only goes up
+    """
+    TYPE = "counter"
+
+
+class Histogram:
+    """
+    Class which counts the observed values in the cumulative buckets of
+    their upper bounds, with the sum and the count of the values
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: tuple=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # Map of labels and [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[position] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            items = sorted((key, list(values)) for key, values in self._values.items())
+        for key, values in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((self.name + "_bucket", key + (("le", repr(bound)),),
+                                cumulative))
+            samples.append((self.name + "_bucket", key + (("le", "+Inf"),), values[-1]))
+            samples.append((self.name + "_sum", key, values[-2]))
+            samples.append((self.name + "_count", key, values[-1]))
+        return samples
+
+
+class _StageTimer:
+    """
+    Class which observes the time taken by the block of a stage
+    """
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_LATENCY.observe(time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+class _NullTimer:
+    """
+    Class of the timer used when the metrics are disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+STAGE_LATENCY = Histogram("search_stage_seconds",
+                          "Time taken by the stages of the requests.")
+
+
+def stage_timer(stage: str):
+    """
+    Function to get the context manager timing a stage
+    Args:
+        stage: name of the stage, Ex: "score"
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(stage)
+
+
+def set_enabled(enabled: bool):
+    """
+    Function to turn the stage timers on or off
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def add_collector(collector):
+    """
+    Function to add a function which is called before the metrics are
+    rendered, to set the gauges which are read from other objects
+    """
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """
+    Function to render all the metrics in the prometheus text format
+    Returns:
+        Ex:
+          # HELP search_corpus_summaries No of summaries in the corpus.
+          # TYPE search_corpus_summaries gauge
+          search_corpus_summaries 55
+    """
+    for collector in _collectors:
+        collector()
+    lines = []
+    for metric in _metrics:
+        lines.append("# HELP %s %s" % (metric.name, metric.description))
+        lines.append("# TYPE %s %s" % (metric.name, metric.TYPE))
+        for name, labels, value in metric.samples():
+            lines.append("%s%s %s" % (name, _format_labels(labels), _format_value(value)))
+    return "\n".join(lines) + "\n"
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace('"', '\\"'))
+                             for name, value in labels)
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
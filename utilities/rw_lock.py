@@ -0,0 +1,66 @@
+#
+# Copyright (c) 2020. Unibuddy, Inc. All Rights Reserved.
+#
+# Author: adithya.bhat@gmail.com (Adithya bhat)
+#
+# This module has the lock shared by the readers and the writers of data
+# kept in memory. Many readers hold the lock at once, a writer holds it
+# alone. Readers arriving while a writer waits wait behind it, so a steady
+# stream of readers does not starve the writers. The lock is not reentrant.
+#
+# Sample Usage
+# lock = ReadWriteLock()
+# with lock.read():
+#     ...
+# with lock.write():
+#     ...
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Class which lets many readers or a single writer hold the lock
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """
+        Function to hold the lock as a reader
+        """
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """
+        Function to hold the lock as the only writer
+        """
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()